@@ -0,0 +1,101 @@
+"""Vectorized completion analytics: velocity, weighted burndown and completion forecasts
+
+Tasks arrive as (category_id, weight, completed, created day, done day) rows from
+Repository.completion_rows, with the days already reduced to ordinals by the storage engine.
+Each column goes into numpy through one np.fromiter over the rows; the category lookup is the
+only per-task Python step. Every task then lands in a (category, day) bin through one bincount,
+the per-day series are cumulative sums over those bins, and groups are one matrix product over
+the category rows.
+
+numpy and pandas are only imported with this module, which server.py loads on first use.
+"""
+import math
+from datetime import date, timedelta
+from itertools import repeat
+from operator import itemgetter
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+COLUMNS = np.dtype([("category", np.int64), ("weight", np.float64), ("completed", np.bool_), ("created", np.int64), ("done", np.int64)])
+
+def task_columns(rows: List[tuple], category_index: dict) -> np.ndarray:
+    """The rows as a structured array, filled a column at a time; tasks of unknown categories get category -1"""
+    count = len(rows)
+    columns = np.empty(count, COLUMNS)
+    columns["category"] = np.fromiter(map(category_index.get, map(itemgetter(0), rows), repeat(-1)), np.int64, count)
+    for position, name in enumerate(COLUMNS.names[1:], 1):
+        columns[name] = np.fromiter(map(itemgetter(position), rows), COLUMNS[name], count)
+    return columns
+
+def day_bins(ordinals: np.ndarray, window_start: int, days: int) -> np.ndarray:
+    """Bin of each day: 0 for before the window (or unknown), 1..days for the window's days"""
+    return np.clip(ordinals - window_start, -1, days - 1) + 1
+
+def series(keys: List[dict], counts, completed_counts, total, completed, burndown, velocity, today: date) -> List[dict]:
+    remaining = total - completed
+    with np.errstate(divide="ignore", invalid="ignore"):
+        eta = np.where(remaining <= 0, 0.0, np.where(velocity > 0, remaining / velocity, np.nan))
+    rows = []
+    for index, key in enumerate(keys):
+        forecast_days = None if math.isnan(eta[index]) else float(eta[index])
+        rows.append({
+            **key,
+            "task_count": int(counts[index]),
+            "completed_task_count": int(completed_counts[index]),
+            "total_weight": float(total[index]),
+            "completed_weight": float(completed[index]),
+            "remaining_weight": float(remaining[index]),
+            "velocity": float(velocity[index]),
+            "burndown": burndown[index].tolist(),
+            "forecast_days": forecast_days,
+            "forecast_date": today + timedelta(days=math.ceil(forecast_days)) if forecast_days is not None else None,
+        })
+    return rows
+
+def completion_analytics(rows: List[tuple], categories: List[dict], today: date, days: int) -> dict:
+    """Per-category and per-group completion figures over the `days` days ending `today`.
+
+    velocity is completed weight per day inside the window; burndown is the weight still open
+    at the end of each day; forecast_days is remaining weight over velocity (None when nothing
+    was completed in the window).
+    """
+    category_ids = [category["id"] for category in categories]
+    columns = task_columns(rows, {category_id: index for index, category_id in enumerate(category_ids)})
+    columns = columns[columns["category"] >= 0]
+    category_index = columns["category"]
+    weight = columns["weight"]
+    completed = columns["completed"]
+    window_start = (today - timedelta(days=days - 1)).toordinal()
+    created_bin = day_bins(columns["created"], window_start, days)
+    done_bin = day_bins(columns["done"], window_start, days)
+
+    width = days + 1
+    size = len(category_ids) * width
+    added = np.bincount(category_index * width + created_bin, weights=weight, minlength=size).reshape(-1, width)
+    done = np.bincount((category_index * width + done_bin)[completed], weights=weight[completed], minlength=size).reshape(-1, width)
+    burndown = np.cumsum(added - done, axis=1)[:, 1:]
+    velocity = done[:, 1:].sum(axis=1) / days
+
+    count = len(category_ids)
+    counts = np.bincount(category_index, minlength=count)
+    completed_counts = np.bincount(category_index[completed], minlength=count)
+    total = np.bincount(category_index, weights=weight, minlength=count)
+    completed_total = np.bincount(category_index[completed], weights=weight[completed], minlength=count)
+
+    # Groups are sums of their categories' rows: one (groups x categories) membership matrix
+    group_codes, group_names = pd.factorize(pd.Series([category.get("group", "default") for category in categories], dtype=object))
+    membership = np.zeros((len(group_names), count))
+    membership[group_codes, np.arange(count)] = 1
+
+    category_keys = [{"id": category["id"], "name": category["name"], "group": category.get("group", "default")} for category in categories]
+    group_keys = [{"id": name, "name": name, "group": name} for name in group_names]
+    return {
+        "days": [today - timedelta(days=days - 1 - offset) for offset in range(days)],
+        "categories": series(category_keys, counts, completed_counts, total, completed_total, burndown, velocity, today),
+        "groups": series(
+            group_keys, membership @ counts, membership @ completed_counts, membership @ total,
+            membership @ completed_total, membership @ burndown, membership @ velocity, today
+        ),
+    }
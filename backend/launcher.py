@@ -0,0 +1,162 @@
+"""Production launcher: one bound socket shared by N uvicorn worker processes
+
+    python server.py [--workers N] [--host 0.0.0.0] [--port 8001]
+
+The supervisor binds the listening socket once and hands it to every worker.
+- SIGTERM / SIGINT drain: workers stop accepting, finish in-flight requests for up to
+  GRACEFUL_TIMEOUT_SECONDS, then exit; stragglers are killed
+- SIGHUP rolling reload: workers are replaced one at a time (new code is imported by the
+  replacement), so there is always a process serving
+- A worker that dies unexpectedly is restarted
+
+Each worker is told the worker count through WEB_CONCURRENCY, which server.py uses to split
+MONGO_MAX_CONNECTIONS so the fleet's total Mongo connections stay bounded. Only the worker in
+slot 0 (and its replacements) gets RUN_BACKGROUND_LOOPS=true, so the snapshot scheduler, the
+archiver and the job workers run once per deployment rather than once per worker; during a
+rolling reload the old and new slot-0 workers overlap for RELOAD_WARMUP_SECONDS.
+Rate limits, request coalescing and the memory storage engine are per process; the memory and
+SQLite engines run a single worker.
+"""
+import argparse
+import importlib.util
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+
+import uvicorn
+
+GRACEFUL_TIMEOUT_SECONDS = float(os.environ.get('GRACEFUL_TIMEOUT_SECONDS', '30'))
+RELOAD_WARMUP_SECONDS = float(os.environ.get('RELOAD_WARMUP_SECONDS', '2'))
+SUPERVISOR_POLL_SECONDS = 0.5
+
+logger = logging.getLogger("launcher")
+
+def event_loop_implementation() -> str:
+    return "uvloop" if importlib.util.find_spec("uvloop") is not None else "asyncio"
+
+def http_implementation() -> str:
+    return "httptools" if importlib.util.find_spec("httptools") is not None else "h11"
+
+def run_worker(config: uvicorn.Config, sockets, background_loops: bool):
+    """Worker process entry point; set before server.py is imported so it reads the flag"""
+    os.environ['RUN_BACKGROUND_LOOPS'] = 'true' if background_loops else 'false'
+    config.configure_logging()
+    uvicorn.Server(config).run(sockets=sockets)
+
+# Engines that only work from a single process, and why
+SINGLE_PROCESS_ENGINES = {
+    "memory": "keeps data per process",
+    # Version checks and newer-wins checks read then write on the engine's one thread; a second
+    # process could write between the two
+    "sqlite": "serializes check-then-write on one in-process thread",
+}
+
+def worker_count(requested: int = None) -> int:
+    """Explicit count, else WEB_CONCURRENCY, else one per CPU; the memory and SQLite engines get one"""
+    count = requested or int(os.environ.get('WEB_CONCURRENCY', '0')) or os.cpu_count() or 1
+    engine = os.environ.get('STORAGE_BACKEND', 'mongo')
+    if engine in SINGLE_PROCESS_ENGINES and count > 1:
+        logger.warning("STORAGE_BACKEND=%s %s; running a single worker instead of %d", engine, SINGLE_PROCESS_ENGINES[engine], count)
+        return 1
+    return count
+
+class Supervisor:
+    def __init__(self, config: uvicorn.Config, workers: int, overlap: bool = True):
+        self.config = config
+        self.workers = workers
+        self.overlap = overlap  # whether a replacement may start before its predecessor has drained
+        self.context = multiprocessing.get_context("spawn")
+        self.sockets = [config.bind_socket()]
+        self.processes = []
+        self.should_exit = threading.Event()
+        self.reload_requested = False
+
+    def handle_exit(self, signum, frame):
+        self.should_exit.set()
+
+    def handle_reload(self, signum, frame):
+        self.reload_requested = True
+
+    def spawn(self, slot: int):
+        process = self.context.Process(target=run_worker, args=(self.config, self.sockets, slot == 0))
+        process.start()
+        return process
+
+    def stop(self, processes):
+        """Ask workers to drain in parallel, then kill whatever outlives the grace period"""
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join(GRACEFUL_TIMEOUT_SECONDS + 5)
+            if process.is_alive():
+                logger.warning("Worker %s did not drain in time; killing it", process.pid)
+                process.kill()
+                process.join()
+
+    def rolling_reload(self):
+        logger.info("Reloading %d workers", len(self.processes))
+        for index, old in enumerate(self.processes):
+            if self.should_exit.is_set():
+                return
+            if not self.overlap:
+                # Never two processes on a single-process engine, at the cost of a gap in serving
+                self.stop([old])
+                self.processes[index] = self.spawn(index)
+                continue
+            self.processes[index] = self.spawn(index)
+            # Let the replacement import the app and start accepting before its predecessor drains
+            self.should_exit.wait(RELOAD_WARMUP_SECONDS)
+            self.stop([old])
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.handle_exit)
+        signal.signal(signal.SIGINT, self.handle_exit)
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, self.handle_reload)
+        logger.info("Starting %d workers (loop=%s, http=%s) on %s:%d", self.workers,
+                    self.config.loop, self.config.http, self.config.host, self.config.port)
+        self.processes = [self.spawn(slot) for slot in range(self.workers)]
+        while not self.should_exit.wait(SUPERVISOR_POLL_SECONDS):
+            if self.reload_requested:
+                self.reload_requested = False
+                self.rolling_reload()
+            for index, process in enumerate(self.processes):
+                if not process.is_alive() and not self.should_exit.is_set():
+                    logger.warning("Worker %s exited with code %s; restarting it", process.pid, process.exitcode)
+                    self.processes[index] = self.spawn(index)
+        logger.info("Draining %d workers", len(self.processes))
+        self.stop(self.processes)
+        for sock in self.sockets:
+            sock.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the Progress Tracker API with multiple worker processes")
+    parser.add_argument("--host", default=os.environ.get('HOST', '0.0.0.0'))
+    parser.add_argument("--port", type=int, default=int(os.environ.get('PORT', '8001')))
+    parser.add_argument("--workers", type=int, default=None, help="defaults to WEB_CONCURRENCY or the CPU count")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+
+    workers = worker_count(args.workers)
+    # Spawned workers inherit the environment; server.py sizes its Mongo pool from this
+    os.environ['WEB_CONCURRENCY'] = str(workers)
+    # Spawned workers also inherit sys.path, which must reach server.py wherever we were started from
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    if backend_dir not in sys.path:
+        sys.path.insert(0, backend_dir)
+    config = uvicorn.Config(
+        "server:app",
+        host=args.host,
+        port=args.port,
+        loop=event_loop_implementation(),
+        http=http_implementation(),
+        workers=workers,
+        timeout_graceful_shutdown=GRACEFUL_TIMEOUT_SECONDS,
+    )
+    Supervisor(config, workers, overlap=os.environ.get('STORAGE_BACKEND', 'mongo') not in SINGLE_PROCESS_ENGINES).run()
+
+if __name__ == "__main__":
+    main()
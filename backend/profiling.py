@@ -0,0 +1,91 @@
+"""Sampling profiler for one asyncio task, reported as folded stacks
+
+A thread samples the event loop thread every `interval` seconds while the task runs:
+- running Python code: the loop thread's stack below the event loop machinery
+- loop idle (waiting on sockets, e.g. a Mongo reply): the task's chain of awaiting
+  coroutines, ending in "[waiting]" where it reaches a future
+- another task running: counted under "[other tasks]"
+
+The report is one "frame;frame;frame count" line per distinct stack, the folded format
+read by flamegraph.pl, speedscope and inferno. Nothing here runs unless a sampler is started.
+"""
+import asyncio
+import sys
+import threading
+import time
+from collections import Counter
+
+# Innermost frames of an idle loop; everything above the callback runner is loop machinery
+IDLE_FILES = ("selectors.py",)
+RUNNER = ("events.py", "_run")
+
+def frame_label(frame) -> str:
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})"
+
+def await_chain(coroutine) -> list:
+    """Labels of a suspended coroutine and everything it is awaiting, outermost first"""
+    labels = []
+    while coroutine is not None:
+        frame = getattr(coroutine, "cr_frame", None) or getattr(coroutine, "gi_frame", None) or getattr(coroutine, "ag_frame", None)
+        if frame is None:
+            # A future (an executor call, a socket read): the chain ends in what is being waited for
+            labels.append("[waiting]")
+            break
+        labels.append(frame_label(frame))
+        coroutine = getattr(coroutine, "cr_await", None) or getattr(coroutine, "gi_yieldfrom", None) or getattr(coroutine, "ag_await", None)
+    return labels
+
+def thread_stack(frame) -> list:
+    """Labels of a thread's running frames below the event loop's callback runner, outermost first"""
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        if code.co_filename.endswith(RUNNER[0]) and code.co_name == RUNNER[1]:
+            break
+        frames.append(frame)
+        frame = frame.f_back
+    return [frame_label(frame) for frame in reversed(frames)]
+
+class TaskSampler:
+    def __init__(self, task: asyncio.Task, interval: float = 0.001):
+        self.task = task
+        self.loop = task.get_loop()
+        self.thread_id = threading.get_ident()
+        self.interval = interval
+        self.samples = Counter()
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="task-sampler", daemon=True)
+
+    def sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        if frame is None:
+            return
+        if frame.f_code.co_filename.endswith(IDLE_FILES):
+            stack = await_chain(self.task.get_coro()) or ["[idle]"]
+        elif asyncio.current_task(self.loop) is not self.task:
+            stack = ["[other tasks]"]
+        else:
+            stack = thread_stack(frame) or ["[event loop]"]
+        self.samples[";".join(stack)] += 1
+
+    def run(self):
+        while not self.stopping.is_set():
+            try:
+                self.sample()
+            except (RuntimeError, ValueError):
+                # The loop thread moved on while its frames were being read; skip this sample
+                pass
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopping.set()
+        self.thread.join()
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
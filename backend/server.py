@@ -1,30 +1,303 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
-from pydantic import BaseModel, Field
-from typing import List, Optional
-from datetime import datetime
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from fastapi.routing import APIRoute
+from starlette.datastructures import Headers, MutableHeaders
+from pydantic import AfterValidator, BaseModel, Field, TypeAdapter, ValidationError, create_model
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache, wraps
+from typing import Annotated, List, Optional
+from datetime import date, datetime, timedelta, timezone
+import asyncio
+import contextvars
+import hashlib
+import hmac
+import importlib
+import importlib.util
+import logging
+import math
 import os
+import re
+import tempfile
+import time
 import uuid
+import zlib
+
+from storage import ROLLUP_FIELDS, STORAGE_BACKENDS, VersionConflict, create_repository
+
+# Motor/pymongo, PyJWT, msgpack and zstandard are imported where they are used, so a
+# cold start only pays for them once they are needed (see warm_up_imports)
+HAS_ZSTANDARD = importlib.util.find_spec("zstandard") is not None  # optional; gzip snapshots work without it
+HAS_BROTLI = importlib.util.find_spec("brotli") is not None  # optional; responses fall back to gzip
 
 # Environment variables
 MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'mongo')  # "mongo", "memory" or "sqlite"
+SQLITE_PATH = os.environ.get('SQLITE_PATH', 'progress_tracker.db')
+SNAPSHOT_INTERVAL_SECONDS = int(os.environ.get('SNAPSHOT_INTERVAL_SECONDS', '900'))
+SNAPSHOT_RETENTION_DAYS = int(os.environ.get('SNAPSHOT_RETENTION_DAYS', '90'))
+TENANT_HEADER = os.environ.get('TENANT_HEADER', 'X-Tenant-ID')
+DEFAULT_TENANT = os.environ.get('DEFAULT_TENANT', 'default')
+REQUIRE_TENANT = os.environ.get('REQUIRE_TENANT', 'false').lower() == 'true'
+JWT_SECRET = os.environ.get('JWT_SECRET')
+JWT_ALGORITHM = os.environ.get('JWT_ALGORITHM', 'HS256')
+TENANT_CLAIM = os.environ.get('TENANT_CLAIM', 'tenant_id')
+# With JWT_SECRET set, requests must carry a bearer token unless this opts back into trusting the tenant header
+TRUST_TENANT_HEADER = os.environ.get('TRUST_TENANT_HEADER', 'false').lower() == 'true'
+TENANT_ID_PATTERN = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'false').lower() == 'true'
+RATE_LIMIT_KEY = os.environ.get('RATE_LIMIT_KEY', 'tenant')  # "tenant" (from a verified bearer token, else the IP) or "ip"
+MAX_INFLIGHT_HEAVY = int(os.environ.get('MAX_INFLIGHT_HEAVY', '4'))
+
+# Token buckets per route class: (sustained requests per second, burst size)
+RATE_LIMITS = {
+    "read": (float(os.environ.get('RATE_LIMIT_READ_RPS', '50')), int(os.environ.get('RATE_LIMIT_READ_BURST', '100'))),
+    "write": (float(os.environ.get('RATE_LIMIT_WRITE_RPS', '20')), int(os.environ.get('RATE_LIMIT_WRITE_BURST', '40'))),
+    "heavy": (float(os.environ.get('RATE_LIMIT_HEAVY_RPS', '0.2')), int(os.environ.get('RATE_LIMIT_HEAVY_BURST', '2')))
+}
+HEAVY_ROUTES = {"/api/import", "/api/export", "/api/clear-all", "/api/jobs/import"}
+READ_ONLY_POSTS = {"/api/progress/batch"}  # POST only to carry an id list; limited as reads
+PROGRESS_BATCH_MAX_IDS = int(os.environ.get('PROGRESS_BATCH_MAX_IDS', '500'))
+HEATMAP_MAX_DAYS = int(os.environ.get('HEATMAP_MAX_DAYS', '1096'))  # Longest range one heatmap request may span
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))
+JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS', '60'))
+JOB_POLL_SECONDS = float(os.environ.get('JOB_POLL_SECONDS', '5'))
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', '3'))
+JOB_RETENTION_HOURS = int(os.environ.get('JOB_RETENTION_HOURS', '24'))
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', '90'))  # 0 disables the archiver
+ARCHIVE_INTERVAL_SECONDS = int(os.environ.get('ARCHIVE_INTERVAL_SECONDS', '3600'))
+ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', '500'))
+# Snapshot scheduler, archiver and job workers run in one process only; the launcher sets this for worker 0
+RUN_BACKGROUND_LOOPS = os.environ.get('RUN_BACKGROUND_LOOPS', 'true').lower() == 'true'
+# Idempotency-Key records: how long a response is replayable, how long a duplicate waits for the first
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', '86400'))
+IDEMPOTENCY_WAIT_SECONDS = float(os.environ.get('IDEMPOTENCY_WAIT_SECONDS', '30'))
+IDEMPOTENCY_POLL_SECONDS = 0.05
+IDEMPOTENCY_CACHE_SIZE = int(os.environ.get('IDEMPOTENCY_CACHE_SIZE', '10000'))
+# Drag-and-drop order changes are buffered this long and only the latest position per item is written; 0 writes them directly
+ORDER_WRITE_BEHIND_MS = int(os.environ.get('ORDER_WRITE_BEHIND_MS', '0'))
+# On-demand profiling: requests with `X-Profile: 1` and this token in X-Profile-Token are sampled;
+# without a token the profiling middleware is not installed at all
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN')
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'progress_tracker_profiles'))
+PROFILE_SAMPLE_INTERVAL_MS = float(os.environ.get('PROFILE_SAMPLE_INTERVAL_MS', '1'))
+SERVER_TIMING_ENABLED = os.environ.get('SERVER_TIMING_ENABLED', 'true').lower() == 'true'
+# Computed analytics kept per (tenant, data revision, day, window); any write moves the revision on
+ANALYTICS_CACHE_SIZE = int(os.environ.get('ANALYTICS_CACHE_SIZE', '256'))
+READINESS_TIMEOUT_SECONDS = float(os.environ.get('READINESS_TIMEOUT_SECONDS', '10'))
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', '1024'))
+
+# Total Mongo connections for the whole fleet, split across the launcher's workers plus one spare
+# share for the replacement process that overlaps its predecessor during a rolling reload
+MONGO_MAX_CONNECTIONS = int(os.environ.get('MONGO_MAX_CONNECTIONS', '100'))
+WEB_CONCURRENCY = max(1, int(os.environ.get('WEB_CONCURRENCY', '1')))
+MONGO_POOL_SIZE = max(1, MONGO_MAX_CONNECTIONS // (WEB_CONCURRENCY + 1))
+
+# Response compression levels per encoding; bulk routes trade ratio for CPU since their payloads are large
+COMPRESSION_LEVELS = {
+    "gzip": int(os.environ.get('GZIP_LEVEL', '6')),
+    "br": int(os.environ.get('BROTLI_QUALITY', '4'))
+}
+ROUTE_COMPRESSION_LEVELS = {
+    "/api/export": {"gzip": 1, "br": 1},
+    "/api/sync": {"gzip": 4, "br": 4}
+}
+COMPRESSIBLE_TYPES = ("application/json", "application/x-msgpack", "text/")
+
+# Read routing: routes listed here read through that profile's read preference and read concern;
+# everything else, including the lists clients re-read right after writing, stays on the primary
+SECONDARY_READS_ENABLED = os.environ.get('SECONDARY_READS_ENABLED', 'true').lower() == 'true'
+SECONDARY_MAX_STALENESS_SECONDS = int(os.environ.get('SECONDARY_MAX_STALENESS_SECONDS', '90'))  # pymongo's minimum is 90
+READ_PROFILES = {
+    # Dashboards tolerate a bounded lag behind the primary
+    "dashboard": {"mode": "secondaryPreferred", "max_staleness": SECONDARY_MAX_STALENESS_SECONDS, "read_concern": "local"},
+    # Exports only see majority-committed writes, so a backup never holds one that is later rolled back
+    "export": {"mode": "secondaryPreferred", "max_staleness": SECONDARY_MAX_STALENESS_SECONDS, "read_concern": "majority"},
+}
+ROUTE_READ_PROFILES = {
+    "/api/progress": "dashboard",
+    "/api/progress/batch": "dashboard",
+    "/api/progress/history": "dashboard",
+    "/api/categories/grouped": "dashboard",
+    "/api/categories/{category_id}/progress": "dashboard",
+    "/api/analytics": "dashboard",
+    "/api/activity/heatmap": "dashboard",
+    "/api/export": "export",
+} if SECONDARY_READS_ENABLED else {}
+
+read_profile = contextvars.ContextVar("read_profile", default=None)
+
+async def apply_read_profile(request: Request):
+    """Route the rest of this request's Mongo reads according to ROUTE_READ_PROFILES"""
+    route = request.scope.get("route")
+    read_profile.set(ROUTE_READ_PROFILES.get(route.path) if route is not None else None)
+
+logger = logging.getLogger(__name__)
 
 # FastAPI app initialization
-app = FastAPI(title="Progress Tracker API", version="2.0.0")
+app = FastAPI(title="Progress Tracker API", version="2.0.0", dependencies=[Depends(apply_read_profile)])
 
-# CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# Server-Timing: db (storage query time and count), validate (request parsing and model
+# construction), compute (explicitly timed Python work) and serialize (response rendering)
+class RequestTimings:
+    """Phase durations for one request"""
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.endpoint_started = None
+        self.endpoint_finished = None
+        self.phases = {}
+        self.queries = []  # appended to from driver threads, so a list rather than a running sum
+
+    def add(self, phase: str, seconds: float):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def header(self, responded: float):
+        phases = dict(self.phases)
+        if self.endpoint_started is not None:
+            phases["validate"] = phases.get("validate", 0.0) + self.endpoint_started - self.started
+        if self.endpoint_finished is not None:
+            phases["serialize"] = phases.get("serialize", 0.0) + responded - self.endpoint_finished
+        
+        entries = []
+        if self.queries:
+            count = len(self.queries)
+            entries.append(f'db;dur={sum(self.queries) * 1000:.1f};desc="{count} {"query" if count == 1 else "queries"}"')
+        entries += [f"{phase};dur={phases[phase] * 1000:.1f}" for phase in ("validate", "compute", "serialize") if phase in phases]
+        entries.append(f"total;dur={(responded - self.started) * 1000:.1f}")
+        return ", ".join(entries)
+
+request_timings = contextvars.ContextVar("request_timings", default=None)
+
+@contextmanager
+def timed(phase: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = request_timings.get()
+        if timings is not None:
+            timings.add(phase, time.perf_counter() - started)
+
+def record_query(seconds: float):
+    timings = request_timings.get()
+    if timings is not None:
+        timings.queries.append(seconds)
+
+def mongo_command_timer():
+    """pymongo listener feeding command durations to the current request (Motor runs commands in a copy of its context)"""
+    from pymongo import monitoring
+    
+    class CommandTimer(monitoring.CommandListener):
+        def started(self, event):
+            pass
+
+        def succeeded(self, event):
+            record_query(event.duration_micros / 1e6)
+
+        def failed(self, event):
+            record_query(event.duration_micros / 1e6)
+    return CommandTimer()
+
+def timed_endpoint(endpoint):
+    @wraps(endpoint)
+    async def call(*args, **kwargs):
+        timings = request_timings.get()
+        if timings is None:
+            return await endpoint(*args, **kwargs)
+        timings.endpoint_started = time.perf_counter()
+        try:
+            return await endpoint(*args, **kwargs)
+        finally:
+            timings.endpoint_finished = time.perf_counter()
+    return call
+
+class TimedRoute(APIRoute):
+    """Marks when the endpoint starts and returns, separating request validation and response serialization from it"""
+    def __init__(self, path: str, endpoint, **kwargs):
+        if asyncio.iscoroutinefunction(endpoint):
+            endpoint = timed_endpoint(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+class ServerTimingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timings = RequestTimings()
+        request_timings.set(timings)
+        
+        async def timing_send(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("Server-Timing", timings.header(time.perf_counter()))
+            await send(message)
+        await self.app(scope, receive, timing_send)
+
+if SERVER_TIMING_ENABLED:
+    # Set before any route is declared; added first so it sits innermost and times only the app itself
+    app.router.route_class = TimedRoute
+    app.add_middleware(ServerTimingMiddleware)
 
 # MongoDB client
-client = AsyncIOMotorClient(MONGO_URL)
-db = client.progress_tracker
+class LazyDatabase:
+    """Stands in for the Motor database; the client is built on first use, not at import.
+
+    Attribute access goes to the handle for the current request's read profile, which
+    shares the client (and its pool) but carries that profile's read options.
+    """
+    def __init__(self, url: str, name: str, max_pool_size: int = 100, profiles: dict = None, listeners=None):
+        self.url = url
+        self.name = name
+        self.max_pool_size = max_pool_size
+        self.profiles = profiles or {}
+        self.listeners = listeners  # called on first use for pymongo event listeners
+        self.database = None
+        self.routed = {}
+
+    def resolve(self, profile: str = None):
+        if self.database is None:
+            from motor.motor_asyncio import AsyncIOMotorClient
+            listeners = self.listeners() if self.listeners else []
+            self.database = AsyncIOMotorClient(self.url, maxPoolSize=self.max_pool_size, event_listeners=listeners)[self.name]
+        if profile is None:
+            return self.database
+        if profile not in self.routed:
+            self.routed[profile] = self.database.with_options(**read_options(self.profiles[profile]))
+        return self.routed[profile]
+
+    def __getattr__(self, name):
+        return getattr(self.resolve(read_profile.get()), name)
+
+def read_options(profile: dict):
+    """Turn a READ_PROFILES entry into pymongo read_preference / read_concern options"""
+    from pymongo.read_concern import ReadConcern
+    from pymongo import read_preferences
+    
+    mode = {
+        "primary": read_preferences.Primary,
+        "primaryPreferred": read_preferences.PrimaryPreferred,
+        "secondary": read_preferences.Secondary,
+        "secondaryPreferred": read_preferences.SecondaryPreferred,
+        "nearest": read_preferences.Nearest,
+    }[profile["mode"]]
+    preference = mode() if mode is read_preferences.Primary else mode(max_staleness=profile.get("max_staleness", -1))
+    return {"read_preference": preference, "read_concern": ReadConcern(profile.get("read_concern"))}
+
+db = LazyDatabase(
+    MONGO_URL, "progress_tracker", max_pool_size=MONGO_POOL_SIZE, profiles=READ_PROFILES,
+    listeners=(lambda: [mongo_command_timer()]) if SERVER_TIMING_ENABLED else None
+)
+
+# Categories, tasks and sync bookkeeping go through the configured storage engine;
+# history, search, snapshots and jobs are MongoDB-only
+if STORAGE_BACKEND not in STORAGE_BACKENDS:
+    raise RuntimeError(f"STORAGE_BACKEND must be one of {', '.join(STORAGE_BACKENDS)}")
+repository = create_repository(STORAGE_BACKEND, mongo_database=db, sqlite_path=SQLITE_PATH)
+if SERVER_TIMING_ENABLED and STORAGE_BACKEND == "sqlite":
+    repository.query_listener = record_query
 
 # Pydantic models
 class CategoryBase(BaseModel):
@@ -38,17 +311,28 @@ class CategoryUpdate(BaseModel):
     name: Optional[str] = None
     group: Optional[str] = None
     order: Optional[int] = None
+    expected_version: Optional[int] = None  # Only apply at this version (same as If-Match)
 
 class Category(CategoryBase):
     id: str
     order: int = 0  # For drag & drop ordering
     created_at: datetime
+    version: int = 0  # Bumped on every write; send it back as If-Match or expected_version
     
+def naive_utc(value: datetime):
+    """Store client timestamps as naive UTC, like datetime.utcnow() and what Mongo returns"""
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+UtcDatetime = Annotated[datetime, AfterValidator(naive_utc)]
+
 class TaskBase(BaseModel):
     title: str
     weight: int = Field(gt=0, description="Task weight must be positive")
     category_id: str
     priority: str = Field(default="medium", pattern="^(high|medium|low)$")
+    due_at: Optional[UtcDatetime] = None  # Deadline, UTC
 
 class TaskCreate(TaskBase):
     pass
@@ -60,13 +344,29 @@ class TaskUpdate(BaseModel):
     priority: Optional[str] = Field(None, pattern="^(high|medium|low)$")
     pinned: Optional[bool] = None
     order: Optional[int] = None
+    due_at: Optional[UtcDatetime] = None  # An explicit null clears the deadline
+    expected_version: Optional[int] = None  # Only apply at this version (same as If-Match)
 
 class Task(TaskBase):
     id: str
     completed: bool = False
+    completed_at: Optional[UtcDatetime] = None  # When it last became completed; None while open
     pinned: bool = False  # For pinning important tasks
     order: int = 0  # For drag & drop ordering within category
     created_at: datetime
+    version: int = 0  # Bumped on every write; send it back as If-Match or expected_version
+    archived_at: Optional[datetime] = None  # Only set on archived tasks (include_archived=true)
+
+class AgendaItem(Task):
+    category_name: str
+
+class AgendaDay(BaseModel):
+    day: date  # UTC
+    tasks: List[AgendaItem]
+
+class Agenda(BaseModel):
+    overdue: List[AgendaItem]
+    days: List[AgendaDay]
 
 class ProgressResponse(BaseModel):
     category_id: str
@@ -78,44 +378,992 @@ class ProgressResponse(BaseModel):
     task_count: int
     completed_task_count: int
 
+class ProgressBatchRequest(BaseModel):
+    category_ids: List[str] = Field(min_length=1, max_length=PROGRESS_BATCH_MAX_IDS)
+
+class ProgressBatchEntry(BaseModel):
+    category_id: str
+    found: bool
+    progress: Optional[ProgressResponse] = None  # None when the category does not exist
+
 class CategoryGroup(BaseModel):
     group: str
     categories: List[Category]
     total_progress: float
 
+class ProgressSnapshotPoint(BaseModel):
+    scope: str  # "category" or "group"
+    key: str  # Category id or group name
+    name: str
+    bucket: datetime
+    progress_percentage: float
+    completed_weight: int
+    total_weight: int
+    task_count: int
+    completed_task_count: int
+
+class AnalyticsSeries(BaseModel):
+    id: str  # Category id, or the group name for groups
+    name: str
+    group: str
+    task_count: int
+    completed_task_count: int
+    total_weight: float
+    completed_weight: float
+    remaining_weight: float
+    velocity: float  # Completed weight per day over the window
+    burndown: List[float]  # Open weight at the end of each day in `days`
+    forecast_days: Optional[float] = None  # None when nothing was completed in the window
+    forecast_date: Optional[date] = None
+
+class HeatmapDay(BaseModel):
+    day: date
+    completed_weight: int
+    completed_count: int
+
+class Heatmap(BaseModel):
+    start: date
+    end: date  # Inclusive
+    total_completed_weight: int
+    max_completed_weight: int  # Busiest day, for scaling the calendar's colours
+    days: List[HeatmapDay]  # Every day from start to end, zeros included
+
+class AnalyticsResponse(BaseModel):
+    revision: int
+    days: List[date]
+    categories: List[AnalyticsSeries]
+    groups: List[AnalyticsSeries]
+
+class SyncChange(BaseModel):
+    type: str = Field(pattern="^(category|task)$")
+    op: str = Field(default="upsert", pattern="^(upsert|delete)$")
+    id: str
+    updated_at: datetime  # Client-side modification time, used for last-writer-wins
+    data: dict = {}
+
+class SyncPushRequest(BaseModel):
+    changes: List[SyncChange]
+
+class SyncPushResponse(BaseModel):
+    revision: int
+    applied: List[str]
+    rejected: List[dict]
+
+class SyncPullResponse(BaseModel):
+    revision: int
+    reset: bool  # True when the client must replace its dataset instead of merging
+    categories: List[dict]
+    tasks: List[dict]
+    deleted: List[dict]
+
+class Job(BaseModel):
+    id: str
+    type: str  # "import", "export" or "clear-all"
+    status: str  # "queued", "running", "succeeded", "failed" or "cancelled"
+    progress: dict = {}
+    error: Optional[str] = None
+    result_url: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+class SearchHit(BaseModel):
+    type: str  # "task" or "category"
+    id: str
+    text: str
+    category_id: Optional[str] = None
+    score: float = 0.0
+
+class SearchResponse(BaseModel):
+    query: str
+    total: int
+    skip: int
+    limit: int
+    results: List[SearchHit]
+
+# Tenant resolution
+def bearer_claims(headers) -> Optional[dict]:
+    """Verified claims of the request's bearer token, None without one; 401 for a token that fails verification"""
+    authorization = headers.get("authorization", "")
+    if not (JWT_SECRET and authorization.lower().startswith("bearer ")):
+        return None
+    import jwt
+    try:
+        return jwt.decode(authorization[7:], JWT_SECRET, algorithms=[JWT_ALGORITHM])
+    except jwt.InvalidTokenError:
+        raise HTTPException(status_code=401, detail="Invalid bearer token")
+
+def get_tenant_id(request: Request):
+    """Resolve the tenant that owns this request's data: the bearer token once JWT is configured, else the header"""
+    claims = bearer_claims(request.headers)
+    if claims is not None:
+        tenant_id = claims.get(TENANT_CLAIM) or claims.get("sub")
+    elif JWT_SECRET and not TRUST_TENANT_HEADER:
+        # The header is only a claim; with tokens in use, anyone could name another tenant in it
+        raise HTTPException(status_code=401, detail="Bearer token required", headers={"WWW-Authenticate": "Bearer"})
+    else:
+        tenant_id = request.headers.get(TENANT_HEADER)
+    
+    if not tenant_id:
+        if REQUIRE_TENANT:
+            raise HTTPException(status_code=401, detail=f"Missing {TENANT_HEADER} header or bearer token")
+        tenant_id = DEFAULT_TENANT
+    if not TENANT_ID_PATTERN.match(tenant_id):
+        raise HTTPException(status_code=400, detail="Invalid tenant id")
+    return tenant_id
+
+def require_mongo():
+    """Guard for features built directly on MongoDB queries"""
+    if STORAGE_BACKEND != "mongo":
+        raise HTTPException(status_code=501, detail=f"Not available with the {STORAGE_BACKEND} storage backend")
+
 # Utility functions
 def generate_uuid():
     return str(uuid.uuid4())
 
-async def calculate_category_progress(category_id: str):
+def search_key(text: str):
+    """Normalized copy of a title/name kept alongside it for indexed prefix lookups"""
+    return text.lower()
+
+def parse_fields(fields: Optional[str], model):
+    """Validate a comma-separated `fields=` list against a model; `id` is always included"""
+    if fields is None:
+        return None
+    requested = ["id"] + [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in model.model_fields]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return list(dict.fromkeys(requested))
+
+@lru_cache(maxsize=256)
+def sparse_list_adapter(model, fields: tuple):
+    """Validator/serializer for a list of `model` trimmed to `fields`"""
+    sparse = create_model(
+        f"{model.__name__}Fields",
+        **{field: (model.model_fields[field].annotation, model.model_fields[field]) for field in fields}
+    )
+    return TypeAdapter(List[sparse])
+
+def sparse_response(model, fields: List[str], documents: List[dict]):
+    # Fields outside the selection (e.g. ones fetched only for sorting) are dropped by validation
+    adapter = sparse_list_adapter(model, tuple(fields))
+    with timed("validate"):
+        items = adapter.validate_python(documents)
+    with timed("serialize"):
+        content = adapter.dump_json(items)
+    return Response(content=content, media_type="application/json")
+
+def etag(version: int):
+    return f'"{version}"'
+
+def expected_version(if_match: Optional[str], body_version: Optional[int]):
+    """Version a conditional update is based on: an ETag we issued in If-Match, or expected_version"""
+    if if_match is None or if_match.strip() == "*":
+        return body_version
+    try:
+        header_version = int(if_match.strip().removeprefix("W/").strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="If-Match must be an ETag returned by this API")
+    if body_version is not None and body_version != header_version:
+        raise HTTPException(status_code=400, detail="If-Match and expected_version disagree")
+    return header_version
+
+def version_conflict(kind: str, conflict: VersionConflict):
+    return HTTPException(
+        status_code=409,
+        detail=f"{kind} was changed by someone else (now at version {conflict.current_version})",
+        headers={"ETag": etag(conflict.current_version)}
+    )
+
+def progress_from_rollup(rollup: Optional[dict]):
+    """(progress %, completed weight, total weight, task count, completed task count) for one category"""
+    if not rollup:
+        return 0.0, 0, 0, 0, 0
+    
+    total_weight = rollup["total_weight"]
+    completed_weight = rollup["completed_weight"]
+    progress_percentage = (completed_weight / total_weight * 100) if total_weight > 0 else 0.0
+    
+    return progress_percentage, completed_weight, total_weight, rollup["task_count"], rollup["completed_task_count"]
+
+async def calculate_category_progress(tenant_id: str, category_id: str):
     """Calculate progress for a specific category"""
-    tasks = await db.tasks.find({"category_id": category_id}).to_list(length=None)
+    rollups = await repository.progress_rollups(tenant_id, [category_id])
+    return progress_from_rollup(rollups.get(category_id))
+
+async def compute_progress_rollups(match: dict = None):
+    """Aggregate weights and counts per (tenant_id, category_id) across tenants in a single pass over tasks"""
+    pipeline = [
+        {"$match": match or {}},
+        {"$group": {
+            "_id": {"tenant_id": "$tenant_id", "category_id": "$category_id"},
+            "completed_weight": {"$sum": {"$cond": ["$completed", "$weight", 0]}},
+            "total_weight": {"$sum": "$weight"},
+            "task_count": {"$sum": 1},
+            "completed_task_count": {"$sum": {"$cond": ["$completed", 1, 0]}}
+        }}
+    ]
+    rollups = {
+        (row["_id"]["tenant_id"], row["_id"]["category_id"]): row
+        async for row in db.tasks.aggregate(pipeline)
+    }
     
-    if not tasks:
-        return 0.0, 0, 0, 0, 0
+    # Archived tasks count through their per-category totals
+    async for totals in db.archived_task_totals.find(match or {}, {"_id": 0}):
+        rollup = rollups.setdefault((totals["tenant_id"], totals["category_id"]), dict.fromkeys(ROLLUP_FIELDS, 0))
+        for field in ROLLUP_FIELDS:
+            rollup[field] += totals[field]
+    return rollups
+
+async def migrate_to_tenants():
+    """Assign categories and tasks written before tenancy to the default tenant"""
+    for collection_name in ("categories", "tasks"):
+        await getattr(db, collection_name).update_many(
+            {"tenant_id": {"$exists": False}},
+            {"$set": {"tenant_id": DEFAULT_TENANT}}
+        )
+
+async def backfill_search_keys(collection, field: str, key_field: str):
+    """Set key_field from field on documents written before it existed.
+
+    Computed with search_key rather than $toLower, which only folds ASCII, so the
+    backfilled keys match what autocomplete looks up for non-ASCII titles too.
+    """
+    from pymongo import UpdateOne
     
-    total_weight = sum(task["weight"] for task in tasks)
-    completed_weight = sum(task["weight"] for task in tasks if task["completed"])
-    task_count = len(tasks)
-    completed_task_count = sum(1 for task in tasks if task["completed"])
+    cursor = collection.find({key_field: {"$exists": False}}, {"_id": 1, field: 1})
+    updates = []
+    async for document in cursor:
+        updates.append(UpdateOne({"_id": document["_id"]}, {"$set": {key_field: search_key(document.get(field) or "")}}))
+        if len(updates) >= IMPORT_BATCH_SIZE:
+            await collection.bulk_write(updates, ordered=False)
+            updates = []
+    if updates:
+        await collection.bulk_write(updates, ordered=False)
+
+async def ensure_indexes():
+    """Create indexes and backfill derived fields for documents written before they existed"""
+    from pymongo.errors import OperationFailure
+    await migrate_to_tenants()
     
-    progress_percentage = (completed_weight / total_weight * 100) if total_weight > 0 else 0.0
+    retention_seconds = SNAPSHOT_RETENTION_DAYS * 24 * 3600
+    try:
+        await db.progress_snapshots.create_index(
+            "taken_at", name="snapshot_ttl", expireAfterSeconds=retention_seconds
+        )
+    except OperationFailure:
+        # Retention changed since the index was built - update it in place
+        await db.command("collMod", "progress_snapshots", index={
+            "name": "snapshot_ttl", "expireAfterSeconds": retention_seconds
+        })
+    
+    # Every index leads with tenant_id, so per-tenant queries stay small as the
+    # collections grow, and {tenant_id: 1, ...} is ready to be the shard key
+    await db.progress_snapshots.create_index([("tenant_id", 1), ("scope", 1), ("key", 1), ("taken_at", 1)])
+    
+    # Point lookups by id, ordered listings, and revision ranges for delta sync
+    # are created by MongoRepository.initialize()
     
-    return progress_percentage, completed_weight, total_weight, task_count, completed_task_count
+    # Full-text ranking for /api/search and anchored-prefix lookups for autocomplete
+    await db.tasks.create_index([("tenant_id", 1), ("title", "text")], name="task_title_text_by_tenant")
+    await db.categories.create_index([("tenant_id", 1), ("name", "text")], name="category_name_text_by_tenant")
+    await db.tasks.create_index([("tenant_id", 1), ("title_key", 1)])
+    await db.categories.create_index([("tenant_id", 1), ("name_key", 1)])
+    await backfill_search_keys(db.tasks, "title", "title_key")
+    await backfill_search_keys(db.categories, "name", "name_key")
+    
+    # Background jobs: tenant lookups, claiming the oldest runnable job, staged payloads and results
+    await db.jobs.create_index([("tenant_id", 1), ("id", 1)], unique=True)
+    await db.jobs.create_index([("tenant_id", 1), ("created_at", -1)])
+    await db.jobs.create_index([("status", 1), ("created_at", 1)])
+    await db.jobs.create_index("expires_at", expireAfterSeconds=0)
+    await db.job_payloads.create_index([("job_id", 1), ("seq", 1)], unique=True)
+    await db.job_results.create_index([("job_id", 1), ("seq", 1)], unique=True)
+    await db.job_results.create_index("created_at", expireAfterSeconds=JOB_RETENTION_HOURS * 3600)
+    
+    # Idempotency-Key records, keyed by _id, expire on their own (pending claims after the wait timeout)
+    await db.idempotency_keys.create_index("expires_at", expireAfterSeconds=0)
 
-async def get_next_order(collection_name: str, filter_query: dict = None):
-    """Get next order number for ordering items"""
-    collection = getattr(db, collection_name)
-    query = filter_query or {}
+async def take_progress_snapshot():
+    """Store per-category and per-group rollups of the current progress for every tenant"""
+    taken_at = datetime.utcnow()
+    categories = await db.categories.find(
+        {}, {"_id": 0, "tenant_id": 1, "id": 1, "name": 1, "group": 1}
+    ).to_list(length=None)
+    rollups = await compute_progress_rollups()
+    
+    snapshots = []
+    groups = {}
+    for category in categories:
+        tenant_id = category["tenant_id"]
+        totals = rollups.get((tenant_id, category["id"]), {})
+        counts = {field: totals.get(field, 0) for field in ROLLUP_FIELDS}
+        snapshots.append({
+            "tenant_id": tenant_id, "scope": "category", "key": category["id"],
+            "name": category["name"], "taken_at": taken_at, **counts
+        })
+        
+        group_key = (tenant_id, category.get("group", "default"))
+        group_counts = groups.setdefault(group_key, dict.fromkeys(ROLLUP_FIELDS, 0))
+        for field in ROLLUP_FIELDS:
+            group_counts[field] += counts[field]
+    
+    for (tenant_id, group_name), counts in groups.items():
+        snapshots.append({
+            "tenant_id": tenant_id, "scope": "group", "key": group_name,
+            "name": group_name, "taken_at": taken_at, **counts
+        })
     
-    # Get the highest order number, handling backward compatibility
-    result = await collection.find(query).sort("order", -1).limit(1).to_list(length=1)
-    if result and "order" in result[0]:
-        return result[0]["order"] + 1
+    if snapshots:
+        await db.progress_snapshots.insert_many(snapshots)
+    return len(snapshots)
+
+async def run_snapshot_scheduler():
+    """Periodically snapshot progress until cancelled on shutdown"""
+    while True:
+        try:
+            await take_progress_snapshot()
+        except Exception:
+            logger.exception("Progress snapshot failed")
+        await asyncio.sleep(SNAPSHOT_INTERVAL_SECONDS)
+
+async def archive_old_tasks():
+    """Move tasks completed over ARCHIVE_AFTER_DAYS ago to the archive, a batch at a time"""
+    completed_before = datetime.utcnow() - timedelta(days=ARCHIVE_AFTER_DAYS)
+    archived = 0
+    while True:
+        moved = await repository.archive_completed_tasks(completed_before, ARCHIVE_BATCH_SIZE)
+        archived += moved
+        if moved < ARCHIVE_BATCH_SIZE:
+            return archived
+
+async def run_archiver():
+    """Periodically archive old completed tasks until cancelled on shutdown"""
+    while True:
+        try:
+            archived = await archive_old_tasks()
+            if archived:
+                logger.info("Archived %d completed tasks", archived)
+        except Exception:
+            logger.exception("Task archival failed")
+        await asyncio.sleep(ARCHIVE_INTERVAL_SECONDS)
+
+# Imported off the event loop right after startup, so the first requests that need them don't stall
+WARM_UP_MODULES = ["msgpack"] + (["motor.motor_asyncio"] if STORAGE_BACKEND == "mongo" else []) + (["jwt"] if JWT_SECRET else [])
+
+def warm_up_imports():
+    for name in WARM_UP_MODULES:
+        importlib.import_module(name)
+
+async def initialize_backend():
+    """Import deferred dependencies, prepare storage, then open the readiness gate and start workers"""
+    await asyncio.to_thread(warm_up_imports)
+    delay = 1
+    while True:
+        try:
+            if STORAGE_BACKEND == "mongo":
+                await ensure_indexes()
+            await repository.initialize()
+            break
+        except Exception:
+            logger.exception("Storage initialization failed; retrying in %ss", delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
     
-    # If no items with order field exist, count total items to get next order
-    count = await collection.count_documents(query)
-    return count
+    app.state.ready.set()
+    # The order buffer is per process, so every worker flushes its own
+    if order_writes.enabled:
+        app.state.background_tasks.append(asyncio.create_task(run_order_flusher()))
+    if not RUN_BACKGROUND_LOOPS:
+        return
+    if ARCHIVE_AFTER_DAYS > 0:
+        app.state.background_tasks.append(asyncio.create_task(run_archiver()))
+    if STORAGE_BACKEND == "mongo":
+        app.state.background_tasks.append(asyncio.create_task(run_snapshot_scheduler()))
+        app.state.background_tasks += [asyncio.create_task(run_job_worker()) for _ in range(JOB_WORKERS)]
+
+@app.on_event("startup")
+async def startup():
+    # Start accepting connections immediately; API requests wait at the readiness gate
+    app.state.ready = asyncio.Event()
+    app.state.background_tasks = [asyncio.create_task(initialize_backend())]
+
+@app.on_event("shutdown")
+async def shutdown():
+    for task in app.state.background_tasks:
+        task.cancel()
+    # Waits for a flush the cancellation interrupted, then writes everything still buffered
+    await order_writes.flush()
+    await repository.close()
+
+# Idempotent retries
+class IdempotencyStore:
+    """Completed responses by scoped Idempotency-Key: an in-process LRU in front of MongoDB.
+
+    With the mongo backend a retry that lands on another worker still finds the first
+    response, and a pending record claims the key so only one worker executes it; the
+    other engines keep records per process only.
+    """
+    def __init__(self, max_keys: int = 10000):
+        self.cache = OrderedDict()
+        self.max_keys = max_keys
+
+    def remember(self, key: str, record: dict):
+        self.cache.pop(key, None)
+        self.cache[key] = record
+        if len(self.cache) > self.max_keys:
+            self.cache.popitem(last=False)
+
+    async def get(self, key: str):
+        record = self.cache.get(key)
+        if record is not None and record["expires_at"] > datetime.utcnow():
+            self.cache.move_to_end(key)
+            return record
+        self.cache.pop(key, None)
+        if STORAGE_BACKEND != "mongo":
+            return None
+        record = await db.idempotency_keys.find_one({"_id": key, "status": "completed"})
+        if record is not None and record["expires_at"] > datetime.utcnow():
+            self.remember(key, record)
+            return record
+        return None
+
+    async def claim(self, key: str, fingerprint: str):
+        """True if this process may execute the request; False if another one holds the key"""
+        if STORAGE_BACKEND != "mongo":
+            return True
+        from pymongo.errors import DuplicateKeyError
+        now = datetime.utcnow()
+        # A claim left behind by a crashed worker is taken over once its lease runs out
+        await db.idempotency_keys.delete_one({"_id": key, "expires_at": {"$lte": now}})
+        try:
+            await db.idempotency_keys.insert_one({
+                "_id": key, "fingerprint": fingerprint, "status": "pending",
+                "expires_at": now + timedelta(seconds=IDEMPOTENCY_WAIT_SECONDS)
+            })
+            return True
+        except DuplicateKeyError:
+            return False
+
+    async def pending_fingerprint(self, key: str):
+        if STORAGE_BACKEND != "mongo":
+            return None
+        record = await db.idempotency_keys.find_one({"_id": key}, {"fingerprint": 1})
+        return record["fingerprint"] if record else None
+
+    async def complete(self, key: str, record: dict):
+        self.remember(key, record)
+        if STORAGE_BACKEND == "mongo":
+            await db.idempotency_keys.replace_one({"_id": key}, record, upsert=True)
+
+    async def release(self, key: str):
+        if STORAGE_BACKEND == "mongo":
+            await db.idempotency_keys.delete_one({"_id": key, "status": "pending"})
+
+class IdempotencyMiddleware:
+    """Replays the stored response for a POST retried with the same Idempotency-Key.
+
+    Keys are scoped per tenant and bound to the request they first came with; reusing one
+    for a different method, path or body is rejected with 422. Concurrent duplicates wait
+    for the first to finish rather than running twice. Server errors and streamed
+    responses are not stored, so those can be retried for real.
+    """
+    def __init__(self, app, store: IdempotencyStore):
+        self.app = app
+        self.store = store
+        self.inflight = {}
+
+    def reject(self, status_code: int, detail: str, retry_after: int = None):
+        return JSONResponse(
+            status_code=status_code,
+            content={"detail": detail},
+            headers={"Retry-After": str(retry_after)} if retry_after else None
+        )
+
+    def replay(self, record: dict):
+        headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in record["headers"]]
+        headers.append((b"idempotent-replayed", b"true"))
+        start = {"type": "http.response.start", "status": record["status_code"], "headers": headers}
+        
+        async def respond(scope, receive, send):
+            await send(start)
+            await send({"type": "http.response.body", "body": record["body"]})
+        return respond
+
+    async def wait_for_record(self, key: str, fingerprint: str):
+        """Wait out a duplicate executing in this process or another worker, then return its record"""
+        deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+        while time.monotonic() < deadline:
+            inflight = self.inflight.get(key)
+            if inflight is not None:
+                await asyncio.wait({inflight}, timeout=max(0, deadline - time.monotonic()))
+            record = await self.store.get(key)
+            if record is not None:
+                return record
+            if inflight is None:
+                if await self.store.claim(key, fingerprint):
+                    return None
+                await asyncio.sleep(IDEMPOTENCY_POLL_SECONDS)
+        raise asyncio.TimeoutError
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not scope["path"].startswith("/api/") or scope["path"] in READ_ONLY_POSTS:
+            await self.app(scope, receive, send)
+            return
+        idempotency_key = Headers(scope=scope).get("idempotency-key")
+        if idempotency_key is None:
+            await self.app(scope, receive, send)
+            return
+        if not 1 <= len(idempotency_key) <= 255:
+            await self.reject(400, "Idempotency-Key must be 1-255 characters")(scope, receive, send)
+            return
+        try:
+            tenant_id = get_tenant_id(Request(scope))
+        except HTTPException:
+            # Let the route report the authentication problem
+            await self.app(scope, receive, send)
+            return
+        
+        # The body is needed for the fingerprint, so read it up front and hand it on
+        chunks = []
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunks.append(message.get("body", b""))
+            more_body = message.get("more_body", False)
+        body = b"".join(chunks)
+        fingerprint = hashlib.sha256(b"\0".join([scope["method"].encode(), scope["path"].encode(), scope["query_string"], body])).hexdigest()
+        key = f"{tenant_id}:{idempotency_key}"
+        
+        record = await self.store.get(key)
+        if record is None and (key in self.inflight or not await self.store.claim(key, fingerprint)):
+            stored_fingerprint = None if key in self.inflight else await self.store.pending_fingerprint(key)
+            if stored_fingerprint is not None and stored_fingerprint != fingerprint:
+                await self.reject(422, "Idempotency-Key was already used for a different request")(scope, receive, send)
+                return
+            try:
+                record = await self.wait_for_record(key, fingerprint)
+            except asyncio.TimeoutError:
+                await self.reject(409, "A request with this Idempotency-Key is still in progress", retry_after=1)(scope, receive, send)
+                return
+        if record is not None:
+            if record["fingerprint"] != fingerprint:
+                await self.reject(422, "Idempotency-Key was already used for a different request")(scope, receive, send)
+            else:
+                await self.replay(record)(scope, receive, send)
+            return
+        
+        # This request owns the key; duplicates in this process wait on `done`
+        done = asyncio.get_running_loop().create_future()
+        self.inflight[key] = done
+        sent = False
+        
+        async def replay_receive():
+            nonlocal sent
+            if sent:
+                return await receive()
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        
+        start = None
+        response_chunks = []
+        storable = True
+        
+        async def recording_send(message):
+            nonlocal start, storable
+            if message["type"] == "http.response.start":
+                start = message
+            elif message["type"] == "http.response.body":
+                if message.get("more_body", False):
+                    storable = False
+                elif storable:
+                    response_chunks.append(message.get("body", b""))
+            await send(message)
+        
+        try:
+            await self.app(scope, replay_receive, recording_send)
+            if storable and start is not None and start["status"] < 500:
+                await self.store.complete(key, {
+                    "_id": key,
+                    "fingerprint": fingerprint,
+                    "status": "completed",
+                    "status_code": start["status"],
+                    "headers": [(name.decode("latin-1"), value.decode("latin-1")) for name, value in start["headers"] if name.lower() != b"server-timing"],
+                    "body": b"".join(response_chunks),
+                    "expires_at": datetime.utcnow() + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS)
+                })
+            else:
+                await self.store.release(key)
+        except BaseException:
+            await self.store.release(key)
+            raise
+        finally:
+            del self.inflight[key]
+            done.set_result(None)
+
+app.add_middleware(IdempotencyMiddleware, store=IdempotencyStore(max_keys=IDEMPOTENCY_CACHE_SIZE))
+
+# Admission control
+class RateLimitBackend:
+    """Storage for token buckets; subclass to share limits across processes (e.g. Redis)"""
+    async def take(self, key: str, rate: float, burst: int):
+        """Take one token from `key`'s bucket; return 0 if granted, else seconds until one refills"""
+        raise NotImplementedError
+
+class InMemoryRateLimitBackend(RateLimitBackend):
+    """Per-process token buckets, evicting the least recently used beyond `max_keys`"""
+    def __init__(self, max_keys: int = 100000):
+        self.buckets = OrderedDict()
+        self.max_keys = max_keys
+
+    async def take(self, key: str, rate: float, burst: int):
+        now = time.monotonic()
+        tokens, updated = self.buckets.pop(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        
+        retry_after = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            retry_after = (1 - tokens) / rate
+        
+        self.buckets[key] = (tokens, now)
+        if len(self.buckets) > self.max_keys:
+            self.buckets.popitem(last=False)
+        return retry_after
+
+def route_class(method: str, path: str):
+    if path in HEAVY_ROUTES:
+        return "heavy"
+    if method in ("POST", "PUT", "PATCH", "DELETE") and path not in READ_ONLY_POSTS:
+        return "write"
+    return "read"
+
+class RateLimitMiddleware:
+    """Token-bucket limits per client and route class, plus a cap on concurrent heavy operations"""
+    def __init__(self, app, backend: RateLimitBackend):
+        self.app = app
+        self.backend = backend
+        self.inflight_heavy = 0
+
+    def client_key(self, request: Request):
+        # Only a verified token pins the tenant; the bare header is the caller's to rotate
+        if RATE_LIMIT_KEY == "tenant":
+            try:
+                claims = bearer_claims(request.headers)
+            except HTTPException:
+                claims = None
+            tenant_id = claims and (claims.get(TENANT_CLAIM) or claims.get("sub"))
+            if tenant_id:
+                return f"tenant:{tenant_id}"
+        return f"ip:{request.client.host if request.client else 'unknown'}"
+
+    def reject(self, retry_after: float, detail: str):
+        return JSONResponse(
+            status_code=429,
+            content={"detail": detail},
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith("/api/") or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+        
+        request = Request(scope)
+        limit_class = route_class(scope["method"], scope["path"])
+        rate, burst = RATE_LIMITS[limit_class]
+        retry_after = await self.backend.take(f"{self.client_key(request)}:{limit_class}", rate, burst)
+        if retry_after:
+            await self.reject(retry_after, "Rate limit exceeded")(scope, receive, send)
+            return
+        
+        if limit_class != "heavy":
+            await self.app(scope, receive, send)
+            return
+        
+        if self.inflight_heavy >= MAX_INFLIGHT_HEAVY:
+            await self.reject(1, "Too many heavy operations in progress")(scope, receive, send)
+            return
+        # Held until the response (including streamed exports) is fully sent
+        self.inflight_heavy += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.inflight_heavy -= 1
+
+class ReadinessGate:
+    """Holds API requests until storage is initialized; answers 503 if that takes too long"""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        ready = getattr(scope["app"].state, "ready", None) if scope["type"] == "http" else None
+        if ready is not None and not ready.is_set() and scope["path"].startswith("/api/"):
+            try:
+                await asyncio.wait_for(ready.wait(), READINESS_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                response = JSONResponse(status_code=503, content={"detail": "Service is starting"}, headers={"Retry-After": "1"})
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+app.add_middleware(ReadinessGate)
+
+if RATE_LIMIT_ENABLED:
+    app.add_middleware(RateLimitMiddleware, backend=InMemoryRateLimitBackend())
+
+# Request coalescing
+class SingleFlight:
+    """Collapses concurrent identical calls onto one shared in-flight computation"""
+    def __init__(self):
+        self.inflight = {}
+        self.stats = {}
+
+    def _finished(self, key, future):
+        if self.inflight.get(key) is future:
+            del self.inflight[key]
+        # Mark the error as retrieved even if every waiter was cancelled
+        if not future.cancelled():
+            future.exception()
+
+    async def do(self, key: tuple, compute):
+        stats = self.stats.setdefault(key[0], {"executed": 0, "coalesced": 0})
+        future = self.inflight.get(key)
+        if future is None:
+            # A task of its own, so no single caller's cancellation can abort it for the others
+            future = asyncio.ensure_future(compute())
+            self.inflight[key] = future
+            future.add_done_callback(lambda done: self._finished(key, done))
+            stats["executed"] += 1
+        else:
+            stats["coalesced"] += 1
+        return await asyncio.shield(future)
+
+read_coalescer = SingleFlight()
+
+def coalescing_key(request: Request, tenant_id: str):
+    return (request.url.path, tenant_id, tuple(sorted(request.query_params.multi_items())))
+
+# Order write-behind
+async def write_orders(kind: str, tenant_id: str, orders: dict, bump_version: bool = True):
+    """Write new positions for categories or tasks in one bulk write, each with its own revision"""
+    async with repository.reserve_revisions(tenant_id, len(orders)) as last:
+        await repository.set_orders(kind, tenant_id, orders, datetime.utcnow(), last - len(orders) + 1, bump_version)
+
+class OrderWriteBehind:
+    """Merges order changes per item in memory and writes only the latest positions, one bulk
+    write per tenant and kind, every `interval` seconds and on shutdown.
+
+    Listings in this process see pending positions through overlay(); other workers see them
+    once flushed. The buffer is per process, like the coalescer and rate limits. Buffered moves
+    leave `version` alone, so an ETag handed out before the flush still matches after it.
+    """
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.pending = {}  # (kind, tenant_id) -> {id: order}
+        self.flushing = {}
+        self.lock = asyncio.Lock()
+
+    @property
+    def enabled(self):
+        return self.interval > 0
+
+    def put(self, kind: str, tenant_id: str, orders: dict):
+        self.pending.setdefault((kind, tenant_id), {}).update(orders)
+
+    def take(self, kind: str, tenant_id: str, item_id: str):
+        """Remove and return an item's pending order, so a direct write of that item can carry it"""
+        return self.pending.get((kind, tenant_id), {}).pop(item_id, None)
+
+    def overlay(self, kind: str, tenant_id: str, documents: List[dict], sort: bool = True):
+        """Apply pending orders to freshly read documents (which must include `order`), re-sorting if asked"""
+        orders = {**self.flushing.get((kind, tenant_id), {}), **self.pending.get((kind, tenant_id), {})}
+        if not orders:
+            return documents
+        for document in documents:
+            if document["id"] in orders:
+                document["order"] = orders[document["id"]]
+        if sort:
+            documents.sort(key=lambda document: document.get("order", 0))
+        return documents
+
+    async def flush(self):
+        async with self.lock:
+            self.flushing, self.pending = self.pending, {}
+            batches = [(key, orders) for key, orders in self.flushing.items() if orders]
+            try:
+                for index, ((kind, tenant_id), orders) in enumerate(batches):
+                    try:
+                        await write_orders(kind, tenant_id, orders, bump_version=False)
+                    except BaseException:
+                        # Put back what was not written; anything buffered since is newer and wins
+                        for key, unwritten in batches[index:]:
+                            self.pending[key] = {**unwritten, **self.pending.get(key, {})}
+                        raise
+            finally:
+                self.flushing = {}
+
+order_writes = OrderWriteBehind(ORDER_WRITE_BEHIND_MS / 1000)
+
+def is_bufferable_move(update_data: dict, version: Optional[int]):
+    """An unconditional update that only changes `order` can wait in the write-behind buffer"""
+    return order_writes.enabled and version is None and set(update_data) == {"order"}
+
+async def run_order_flusher():
+    while True:
+        await asyncio.sleep(order_writes.interval)
+        try:
+            await order_writes.flush()
+        except Exception:
+            logger.exception("Writing buffered order changes failed; retrying on the next flush")
+
+# Response compression
+def response_encodings():
+    """Content-Encodings the compression middleware can produce, best first"""
+    return (["br"] if HAS_BROTLI else []) + ["gzip"]
+
+def accepted_response_encoding(accept_encoding: str):
+    """Best encoding the client accepts with q > 0, or None"""
+    weights = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.partition(";")
+        params = params.strip()
+        try:
+            weights[name.strip()] = float(params[2:]) if params.startswith("q=") else 1.0
+        except ValueError:
+            weights[name.strip()] = 0.0
+    for encoding in response_encodings():
+        if weights.get(encoding, weights.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+class CompressionMiddleware:
+    """Compresses JSON/msgpack/text responses above COMPRESSION_MIN_BYTES.
+
+    Whole responses are compressed in one go; streamed ones chunk by chunk through
+    one compressor, so memory stays flat. Responses that already carry a
+    Content-Encoding (pre-compressed snapshot exports) pass through untouched.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        encoding = accepted_response_encoding(Headers(scope=scope).get("accept-encoding", "")) if scope["type"] == "http" else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        
+        level = ROUTE_COMPRESSION_LEVELS.get(scope["path"], COMPRESSION_LEVELS)[encoding]
+        start = None
+        compressor = None
+        passthrough = False
+        
+        async def compressing_send(message):
+            nonlocal start, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+            
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                headers = MutableHeaders(raw=start["headers"])
+                compressible = "content-encoding" not in headers and headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+                if compressible:
+                    headers.add_vary_header("Accept-Encoding")
+                if not compressible or (not more_body and len(body) < COMPRESSION_MIN_BYTES):
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                
+                compressor = new_compressor(encoding, level)
+                headers["Content-Encoding"] = encoding
+                if not more_body:
+                    body = compressor.compress(body) + compressor.flush()
+                    headers["Content-Length"] = str(len(body))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                # Streamed: the final size is unknown, so fall back to chunked transfer
+                if "content-length" in headers:
+                    del headers["content-length"]
+                await send(start)
+            
+            chunk = compressor.compress(body)
+            if not more_body:
+                chunk += compressor.flush()
+            if chunk or not more_body:
+                await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+        
+        await self.app(scope, receive, compressing_send)
+
+app.add_middleware(CompressionMiddleware)
+
+# On-demand profiling
+def write_profile(name: str, report: str):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with open(os.path.join(PROFILE_DIR, name), "w") as file:
+        file.write(report)
+
+class ProfilingMiddleware:
+    """Samples one request's stacks (see profiling.py) when it carries `X-Profile: 1` and the PROFILE_TOKEN.
+
+    The folded-stack report goes to PROFILE_DIR under the name given in the X-Profile-Report
+    response header. The sampler sees the whole event loop, so one profile runs at a time.
+    """
+    def __init__(self, app):
+        self.app = app
+        self.active = False
+
+    async def __call__(self, scope, receive, send):
+        headers = Headers(scope=scope) if scope["type"] == "http" else None
+        if headers is None or headers.get("x-profile") != "1":
+            await self.app(scope, receive, send)
+            return
+        if not hmac.compare_digest(headers.get("x-profile-token", "").encode(), PROFILE_TOKEN.encode()):
+            await JSONResponse(status_code=403, content={"detail": "Invalid X-Profile-Token"})(scope, receive, send)
+            return
+        if self.active:
+            response = JSONResponse(status_code=409, content={"detail": "Another request is being profiled"}, headers={"Retry-After": "1"})
+            await response(scope, receive, send)
+            return
+        
+        from profiling import TaskSampler
+        name = f"{datetime.utcnow():%Y%m%dT%H%M%S}-{generate_uuid()[:8]}.folded"
+        
+        async def reporting_send(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("X-Profile-Report", name)
+            await send(message)
+        
+        self.active = True
+        try:
+            with TaskSampler(asyncio.current_task(), PROFILE_SAMPLE_INTERVAL_MS / 1000) as sampler:
+                await self.app(scope, receive, reporting_send)
+        finally:
+            self.active = False
+        await asyncio.to_thread(write_profile, name, sampler.folded())
+        logger.info("Profile of %s %s written to %s", scope["method"], scope["path"], os.path.join(PROFILE_DIR, name))
+
+if PROFILE_TOKEN:
+    app.add_middleware(ProfilingMiddleware)
+
+# CORS middleware (added last so it also wraps 429 responses)
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=["Retry-After", "ETag", "Idempotent-Replayed", "X-Profile-Report", "Server-Timing"],
+)
 
 # API Routes
 
@@ -124,224 +1372,373 @@ async def get_next_order(collection_name: str, filter_query: dict = None):
 async def health_check():
     return {"status": "OK", "message": "Progress Tracker API v2.0 is running"}
 
+@app.get("/ready")
+async def readiness_check(request: Request):
+    """503 until storage is initialized; for load balancer readiness probes"""
+    ready = getattr(request.app.state, "ready", None)
+    if ready is not None and not ready.is_set():
+        return JSONResponse(status_code=503, content={"status": "starting"})
+    return {"status": "ready"}
+
 # Categories endpoints
+FIELDS_QUERY = Query(None, description="Comma-separated fields to return, e.g. id,name; `id` is always included")
+
 @app.get("/api/categories", response_model=List[Category])
-async def get_categories():
-    categories = await db.categories.find().sort("order", 1).to_list(length=None)
-    return [Category(**category) for category in categories]
+async def get_categories(fields: Optional[str] = FIELDS_QUERY, tenant_id: str = Depends(get_tenant_id)):
+    selected = parse_fields(fields, Category)
+    projection = selected and list(dict.fromkeys(selected + ["order"]))
+    categories = order_writes.overlay("category", tenant_id, await repository.list_categories(tenant_id, fields=projection))
+    if selected:
+        return sparse_response(Category, selected, categories)
+    with timed("validate"):
+        return [Category(**category) for category in categories]
 
-@app.get("/api/categories/grouped")
-async def get_categories_grouped():
-    """Get categories grouped by their group field"""
-    categories = await db.categories.find().sort("order", 1).to_list(length=None)
+async def build_categories_grouped(tenant_id: str):
+    categories = order_writes.overlay("category", tenant_id, await repository.list_categories(tenant_id))
+    rollups = await repository.progress_rollups(tenant_id)
     
     # Group categories by group field
     groups = {}
-    for cat in categories:
-        group_name = cat.get("group", "default")
-        if group_name not in groups:
-            groups[group_name] = []
-        groups[group_name].append(Category(**cat))
+    with timed("validate"):
+        for cat in categories:
+            group_name = cat.get("group", "default")
+            if group_name not in groups:
+                groups[group_name] = []
+            groups[group_name].append(Category(**cat))
     
     # Calculate group progress
     result = []
-    for group_name, group_categories in groups.items():
-        total_progress = 0
-        category_count = len(group_categories)
-        
-        if category_count > 0:
-            for cat in group_categories:
-                progress, _, _, _, _ = await calculate_category_progress(cat.id)
-                total_progress += progress
-            total_progress = total_progress / category_count
-        
-        result.append(CategoryGroup(
-            group=group_name,
-            categories=group_categories,
-            total_progress=total_progress
-        ))
+    with timed("compute"):
+        for group_name, group_categories in groups.items():
+            total_progress = 0
+            category_count = len(group_categories)
+            
+            if category_count > 0:
+                for cat in group_categories:
+                    progress, _, _, _, _ = progress_from_rollup(rollups.get(cat.id))
+                    total_progress += progress
+                total_progress = total_progress / category_count
+            
+            result.append(CategoryGroup(
+                group=group_name,
+                categories=group_categories,
+                total_progress=total_progress
+            ))
     
     return result
 
+@app.get("/api/categories/grouped")
+async def get_categories_grouped(request: Request, tenant_id: str = Depends(get_tenant_id)):
+    """Get categories grouped by their group field"""
+    return await read_coalescer.do(coalescing_key(request, tenant_id), lambda: build_categories_grouped(tenant_id))
+
 @app.post("/api/categories", response_model=Category)
-async def create_category(category: CategoryCreate):
+async def create_category(category: CategoryCreate, tenant_id: str = Depends(get_tenant_id)):
     # Check if category name already exists in the same group
-    existing = await db.categories.find_one({
-        "name": category.name,
-        "group": category.group
-    })
+    existing = await repository.find_category_by_name(tenant_id, category.name, category.group)
     if existing:
         raise HTTPException(status_code=400, detail="Category with this name already exists in this group")
     
-    order = await get_next_order("categories")
+    order = await repository.next_order("category", tenant_id)
     
-    category_data = {
-        "id": generate_uuid(),
-        "name": category.name,
-        "group": category.group,
-        "order": order,
-        "created_at": datetime.now()
-    }
-    
-    await db.categories.insert_one(category_data)
+    async with repository.reserve_revisions(tenant_id) as revision:
+        category_data = {
+            "tenant_id": tenant_id,
+            "id": generate_uuid(),
+            "name": category.name,
+            "name_key": search_key(category.name),
+            "group": category.group,
+            "order": order,
+            "created_at": datetime.now(),
+            "updated_at": datetime.utcnow(),
+            "revision": revision,
+            "version": 1
+        }
+        await repository.insert_category(category_data)
     return Category(**category_data)
 
+# Registered before /{category_id} so "reorder" is not taken for an id
+@app.put("/api/categories/reorder")
+async def reorder_categories(category_orders: List[dict], tenant_id: str = Depends(get_tenant_id)):
+    """Update order of multiple categories for drag & drop"""
+    orders = {item["id"]: item["order"] for item in category_orders}
+    if order_writes.enabled:
+        order_writes.put("category", tenant_id, orders)
+    elif orders:
+        await write_orders("category", tenant_id, orders)
+    return {"message": "Categories reordered successfully"}
+
 @app.put("/api/categories/{category_id}", response_model=Category)
-async def update_category(category_id: str, category: CategoryUpdate):
-    # Check if category exists
-    existing = await db.categories.find_one({"id": category_id})
-    if not existing:
-        raise HTTPException(status_code=404, detail="Category not found")
+async def update_category(
+    category_id: str,
+    category: CategoryUpdate,
+    response: Response,
+    tenant_id: str = Depends(get_tenant_id),
+    if_match: Optional[str] = Header(None)
+):
+    version = expected_version(if_match, category.expected_version)
     
     # Prepare update data
     update_data = {}
     if category.name is not None:
+        group = category.group
+        if group is None:
+            existing = await repository.get_category(tenant_id, category_id)
+            if not existing:
+                raise HTTPException(status_code=404, detail="Category not found")
+            group = existing["group"]
+        
         # Check if new name already exists (excluding current category)
-        name_exists = await db.categories.find_one({
-            "name": category.name,
-            "group": category.group or existing["group"],
-            "id": {"$ne": category_id}
-        })
+        name_exists = await repository.find_category_by_name(tenant_id, category.name, group, exclude_id=category_id)
         if name_exists:
             raise HTTPException(status_code=400, detail="Category with this name already exists in this group")
         update_data["name"] = category.name
+        update_data["name_key"] = search_key(category.name)
     
     if category.group is not None:
         update_data["group"] = category.group
     if category.order is not None:
         update_data["order"] = category.order
     
-    if update_data:
-        await db.categories.update_one({"id": category_id}, {"$set": update_data})
+    if is_bufferable_move(update_data, version):
+        existing = await repository.get_category(tenant_id, category_id)
+        if not existing:
+            raise HTTPException(status_code=404, detail="Category not found")
+        order_writes.put("category", tenant_id, {category_id: category.order})
+        # The flush keeps the stored version, so this ETag stays good for the next If-Match
+        response.headers["ETag"] = etag(existing.get("version", 0))
+        return Category(**{**existing, "order": category.order})
     
-    updated_category = await db.categories.find_one({"id": category_id})
+    # A buffered move rides along with this write rather than waiting for the flush
+    pending_order = order_writes.take("category", tenant_id, category_id)
+    if pending_order is not None:
+        update_data.setdefault("order", pending_order)
+    
+    try:
+        async with repository.reserve_revisions(tenant_id, 1 if update_data else 0) as revision:
+            if update_data:
+                update_data.update(updated_at=datetime.utcnow(), revision=revision)
+            updated_category = await repository.update_category(tenant_id, category_id, update_data, expected_version=version)
+    except VersionConflict as e:
+        if pending_order is not None:
+            order_writes.put("category", tenant_id, {category_id: pending_order})
+        raise version_conflict("Category", e)
+    if not updated_category:
+        raise HTTPException(status_code=404, detail="Category not found")
+    response.headers["ETag"] = etag(updated_category.get("version", 0))
     return Category(**updated_category)
 
-@app.put("/api/categories/reorder")
-async def reorder_categories(category_orders: List[dict]):
-    """Update order of multiple categories for drag & drop"""
-    for item in category_orders:
-        await db.categories.update_one(
-            {"id": item["id"]},
-            {"$set": {"order": item["order"]}}
-        )
-    return {"message": "Categories reordered successfully"}
-
 @app.delete("/api/categories/{category_id}")
-async def delete_category(category_id: str):
+async def delete_category(category_id: str, tenant_id: str = Depends(get_tenant_id)):
     # Check if category exists
-    existing = await db.categories.find_one({"id": category_id})
+    existing = await repository.get_category(tenant_id, category_id)
     if not existing:
         raise HTTPException(status_code=404, detail="Category not found")
     
     # Delete all tasks in this category first
-    await db.tasks.delete_many({"category_id": category_id})
+    task_ids = await repository.delete_category_tasks(tenant_id, category_id)
+    await repository.record_tombstones(tenant_id, "task", task_ids)
     
     # Delete the category
-    result = await db.categories.delete_one({"id": category_id})
-    
-    if result.deleted_count == 0:
+    if not await repository.delete_category(tenant_id, category_id):
         raise HTTPException(status_code=404, detail="Category not found")
+    await repository.record_tombstones(tenant_id, "category", [category_id])
     
     return {"message": "Category and all its tasks deleted successfully"}
 
 # Tasks endpoints
 @app.get("/api/tasks", response_model=List[Task])
-async def get_tasks(category_id: Optional[str] = None):
-    filter_query = {"category_id": category_id} if category_id else {}
-    # Sort by pinned (pinned first), then priority, then order
-    tasks = await db.tasks.find(filter_query).sort([
-        ("pinned", -1),  # Pinned tasks first
-        ("priority", 1),  # Then by priority (assuming we'll map high=1, medium=2, low=3)
-        ("order", 1)     # Finally by order
-    ]).to_list(length=None)
-    
-    # Manual priority sorting since MongoDB doesn't handle our string priorities well
+async def get_tasks(
+    category_id: Optional[str] = None,
+    fields: Optional[str] = FIELDS_QUERY,
+    include_archived: bool = Query(False, description="Also return completed tasks moved to the archive"),
+    tenant_id: str = Depends(get_tenant_id)
+):
+    selected = parse_fields(fields, Task)
+    projection = selected and list(dict.fromkeys(selected + ["pinned", "priority", "order"]))
+    tasks = order_writes.overlay("task", tenant_id, await repository.list_tasks(tenant_id, category_id, fields=projection), sort=False)
+    if include_archived:
+        tasks += await repository.list_archived_tasks(tenant_id, category_id, fields=projection)
+    
+    # Sort by pinned (pinned first), then priority, then order; string priorities need a manual sort
     priority_order = {"high": 1, "medium": 2, "low": 3}
-    tasks.sort(key=lambda x: (not x.get("pinned", False), priority_order.get(x.get("priority", "medium"), 2), x.get("order", 0)))
+    with timed("compute"):
+        tasks.sort(key=lambda x: (not x.get("pinned", False), priority_order.get(x.get("priority", "medium"), 2), x.get("order", 0)))
     
+    if selected:
+        return sparse_response(Task, selected, tasks)
+    with timed("validate"):
+        return [Task(**task) for task in tasks]
+
+# Deadline views; each is a range scan over the open-tasks-by-due-date index
+DUE_LIMIT_QUERY = Query(100, ge=1, le=1000)
+
+@app.get("/api/tasks/overdue", response_model=List[Task])
+async def get_overdue_tasks(category_id: Optional[str] = None, limit: int = DUE_LIMIT_QUERY, tenant_id: str = Depends(get_tenant_id)):
+    """Open tasks whose deadline has passed, most overdue first"""
+    tasks = await repository.list_due_tasks(tenant_id, before=datetime.utcnow(), category_id=category_id, limit=limit)
     return [Task(**task) for task in tasks]
 
+@app.get("/api/tasks/upcoming", response_model=List[Task])
+async def get_upcoming_tasks(
+    within_hours: float = Query(168, gt=0, le=24 * 366),
+    category_id: Optional[str] = None,
+    limit: int = DUE_LIMIT_QUERY,
+    tenant_id: str = Depends(get_tenant_id)
+):
+    """Open tasks due within the next `within_hours`, soonest first"""
+    now = datetime.utcnow()
+    tasks = await repository.list_due_tasks(
+        tenant_id, after=now, before=now + timedelta(hours=within_hours), category_id=category_id, limit=limit
+    )
+    return [Task(**task) for task in tasks]
+
+@app.get("/api/agenda", response_model=Agenda)
+async def get_agenda(days: int = Query(7, ge=1, le=90), limit: int = Query(500, ge=1, le=5000), tenant_id: str = Depends(get_tenant_id)):
+    """Overdue tasks plus open tasks due today and over the following days (UTC), across categories"""
+    now = datetime.utcnow()
+    today = datetime(now.year, now.month, now.day)
+    overdue, upcoming = await asyncio.gather(
+        repository.list_due_tasks(tenant_id, before=now, limit=limit),
+        repository.list_due_tasks(tenant_id, after=now, before=today + timedelta(days=days), limit=limit)
+    )
+    categories = await repository.get_categories(tenant_id, list({task["category_id"] for task in overdue + upcoming}))
+    
+    def agenda_item(task):
+        return AgendaItem(**task, category_name=categories.get(task["category_id"], {}).get("name", ""))
+    
+    by_day = {(today + timedelta(days=offset)).date(): [] for offset in range(days)}
+    for task in upcoming:
+        by_day[task["due_at"].date()].append(agenda_item(task))
+    
+    return Agenda(
+        overdue=[agenda_item(task) for task in overdue],
+        days=[AgendaDay(day=day, tasks=tasks) for day, tasks in by_day.items()]
+    )
+
 @app.post("/api/tasks", response_model=Task)
-async def create_task(task: TaskCreate):
+async def create_task(task: TaskCreate, tenant_id: str = Depends(get_tenant_id)):
     # Verify category exists
-    category = await db.categories.find_one({"id": task.category_id})
+    category = await repository.get_category(tenant_id, task.category_id)
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
     
-    order = await get_next_order("tasks", {"category_id": task.category_id})
-    
-    task_data = {
-        "id": generate_uuid(),
-        "title": task.title,
-        "weight": task.weight,
-        "category_id": task.category_id,
-        "priority": task.priority,
-        "completed": False,
-        "pinned": False,
-        "order": order,
-        "created_at": datetime.now()
-    }
+    order = await repository.next_order("task", tenant_id, task.category_id)
     
-    await db.tasks.insert_one(task_data)
+    async with repository.reserve_revisions(tenant_id) as revision:
+        task_data = {
+            "tenant_id": tenant_id,
+            "id": generate_uuid(),
+            "title": task.title,
+            "title_key": search_key(task.title),
+            "weight": task.weight,
+            "category_id": task.category_id,
+            "priority": task.priority,
+            "due_at": task.due_at,
+            "completed": False,
+            "pinned": False,
+            "order": order,
+            "created_at": datetime.now(),
+            "updated_at": datetime.utcnow(),
+            "revision": revision,
+            "version": 1
+        }
+        await repository.insert_task(task_data)
     return Task(**task_data)
 
+async def get_live_task(tenant_id: str, task_id: str):
+    """A task by id, brought back from the archive first if it was archived, so it can be changed"""
+    return await repository.get_task(tenant_id, task_id) or await repository.restore_archived_task(tenant_id, task_id)
+
+# Registered before /{task_id} so "reorder" is not taken for an id
+@app.put("/api/tasks/reorder")
+async def reorder_tasks(task_orders: List[dict], tenant_id: str = Depends(get_tenant_id)):
+    """Update order of multiple tasks for drag & drop within category"""
+    orders = {item["id"]: item["order"] for item in task_orders}
+    if order_writes.enabled:
+        order_writes.put("task", tenant_id, orders)
+    elif orders:
+        await write_orders("task", tenant_id, orders)
+    return {"message": "Tasks reordered successfully"}
+
 @app.put("/api/tasks/{task_id}", response_model=Task)
-async def update_task(task_id: str, task_update: TaskUpdate):
-    # Check if task exists
-    existing = await db.tasks.find_one({"id": task_id})
-    if not existing:
-        raise HTTPException(status_code=404, detail="Task not found")
+async def update_task(
+    task_id: str,
+    task_update: TaskUpdate,
+    response: Response,
+    tenant_id: str = Depends(get_tenant_id),
+    if_match: Optional[str] = Header(None)
+):
+    version = expected_version(if_match, task_update.expected_version)
     
     # Prepare update data
     update_data = {}
     if task_update.title is not None:
         update_data["title"] = task_update.title
+        update_data["title_key"] = search_key(task_update.title)
     if task_update.weight is not None:
         update_data["weight"] = task_update.weight
     if task_update.completed is not None:
         update_data["completed"] = task_update.completed
+        # Storage keeps the earlier timestamp when the task was already completed
+        update_data["completed_at"] = datetime.utcnow() if task_update.completed else None
     if task_update.priority is not None:
         update_data["priority"] = task_update.priority
     if task_update.pinned is not None:
         update_data["pinned"] = task_update.pinned
     if task_update.order is not None:
         update_data["order"] = task_update.order
+    if "due_at" in task_update.model_fields_set:
+        update_data["due_at"] = task_update.due_at
+    
+    if is_bufferable_move(update_data, version):
+        existing = await get_live_task(tenant_id, task_id)
+        if not existing:
+            raise HTTPException(status_code=404, detail="Task not found")
+        order_writes.put("task", tenant_id, {task_id: task_update.order})
+        # The flush keeps the stored version, so this ETag stays good for the next If-Match
+        response.headers["ETag"] = etag(existing.get("version", 0))
+        return Task(**{**existing, "order": task_update.order})
     
-    if update_data:
-        await db.tasks.update_one({"id": task_id}, {"$set": update_data})
+    # A buffered move rides along with this write rather than waiting for the flush
+    pending_order = order_writes.take("task", tenant_id, task_id)
+    if pending_order is not None:
+        update_data.setdefault("order", pending_order)
     
-    updated_task = await db.tasks.find_one({"id": task_id})
+    # One conditional write; existence and staleness are only looked into when it misses
+    try:
+        async with repository.reserve_revisions(tenant_id, 1 if update_data else 0) as revision:
+            if update_data:
+                update_data.update(updated_at=datetime.utcnow(), revision=revision)
+            updated_task = await repository.update_task(tenant_id, task_id, update_data, expected_version=version)
+            if updated_task is None and await repository.restore_archived_task(tenant_id, task_id):
+                updated_task = await repository.update_task(tenant_id, task_id, update_data, expected_version=version)
+    except VersionConflict as e:
+        if pending_order is not None:
+            order_writes.put("task", tenant_id, {task_id: pending_order})
+        raise version_conflict("Task", e)
+    if not updated_task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    response.headers["ETag"] = etag(updated_task.get("version", 0))
     return Task(**updated_task)
 
-@app.put("/api/tasks/reorder")
-async def reorder_tasks(task_orders: List[dict]):
-    """Update order of multiple tasks for drag & drop within category"""
-    for item in task_orders:
-        await db.tasks.update_one(
-            {"id": item["id"]},
-            {"$set": {"order": item["order"]}}
-        )
-    return {"message": "Tasks reordered successfully"}
-
 @app.delete("/api/tasks/{task_id}")
-async def delete_task(task_id: str):
-    result = await db.tasks.delete_one({"id": task_id})
-    
-    if result.deleted_count == 0:
+async def delete_task(task_id: str, tenant_id: str = Depends(get_tenant_id)):
+    if not await get_live_task(tenant_id, task_id) or not await repository.delete_task(tenant_id, task_id):
         raise HTTPException(status_code=404, detail="Task not found")
+    await repository.record_tombstones(tenant_id, "task", [task_id])
     
     return {"message": "Task deleted successfully"}
 
 # Progress endpoint
 @app.get("/api/categories/{category_id}/progress", response_model=ProgressResponse)
-async def get_category_progress(category_id: str):
+async def get_category_progress(category_id: str, tenant_id: str = Depends(get_tenant_id)):
     # Check if category exists
-    category = await db.categories.find_one({"id": category_id})
+    category = await repository.get_category(tenant_id, category_id)
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
     
-    progress_percentage, completed_weight, total_weight, task_count, completed_task_count = await calculate_category_progress(category_id)
+    progress_percentage, completed_weight, total_weight, task_count, completed_task_count = await calculate_category_progress(tenant_id, category_id)
     
     return ProgressResponse(
         category_id=category_id,
@@ -354,26 +1751,245 @@ async def get_category_progress(category_id: str):
         completed_task_count=completed_task_count
     )
 
+def progress_response(category: dict, figures: tuple):
+    """ProgressResponse for a category from its progress_from_rollup() figures"""
+    progress_percentage, completed_weight, total_weight, task_count, completed_task_count = figures
+    return ProgressResponse(
+        category_id=category["id"],
+        category_name=category["name"],
+        category_group=category.get("group", "default"),
+        progress_percentage=progress_percentage,
+        completed_weight=completed_weight,
+        total_weight=total_weight,
+        task_count=task_count,
+        completed_task_count=completed_task_count
+    )
+
+async def build_all_progress(tenant_id: str):
+    categories = await repository.list_categories(tenant_id)
+    rollups = await repository.progress_rollups(tenant_id)
+    with timed("compute"):
+        figures = [progress_from_rollup(rollups.get(category["id"])) for category in categories]
+    with timed("validate"):
+        return [progress_response(category, category_figures) for category, category_figures in zip(categories, figures)]
+
 @app.get("/api/progress", response_model=List[ProgressResponse])
-async def get_all_progress():
+async def get_all_progress(request: Request, tenant_id: str = Depends(get_tenant_id)):
     """Get progress for all categories"""
-    categories = await db.categories.find().sort("order", 1).to_list(length=None)
-    progress_data = []
+    return await read_coalescer.do(coalescing_key(request, tenant_id), lambda: build_all_progress(tenant_id))
+
+@app.post("/api/progress/batch", response_model=List[ProgressBatchEntry])
+async def get_progress_batch(request: ProgressBatchRequest, tenant_id: str = Depends(get_tenant_id)):
+    """Progress for the given categories, in request order, from one category lookup and one aggregation"""
+    category_ids = list(dict.fromkeys(request.category_ids))
+    categories, rollups = await asyncio.gather(
+        repository.get_categories(tenant_id, category_ids),
+        repository.progress_rollups(tenant_id, category_ids)
+    )
     
-    for category in categories:
-        progress_percentage, completed_weight, total_weight, task_count, completed_task_count = await calculate_category_progress(category["id"])
-        progress_data.append(ProgressResponse(
-            category_id=category["id"],
-            category_name=category["name"],
-            category_group=category.get("group", "default"),
-            progress_percentage=progress_percentage,
-            completed_weight=completed_weight,
+    with timed("compute"):
+        figures = {category_id: progress_from_rollup(rollups.get(category_id)) for category_id in categories}
+    
+    entries = []
+    with timed("validate"):
+        for category_id in request.category_ids:
+            category = categories.get(category_id)
+            if category is None:
+                entries.append(ProgressBatchEntry(category_id=category_id, found=False))
+            else:
+                entries.append(ProgressBatchEntry(category_id=category_id, found=True, progress=progress_response(category, figures[category_id])))
+    
+    return entries
+
+@app.get("/api/metrics/coalescing")
+async def get_coalescing_metrics():
+    """How many identical concurrent reads were served by a shared computation, per route"""
+    return {
+        "in_flight": len(read_coalescer.inflight),
+        "routes": read_coalescer.stats
+    }
+
+@app.get("/api/progress/history", response_model=List[ProgressSnapshotPoint], dependencies=[Depends(require_mongo)])
+async def get_progress_history(
+    scope: str = Query("category", pattern="^(category|group)$"),
+    key: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    bucket: str = Query("day", pattern="^(hour|day|week)$"),
+    tenant_id: str = Depends(get_tenant_id)
+):
+    """Get progress snapshots in a time range, downsampled to hour/day/week buckets"""
+    end = end or datetime.utcnow()
+    start = start or end - timedelta(days=30)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    
+    match = {"tenant_id": tenant_id, "scope": scope, "taken_at": {"$gte": start, "$lt": end}}
+    if key is not None:
+        match["key"] = key
+    
+    truncate = {"date": "$taken_at", "unit": bucket}
+    if bucket == "week":
+        truncate["startOfWeek"] = "monday"
+    
+    # The (tenant_id, scope, key, taken_at) index serves both the range match and the sort,
+    # so each bucket keeps the latest snapshot taken inside it
+    pipeline = [
+        {"$match": match},
+        {"$sort": {"key": 1, "taken_at": 1}},
+        {"$group": {
+            "_id": {"key": "$key", "bucket": {"$dateTrunc": truncate}},
+            "name": {"$last": "$name"},
+            **{field: {"$last": f"${field}"} for field in ROLLUP_FIELDS}
+        }},
+        {"$sort": {"_id.key": 1, "_id.bucket": 1}}
+    ]
+    
+    points = []
+    async for row in db.progress_snapshots.aggregate(pipeline):
+        total_weight = row["total_weight"]
+        points.append(ProgressSnapshotPoint(
+            scope=scope,
+            key=row["_id"]["key"],
+            name=row["name"],
+            bucket=row["_id"]["bucket"],
+            progress_percentage=(row["completed_weight"] / total_weight * 100) if total_weight > 0 else 0.0,
+            completed_weight=row["completed_weight"],
             total_weight=total_weight,
-            task_count=task_count,
-            completed_task_count=completed_task_count
+            task_count=row["task_count"],
+            completed_task_count=row["completed_task_count"]
         ))
     
-    return progress_data
+    return points
+
+# Analytics endpoint
+# analytics (numpy, pandas) is imported with the first request that needs it
+analytics_cache = OrderedDict()
+
+def compute_analytics(rows: List[tuple], categories: List[dict], today: date, days: int) -> dict:
+    import analytics
+    return analytics.completion_analytics(rows, categories, today, days)
+
+async def build_analytics(tenant_id: str, days: int):
+    today = datetime.utcnow().date()
+    # The revision is read before the data, so a cached result is never older than its key
+    revision, _ = await repository.revision_state(tenant_id)
+    key = (tenant_id, revision, today, days)
+    cached = analytics_cache.get(key)
+    if cached is not None:
+        analytics_cache.move_to_end(key)
+        return cached
+    
+    categories, rows = await asyncio.gather(
+        repository.list_categories(tenant_id, fields=["id", "name", "group"]),
+        repository.completion_rows(tenant_id)
+    )
+    with timed("compute"):
+        figures = await asyncio.to_thread(compute_analytics, rows, categories, today, days)
+    with timed("validate"):
+        response = AnalyticsResponse(revision=revision, **figures)
+    
+    analytics_cache[key] = response
+    while len(analytics_cache) > ANALYTICS_CACHE_SIZE:
+        analytics_cache.popitem(last=False)
+    return response
+
+@app.get("/api/analytics", response_model=AnalyticsResponse)
+async def get_analytics(request: Request, days: int = Query(28, ge=1, le=365), tenant_id: str = Depends(get_tenant_id)):
+    """Completion velocity, weighted burndown and forecasts per category and group over the last `days` days (UTC)"""
+    return await read_coalescer.do(coalescing_key(request, tenant_id), lambda: build_analytics(tenant_id, days))
+
+# Activity heatmap
+@app.get("/api/activity/heatmap", response_model=Heatmap)
+async def get_activity_heatmap(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    tenant_id: str = Depends(get_tenant_id)
+):
+    """Completed weight and task count per day (UTC) from start to end inclusive, a year up to today by default"""
+    end = end or datetime.utcnow().date()
+    start = start or end - timedelta(days=364)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    if (end - start).days >= HEATMAP_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"At most {HEATMAP_MAX_DAYS} days per request")
+    
+    rows = await repository.completion_heatmap(
+        tenant_id, datetime.combine(start, datetime.min.time()), datetime.combine(end + timedelta(days=1), datetime.min.time())
+    )
+    with timed("validate"):
+        by_day = {row["day"].date(): row for row in rows}
+        days = []
+        for offset in range((end - start).days + 1):
+            day = start + timedelta(days=offset)
+            row = by_day.get(day, {})
+            days.append(HeatmapDay(day=day, completed_weight=row.get("completed_weight", 0), completed_count=row.get("completed_count", 0)))
+        return Heatmap(
+            start=start,
+            end=end,
+            total_completed_weight=sum(day.completed_weight for day in days),
+            max_completed_weight=max(day.completed_weight for day in days),
+            days=days
+        )
+
+# Search endpoints
+@app.get("/api/search", response_model=SearchResponse, dependencies=[Depends(require_mongo)])
+async def search(
+    q: str = Query(..., min_length=1),
+    type: str = Query("all", pattern="^(all|task|category)$"),
+    skip: int = Query(0, ge=0, le=1000),
+    limit: int = Query(20, ge=1, le=100),
+    tenant_id: str = Depends(get_tenant_id)
+):
+    """Ranked full-text search over task titles and category names"""
+    sources = []
+    if type in ("all", "task"):
+        sources.append(("task", db.tasks, "title"))
+    if type in ("all", "category"):
+        sources.append(("category", db.categories, "name"))
+    
+    # Each source only needs its top skip+limit hits for the merged page to be exact
+    query = {"tenant_id": tenant_id, "$text": {"$search": q}}
+    hits = []
+    total = 0
+    for hit_type, collection, text_field in sources:
+        total += await collection.count_documents(query)
+        projection = {"_id": 0, "id": 1, text_field: 1, "category_id": 1, "score": {"$meta": "textScore"}}
+        cursor = collection.find(query, projection).sort([("score", {"$meta": "textScore"})]).limit(skip + limit)
+        async for doc in cursor:
+            hits.append(SearchHit(
+                type=hit_type,
+                id=doc["id"],
+                text=doc[text_field],
+                category_id=doc.get("category_id"),
+                score=doc["score"]
+            ))
+    
+    hits.sort(key=lambda hit: hit.score, reverse=True)
+    return SearchResponse(query=q, total=total, skip=skip, limit=limit, results=hits[skip:skip + limit])
+
+@app.get("/api/search/autocomplete", response_model=List[SearchHit], dependencies=[Depends(require_mongo)])
+async def autocomplete(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(10, ge=1, le=50),
+    tenant_id: str = Depends(get_tenant_id)
+):
+    """Prefix suggestions from task titles and category names"""
+    # An anchored, case-sensitive regex on the lowercased key is a tight index range scan
+    prefix = {"$regex": "^" + re.escape(search_key(q))}
+    categories = await db.categories.find(
+        {"tenant_id": tenant_id, "name_key": prefix}, {"_id": 0, "id": 1, "name": 1}
+    ).sort("name_key", 1).limit(limit).to_list(length=limit)
+    tasks = await db.tasks.find(
+        {"tenant_id": tenant_id, "title_key": prefix}, {"_id": 0, "id": 1, "title": 1, "category_id": 1}
+    ).sort("title_key", 1).limit(limit).to_list(length=limit)
+    
+    suggestions = [SearchHit(type="category", id=cat["id"], text=cat["name"]) for cat in categories]
+    suggestions += [
+        SearchHit(type="task", id=task["id"], text=task["title"], category_id=task["category_id"])
+        for task in tasks
+    ]
+    return suggestions[:limit]
 
 # Data Export/Import endpoints for localStorage support
 class ExportData(BaseModel):
@@ -381,54 +1997,604 @@ class ExportData(BaseModel):
     tasks: List[dict]
     exported_at: datetime
 
-@app.get("/api/export", response_model=ExportData)
-async def export_data():
-    """Export all data for localStorage backup"""
-    categories = await db.categories.find().sort("order", 1).to_list(length=None)
-    tasks = await db.tasks.find().sort("order", 1).to_list(length=None)
+MSGPACK_MEDIA_TYPE = "application/x-msgpack"
+SNAPSHOT_CHUNK_BYTES = 64 * 1024
+IMPORT_BATCH_SIZE = 1000
+
+class _IdentityCodec:
+    """Stand-in compressor/decompressor for uncompressed streams"""
+    def compress(self, data):
+        return data
+
+    def decompress(self, data):
+        return data
+
+    def flush(self):
+        return b""
+
+def snapshot_encodings():
+    """Stream encodings available for binary snapshots, best first"""
+    return (["zstd"] if HAS_ZSTANDARD else []) + ["gzip", "identity"]
+
+def negotiate_encoding(accept_encoding: str):
+    accepted = {part.split(";")[0].strip() for part in accept_encoding.lower().split(",")}
+    for encoding in snapshot_encodings():
+        if encoding in accepted:
+            return encoding
+    return "identity"
+
+class _BrotliCodec:
+    """zlib-style compress()/flush() over a brotli.Compressor"""
+    def __init__(self, quality: int):
+        import brotli
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self.compressor.process(data)
+
+    def flush(self):
+        return self.compressor.finish()
+
+def new_compressor(encoding: str, level: int = None):
+    if encoding == "zstd":
+        import zstandard
+        return zstandard.ZstdCompressor(level=level or 3).compressobj()
+    if encoding == "gzip":
+        return zlib.compressobj(level or 6, zlib.DEFLATED, 31)
+    if encoding == "br":
+        return _BrotliCodec(4 if level is None else level)
+    return _IdentityCodec()
+
+def new_decompressor(encoding: str):
+    if encoding == "zstd":
+        import zstandard
+        return zstandard.ZstdDecompressor().decompressobj()
+    if encoding == "gzip":
+        return zlib.decompressobj(31)
+    return _IdentityCodec()
+
+def _pack_timestamp(value):
+    # Stored datetimes are naive UTC; pack them as native msgpack timestamps
+    if isinstance(value, datetime):
+        import msgpack
+        return msgpack.Timestamp.from_datetime(value if value.tzinfo else value.replace(tzinfo=timezone.utc))
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+class SnapshotEncoder:
+    """Packs [kind, document] records into a compressed msgpack stream, incrementally"""
+    def __init__(self, encoding: str):
+        import msgpack
+        self.packer = msgpack.Packer(default=_pack_timestamp)
+        self.compressor = new_compressor(encoding)
+
+    def encode(self, kind: str, document: dict):
+        return self.compressor.compress(self.packer.pack([kind, document]))
+
+    def finish(self):
+        return self.compressor.flush()
+
+class SnapshotDecoder:
+    """Yields [kind, document] records back out of a compressed msgpack stream"""
+    def __init__(self, encoding: str):
+        import msgpack
+        self.decompressor = new_decompressor(encoding)
+        self.unpacker = msgpack.Unpacker(timestamp=3, raw=False)
+
+    def feed(self, chunk: bytes):
+        # Timestamps come back as tz-aware UTC datetimes; prepare_import_document makes them naive
+        self.unpacker.feed(self.decompressor.decompress(chunk))
+        yield from self.unpacker
+
+# Exports are tenant-neutral so a backup can be restored into any tenant
+EXPORT_EXCLUDE = ("tenant_id",)
+
+def prepare_import_document(tenant_id: str, kind: str, document: dict, revision: int, updated_at: datetime):
+    """Derive the owner, search key and sync stamps for an imported category or task"""
+    document.pop("_id", None)
+    for field, value in document.items():
+        if isinstance(value, datetime):
+            document[field] = naive_utc(value)
+    document["tenant_id"] = tenant_id
+    if kind == "category" and "name" in document:
+        document["name_key"] = search_key(document["name"])
+    if kind == "task" and "title" in document:
+        document["title_key"] = search_key(document["title"])
+    document.update(revision=revision, updated_at=updated_at)
+    return document
+
+def export_sources(tenant_id: str):
+    """(kind, async iterator) pairs making up a tenant's dataset; archived tasks are exported as plain tasks"""
+    return [
+        ("category", repository.iter_documents("category", tenant_id, exclude=EXPORT_EXCLUDE)),
+        ("task", repository.iter_documents("task", tenant_id, exclude=EXPORT_EXCLUDE)),
+        ("task", repository.iter_archived_tasks(tenant_id, exclude=EXPORT_EXCLUDE + ("archived_at",)))
+    ]
+
+async def stream_snapshot(tenant_id: str, encoding: str):
+    """Encode a tenant's whole dataset straight from the cursors in ~64 KB compressed chunks"""
+    encoder = SnapshotEncoder(encoding)
+    chunks = [encoder.encode("header", {"version": 1, "exported_at": datetime.utcnow()})]
+    size = len(chunks[0])
     
-    # Remove MongoDB _id fields to avoid serialization issues
-    for category in categories:
-        category.pop('_id', None)
-    for task in tasks:
-        task.pop('_id', None)
+    for kind, documents in export_sources(tenant_id):
+        async for document in documents:
+            chunk = encoder.encode(kind, document)
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= SNAPSHOT_CHUNK_BYTES:
+                yield b"".join(chunks)
+                chunks, size = [], 0
+    
+    chunks.append(encoder.finish())
+    yield b"".join(chunks)
+
+@app.get("/api/export", response_model=ExportData, responses={200: {"content": {MSGPACK_MEDIA_TYPE: {}}}})
+async def export_data(request: Request, tenant_id: str = Depends(get_tenant_id)):
+    """Export all data for localStorage backup (JSON, or streamed msgpack on Accept: application/x-msgpack)"""
+    if MSGPACK_MEDIA_TYPE in request.headers.get("accept", ""):
+        encoding = negotiate_encoding(request.headers.get("accept-encoding", ""))
+        headers = {"Content-Encoding": encoding} if encoding != "identity" else {}
+        return StreamingResponse(stream_snapshot(tenant_id, encoding), media_type=MSGPACK_MEDIA_TYPE, headers=headers)
+    
+    exported = {"category": [], "task": []}
+    for kind, documents in export_sources(tenant_id):
+        exported[kind] += [document async for document in documents]
     
     return ExportData(
-        categories=categories,
-        tasks=tasks,
+        categories=exported["category"],
+        tasks=exported["task"],
         exported_at=datetime.utcnow()
     )
 
-@app.post("/api/import")
-async def import_data(data: ExportData):
-    """Import data from localStorage backup"""
+async def import_snapshot_stream(request: Request, tenant_id: str):
+    """Decode a binary snapshot as it arrives and insert it in batches"""
+    encoding = request.headers.get("content-encoding", "identity").lower()
+    if encoding not in snapshot_encodings():
+        raise HTTPException(status_code=415, detail=f"Unsupported Content-Encoding: {encoding}")
+    
+    decoder = SnapshotDecoder(encoding)
+    batches = {"category": [], "task": []}
+    revision = None
+    updated_at = datetime.utcnow()
+    
+    async for chunk in request.stream():
+        for kind, document in decoder.feed(chunk):
+            if kind == "header":
+                # Only wipe existing data once a well-formed stream has started
+                await repository.clear_tenant(tenant_id)
+                revision = await repository.reset_sync_history(tenant_id)
+                continue
+            if revision is None or kind not in batches:
+                raise HTTPException(status_code=400, detail="Malformed snapshot stream")
+            
+            batch = batches[kind]
+            batch.append(prepare_import_document(tenant_id, kind, document, revision, updated_at))
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                await repository.insert_many(kind, batch)
+                batch.clear()
+    
+    if revision is None:
+        raise HTTPException(status_code=400, detail="Empty snapshot stream")
+    for kind, batch in batches.items():
+        await repository.insert_many(kind, batch)
+
+@app.post("/api/import", openapi_extra={"requestBody": {"content": {
+    "application/json": {"schema": ExportData.model_json_schema()},
+    MSGPACK_MEDIA_TYPE: {}
+}}})
+async def import_data(request: Request, tenant_id: str = Depends(get_tenant_id)):
+    """Import data from localStorage backup (JSON, or a streamed msgpack snapshot)"""
+    if request.headers.get("content-type", "").startswith(MSGPACK_MEDIA_TYPE):
+        try:
+            await import_snapshot_stream(request, tenant_id)
+            return {"message": "Data imported successfully"}
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Import failed: {str(e)}")
+    
+    try:
+        data = ExportData.model_validate_json(await request.body())
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+    
     try:
         # Clear existing data
-        await db.categories.delete_many({})
-        await db.tasks.delete_many({})
+        await repository.clear_tenant(tenant_id)
         
-        # Import categories
-        if data.categories:
-            await db.categories.insert_many(data.categories)
+        revision = await repository.reset_sync_history(tenant_id)
+        updated_at = datetime.utcnow()
+        for category in data.categories:
+            prepare_import_document(tenant_id, "category", category, revision, updated_at)
+        for task in data.tasks:
+            prepare_import_document(tenant_id, "task", task, revision, updated_at)
         
-        # Import tasks
-        if data.tasks:
-            await db.tasks.insert_many(data.tasks)
+        # Import categories, then tasks
+        await repository.insert_many("category", data.categories)
+        await repository.insert_many("task", data.tasks)
             
         return {"message": "Data imported successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Import failed: {str(e)}")
 
 @app.delete("/api/clear-all")
-async def clear_all_data():
-    """Clear all data (for fresh start)"""
+async def clear_all_data(tenant_id: str = Depends(get_tenant_id)):
+    """Clear all of the caller's data (for fresh start)"""
     try:
-        await db.categories.delete_many({})
-        await db.tasks.delete_many({})
+        await repository.clear_tenant(tenant_id)
+        await repository.reset_sync_history(tenant_id)
         return {"message": "All data cleared successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Clear failed: {str(e)}")
 
+# Delta sync endpoints for the localStorage client
+SYNC_EXCLUDE = ("tenant_id", "title_key", "name_key")
+SYNC_MODELS = {
+    "category": Category,
+    "task": Task
+}
+
+@app.get("/api/sync", response_model=SyncPullResponse)
+async def sync_pull(since: int = Query(0, ge=0), tenant_id: str = Depends(get_tenant_id)):
+    """Return categories, tasks and deletions written after revision `since`"""
+    revision, reset_revision = await repository.revision_state(tenant_id)
+    
+    # A first sync, or one from before the last import/clear, gets the full dataset
+    if since == 0 or since < reset_revision:
+        categories = [document async for document in repository.iter_documents("category", tenant_id, exclude=SYNC_EXCLUDE)]
+        tasks = [document async for document in repository.iter_documents("task", tenant_id, exclude=SYNC_EXCLUDE)]
+        # Archived tasks are still the client's data; like export, send them as plain tasks
+        tasks += [document async for document in repository.iter_archived_tasks(tenant_id, exclude=SYNC_EXCLUDE + ("archived_at",))]
+        return SyncPullResponse(revision=revision, reset=True, categories=categories, tasks=tasks, deleted=[])
+    
+    categories, tasks, deleted = await repository.changes_since(tenant_id, since, exclude=SYNC_EXCLUDE)
+    
+    # `revision` stops below any write still in flight when it was read; changes above it that are
+    # already here are sent again next time rather than letting the client skip past that write
+    return SyncPullResponse(revision=revision, reset=False, categories=categories, tasks=tasks, deleted=deleted)
+
+@app.post("/api/sync", response_model=SyncPushResponse)
+async def sync_push(request: SyncPushRequest, tenant_id: str = Depends(get_tenant_id)):
+    """Apply a batch of client changes; the newest updated_at wins each conflict"""
+    applied = []
+    rejected = []
+    
+    for change in request.changes:
+        model = SYNC_MODELS[change.type]
+        updated_at = change.updated_at
+        if updated_at.tzinfo:
+            updated_at = updated_at.astimezone(timezone.utc).replace(tzinfo=None)
+        if change.type == "task":
+            # Changes to an archived task apply to it back in the hot set, never to a second copy
+            await repository.restore_archived_task(tenant_id, change.id)
+        
+        # Only overwrite or delete documents the client has seen a newer version of
+        if change.op == "delete":
+            if not await repository.delete_if_newer(change.type, tenant_id, change.id, updated_at):
+                rejected.append({"id": change.id, "reason": "not found or newer on server"})
+                continue
+            if change.type == "category":
+                task_ids = await repository.delete_category_tasks(tenant_id, change.id)
+                await repository.record_tombstones(tenant_id, "task", task_ids)
+            await repository.record_tombstones(tenant_id, change.type, [change.id])
+            applied.append(change.id)
+            continue
+        
+        tombstone = await repository.find_tombstone(tenant_id, change.type, change.id)
+        if tombstone and tombstone["deleted_at"] >= updated_at:
+            rejected.append({"id": change.id, "reason": "deleted on server"})
+            continue
+        
+        # An existing document keeps its creation time; only a new one is stamped now
+        stored = await (repository.get_task if change.type == "task" else repository.get_category)(tenant_id, change.id)
+        created_at = stored["created_at"] if stored and stored.get("created_at") else change.data.get("created_at", datetime.now())
+        try:
+            item = model(**{**change.data, "created_at": created_at, "id": change.id})
+        except ValueError as e:
+            rejected.append({"id": change.id, "reason": f"invalid: {e}"})
+            continue
+        if change.type == "task" and not await repository.get_category(tenant_id, item.category_id):
+            rejected.append({"id": change.id, "reason": "category not found"})
+            continue
+        
+        document = item.model_dump()
+        document.pop("archived_at", None)
+        document["tenant_id"] = tenant_id
+        if change.type == "task":
+            document["title_key"] = search_key(item.title)
+            # A task completed earlier keeps its completion time; clients that don't send completed_at
+            # completed the task when they made this change
+            if not item.completed:
+                document["completed_at"] = None
+            elif stored and stored.get("completed") and stored.get("completed_at"):
+                document["completed_at"] = stored["completed_at"]
+            elif item.completed_at is None:
+                document["completed_at"] = updated_at
+        else:
+            document["name_key"] = search_key(item.name)
+        async with repository.reserve_revisions(tenant_id) as revision:
+            document.update(updated_at=updated_at, revision=revision)
+            written = await repository.upsert_if_newer(change.type, document, updated_at)
+        if not written:
+            rejected.append({"id": change.id, "reason": "newer on server"})
+            continue
+        if tombstone:
+            await repository.delete_tombstone(tenant_id, change.type, change.id)
+        applied.append(change.id)
+    
+    revision, _ = await repository.revision_state(tenant_id)
+    return SyncPushResponse(revision=revision, applied=applied, rejected=rejected)
+
+# Background jobs for heavy operations
+class JobCancelled(Exception):
+    pass
+
+job_wakeup = asyncio.Event()
+
+def job_response(job: dict):
+    result_url = None
+    if job["type"] == "export" and job["status"] == "succeeded":
+        result_url = f"/api/jobs/{job['id']}/result"
+    return Job(**job, result_url=result_url)
+
+async def submit_job(tenant_id: str, job_type: str, job_id: str = None, total: int = None):
+    job = {
+        "tenant_id": tenant_id,
+        "id": job_id or generate_uuid(),
+        "type": job_type,
+        "status": "queued",
+        "progress": {"done": 0, "total": total},
+        "checkpoint": {},
+        "attempts": 0,
+        "cancel_requested": False,
+        "created_at": datetime.utcnow()
+    }
+    await db.jobs.insert_one(job)
+    job_wakeup.set()
+    return job
+
+async def claim_next_job():
+    """Atomically take the oldest queued job, or a running one whose worker stopped renewing its lease"""
+    from pymongo import ReturnDocument
+    now = datetime.utcnow()
+    return await db.jobs.find_one_and_update(
+        {"$or": [
+            {"status": "queued"},
+            {"status": "running", "lease_until": {"$lt": now}}
+        ]},
+        {
+            "$set": {"status": "running", "lease_until": now + timedelta(seconds=JOB_LEASE_SECONDS)},
+            "$min": {"started_at": now},
+            "$inc": {"attempts": 1}
+        },
+        sort=[("created_at", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+async def job_checkpoint(job: dict, **fields):
+    """Persist progress/resume state, renew the lease, and stop if cancellation was requested"""
+    from pymongo import ReturnDocument
+    fields["lease_until"] = datetime.utcnow() + timedelta(seconds=JOB_LEASE_SECONDS)
+    updated = await db.jobs.find_one_and_update(
+        {"id": job["id"], "status": "running"},
+        {"$set": fields},
+        return_document=ReturnDocument.AFTER
+    )
+    if updated is None or updated["cancel_requested"]:
+        raise JobCancelled()
+    job.update(updated)
+
+async def finish_job(job: dict, status: str, error: str = None, **fields):
+    finished_at = datetime.utcnow()
+    await db.jobs.update_one({"id": job["id"]}, {"$set": {
+        "status": status,
+        "error": error,
+        "finished_at": finished_at,
+        "expires_at": finished_at + timedelta(hours=JOB_RETENTION_HOURS),
+        **fields
+    }, "$unset": {"lease_until": ""}})
+    await db.job_payloads.delete_many({"job_id": job["id"]})
+
+async def run_import_job(job: dict):
+    tenant_id = job["tenant_id"]
+    checkpoint = job["checkpoint"]
+    if not checkpoint.get("cleared"):
+        await repository.clear_tenant(tenant_id)
+        checkpoint = {"cleared": True, "revision": await repository.reset_sync_history(tenant_id), "next_seq": 0, "updated_at": datetime.utcnow()}
+        await job_checkpoint(job, checkpoint=checkpoint)
+    
+    done = job["progress"]["done"]
+    async for chunk in db.job_payloads.find({"job_id": job["id"], "seq": {"$gte": checkpoint["next_seq"]}}).sort("seq", 1):
+        documents = [
+            prepare_import_document(tenant_id, chunk["kind"], document, checkpoint["revision"], checkpoint["updated_at"])
+            for document in chunk["documents"]
+        ]
+        # A batch may have partly landed before a crash; re-runs skip existing ids
+        await repository.insert_many(chunk["kind"], documents, ignore_duplicates=True)
+        done += len(documents)
+        checkpoint["next_seq"] = chunk["seq"] + 1
+        await job_checkpoint(job, checkpoint=checkpoint, **{"progress.done": done})
+
+async def run_export_job(job: dict):
+    from bson import Binary
+    # Exports are cheap to redo, so a resumed export simply starts over
+    await db.job_results.delete_many({"job_id": job["id"]})
+    written = 0
+    seq = 0
+    async for chunk in stream_snapshot(job["tenant_id"], "gzip"):
+        await db.job_results.insert_one({"job_id": job["id"], "seq": seq, "data": Binary(chunk), "created_at": datetime.utcnow()})
+        seq += 1
+        written += len(chunk)
+        await job_checkpoint(job, **{"progress.done": written})
+
+async def run_clear_all_job(job: dict):
+    tenant_id = job["tenant_id"]
+    done = job["progress"]["done"]
+    for kind in ("task", "category"):
+        while True:
+            deleted = await repository.delete_batch(kind, tenant_id, IMPORT_BATCH_SIZE)
+            if not deleted:
+                break
+            done += deleted
+            await job_checkpoint(job, **{"progress.done": done})
+    await repository.reset_sync_history(tenant_id)
+
+JOB_HANDLERS = {
+    "import": run_import_job,
+    "export": run_export_job,
+    "clear-all": run_clear_all_job
+}
+
+async def execute_job(job: dict):
+    if job["attempts"] > JOB_MAX_ATTEMPTS:
+        await finish_job(job, "failed", error=f"Gave up after {JOB_MAX_ATTEMPTS} attempts")
+        return
+    try:
+        await JOB_HANDLERS[job["type"]](job)
+    except JobCancelled:
+        await finish_job(job, "cancelled")
+    except asyncio.CancelledError:
+        # Shutting down: release the lease so the next worker resumes right away
+        await asyncio.shield(db.jobs.update_one(
+            {"id": job["id"], "status": "running"}, {"$set": {"lease_until": datetime.utcnow()}}
+        ))
+        raise
+    except Exception as e:
+        logger.exception("Job %s (%s) failed", job["id"], job["type"])
+        await finish_job(job, "failed", error=str(e))
+    else:
+        await finish_job(job, "succeeded", **{"progress.total": job["progress"]["done"]})
+
+async def run_job_worker():
+    """Claim and run jobs one at a time; JOB_WORKERS of these bound job concurrency"""
+    while True:
+        try:
+            job = await claim_next_job()
+        except Exception:
+            logger.exception("Claiming a job failed")
+            job = None
+        if job is None:
+            job_wakeup.clear()
+            try:
+                await asyncio.wait_for(job_wakeup.wait(), JOB_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        await execute_job(job)
+
+async def stage_import_payload(request: Request, job_id: str):
+    """Store the uploaded snapshot as ordered chunks the import job can resume from"""
+    seq = 0
+    total = 0
+    
+    async def stage(kind: str, documents: List[dict]):
+        nonlocal seq, total
+        for start in range(0, len(documents), IMPORT_BATCH_SIZE):
+            batch = documents[start:start + IMPORT_BATCH_SIZE]
+            await db.job_payloads.insert_one({"job_id": job_id, "seq": seq, "kind": kind, "documents": batch})
+            seq += 1
+            total += len(batch)
+    
+    if request.headers.get("content-type", "").startswith(MSGPACK_MEDIA_TYPE):
+        encoding = request.headers.get("content-encoding", "identity").lower()
+        if encoding not in snapshot_encodings():
+            raise HTTPException(status_code=415, detail=f"Unsupported Content-Encoding: {encoding}")
+        decoder = SnapshotDecoder(encoding)
+        batches = {"category": [], "task": []}
+        async for chunk in request.stream():
+            for kind, document in decoder.feed(chunk):
+                if kind not in batches:
+                    continue
+                batches[kind].append(document)
+                if len(batches[kind]) >= IMPORT_BATCH_SIZE:
+                    await stage(kind, batches[kind])
+                    batches[kind] = []
+        for kind, batch in batches.items():
+            await stage(kind, batch)
+    else:
+        try:
+            data = ExportData.model_validate_json(await request.body())
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+        # Categories are staged first so tasks are never imported ahead of them
+        await stage("category", data.categories)
+        await stage("task", data.tasks)
+    return total
+
+@app.post("/api/jobs/import", response_model=Job, status_code=202, dependencies=[Depends(require_mongo)], openapi_extra={"requestBody": {"content": {
+    "application/json": {"schema": ExportData.model_json_schema()},
+    MSGPACK_MEDIA_TYPE: {}
+}}})
+async def submit_import_job(request: Request, tenant_id: str = Depends(get_tenant_id)):
+    """Stage a JSON or msgpack snapshot and import it in the background"""
+    job_id = generate_uuid()
+    try:
+        total = await stage_import_payload(request, job_id)
+    except Exception:
+        await db.job_payloads.delete_many({"job_id": job_id})
+        raise
+    return job_response(await submit_job(tenant_id, "import", job_id=job_id, total=total))
+
+@app.post("/api/jobs/export", response_model=Job, status_code=202, dependencies=[Depends(require_mongo)])
+async def submit_export_job(tenant_id: str = Depends(get_tenant_id)):
+    """Build a gzip msgpack export in the background; download it from result_url"""
+    return job_response(await submit_job(tenant_id, "export"))
+
+@app.post("/api/jobs/clear-all", response_model=Job, status_code=202, dependencies=[Depends(require_mongo)])
+async def submit_clear_all_job(tenant_id: str = Depends(get_tenant_id)):
+    """Delete all of the caller's data in the background"""
+    return job_response(await submit_job(tenant_id, "clear-all"))
+
+@app.get("/api/jobs", response_model=List[Job], dependencies=[Depends(require_mongo)])
+async def list_jobs(limit: int = Query(20, ge=1, le=100), tenant_id: str = Depends(get_tenant_id)):
+    jobs = await db.jobs.find({"tenant_id": tenant_id}).sort("created_at", -1).limit(limit).to_list(length=limit)
+    return [job_response(job) for job in jobs]
+
+@app.get("/api/jobs/{job_id}", response_model=Job, dependencies=[Depends(require_mongo)])
+async def get_job(job_id: str, tenant_id: str = Depends(get_tenant_id)):
+    job = await db.jobs.find_one({"tenant_id": tenant_id, "id": job_id})
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_response(job)
+
+@app.post("/api/jobs/{job_id}/cancel", response_model=Job, dependencies=[Depends(require_mongo)])
+async def cancel_job(job_id: str, tenant_id: str = Depends(get_tenant_id)):
+    """Cancel a queued job now, or ask a running one to stop at its next checkpoint"""
+    from pymongo import ReturnDocument
+    job = await db.jobs.find_one_and_update(
+        {"tenant_id": tenant_id, "id": job_id, "status": "queued"},
+        {"$set": {"status": "cancelled", "finished_at": datetime.utcnow(),
+                  "expires_at": datetime.utcnow() + timedelta(hours=JOB_RETENTION_HOURS)}},
+        return_document=ReturnDocument.AFTER
+    )
+    if job:
+        await db.job_payloads.delete_many({"job_id": job_id})
+    else:
+        job = await db.jobs.find_one_and_update(
+            {"tenant_id": tenant_id, "id": job_id},
+            {"$set": {"cancel_requested": True}},
+            return_document=ReturnDocument.AFTER
+        )
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_response(job)
+
+@app.get("/api/jobs/{job_id}/result", dependencies=[Depends(require_mongo)])
+async def get_job_result(job_id: str, tenant_id: str = Depends(get_tenant_id)):
+    """Download the output of a finished export job"""
+    job = await db.jobs.find_one({"tenant_id": tenant_id, "id": job_id})
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["type"] != "export" or job["status"] != "succeeded":
+        raise HTTPException(status_code=409, detail="Job has no result available")
+    
+    async def chunks():
+        async for chunk in db.job_results.find({"job_id": job_id}).sort("seq", 1):
+            yield bytes(chunk["data"])
+    
+    return StreamingResponse(chunks(), media_type=MSGPACK_MEDIA_TYPE, headers={"Content-Encoding": "gzip"})
+
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
+    # Multi-worker launcher; `uvicorn server:app` still works for a single development process
+    from launcher import main
+    main()
@@ -0,0 +1,1648 @@
+"""Storage engines for categories, tasks, progress and delta-sync bookkeeping.
+
+server.py talks to a Repository instead of a database handle, so the same API runs
+on MongoDB (Motor), a process-local in-memory engine, or a SQLite file. Every
+operation is scoped by tenant_id. Documents go in and come out as plain dicts
+shaped like the MongoDB documents (without `_id`).
+"""
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from operator import itemgetter
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import itertools
+import json
+import sqlite3
+import time
+
+
+KINDS = ("category", "task")
+ROLLUP_FIELDS = ("completed_weight", "total_weight", "task_count", "completed_task_count")
+# Open tasks with a deadline; the only tasks the due-date index covers
+OPEN_DUE_FILTER = {"completed": False, "due_at": {"$type": "date"}}
+# A reserved revision that is neither written nor released within this long is treated as abandoned
+REVISION_LEASE_SECONDS = 60
+
+class VersionConflict(Exception):
+    """A conditional update found the document at a different version than the caller expected"""
+    def __init__(self, current_version: int):
+        super().__init__(f"Document is at version {current_version}")
+        self.current_version = current_version
+
+def _strip(document: dict, exclude=()):
+    return {field: value for field, value in document.items() if field not in exclude}
+
+def _pick(document: dict, fields=None):
+    if fields is None:
+        return dict(document)
+    return {field: document[field] for field in fields if field in document}
+
+def _completion_fields(document: dict, fields: dict):
+    """`fields` without a completed_at that would overwrite an earlier completion of `document`"""
+    if fields.get("completed") and document.get("completed") and "completed_at" in fields:
+        return _strip(fields, ("completed_at",))
+    return fields
+
+def _completion_pipeline(fields: dict):
+    """Mongo update pipeline setting `fields` (bumping `version`) that keeps the stored completed_at when
+    the task was already completed, or None if `fields` doesn't complete the task"""
+    if not (fields.get("completed") and "completed_at" in fields):
+        return None
+    values = {field: {"$literal": value} for field, value in _strip(fields, ("version", "completed_at")).items()}
+    completed_at = {"$cond": [{"$eq": ["$completed", True]}, "$completed_at", {"$literal": fields["completed_at"]}]}
+    return [{"$set": {**values, "completed_at": completed_at, "version": {"$add": [{"$ifNull": ["$version", 0]}, 1]}}}]
+
+def _projection(fields=None):
+    return {"_id": 0, **{field: 1 for field in fields}} if fields is not None else {"_id": 0}
+
+def _merge_rollups(rollups: Dict[str, dict], extra: Dict[str, dict]):
+    """Add `extra` (e.g. archived totals) into `rollups`, both keyed by category id"""
+    for category_id, totals in extra.items():
+        rollup = rollups.setdefault(category_id, dict.fromkeys(ROLLUP_FIELDS, 0))
+        for field in ROLLUP_FIELDS:
+            rollup[field] += totals[field]
+    return rollups
+
+def _naive_utc(value: datetime):
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
+def _ordinal(value):
+    return value.toordinal() if isinstance(value, datetime) else 0
+
+def _completion_row(task: dict):
+    completed = bool(task.get("completed"))
+    done = _ordinal(task.get("completed_at") or task.get("updated_at")) if completed else 0
+    return (task.get("category_id"), task.get("weight") or 0, completed, _ordinal(task.get("created_at")), done)
+
+class Repository:
+    """Tenant-scoped storage API behind every category/task/progress operation"""
+    name = "base"
+
+    async def initialize(self):
+        """Create tables/indexes; called once at startup"""
+
+    async def close(self):
+        """Release connections and threads"""
+
+    # Categories
+    async def list_categories(self, tenant_id: str, fields: List[str] = None) -> List[dict]:
+        """All of a tenant's categories in display order, optionally with only `fields`"""
+        raise NotImplementedError
+
+    async def get_category(self, tenant_id: str, category_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    async def get_categories(self, tenant_id: str, category_ids: List[str]) -> Dict[str, dict]:
+        """The existing categories among `category_ids`, keyed by id"""
+        raise NotImplementedError
+
+    async def find_category_by_name(self, tenant_id: str, name: str, group: Optional[str], exclude_id: str = None) -> Optional[dict]:
+        raise NotImplementedError
+
+    async def insert_category(self, document: dict):
+        raise NotImplementedError
+
+    async def update_category(self, tenant_id: str, category_id: str, fields: dict, expected_version: int = None) -> Optional[dict]:
+        """Set `fields`, bump `version` and return the updated category, or None if it does not exist.
+
+        With expected_version, the write only happens at that version (a missing version counts
+        as 0); otherwise VersionConflict is raised.
+        """
+        raise NotImplementedError
+
+    async def delete_category(self, tenant_id: str, category_id: str) -> bool:
+        raise NotImplementedError
+
+    # Tasks
+    async def list_tasks(self, tenant_id: str, category_id: str = None, fields: List[str] = None) -> List[dict]:
+        """A tenant's tasks (optionally of one category) in `order`, optionally with only `fields`"""
+        raise NotImplementedError
+
+    async def get_task(self, tenant_id: str, task_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    async def insert_task(self, document: dict):
+        raise NotImplementedError
+
+    async def update_task(self, tenant_id: str, task_id: str, fields: dict, expected_version: int = None) -> Optional[dict]:
+        """Like update_category, for tasks. A `completed_at` sent along with `completed: True` is left
+        out if the task was already completed, so completing it again keeps the first timestamp"""
+        raise NotImplementedError
+
+    async def delete_task(self, tenant_id: str, task_id: str) -> bool:
+        raise NotImplementedError
+
+    async def delete_category_tasks(self, tenant_id: str, category_id: str) -> List[str]:
+        """Delete every task of a category, archived ones included, and return their ids"""
+        raise NotImplementedError
+
+    async def next_order(self, kind: str, tenant_id: str, category_id: str = None) -> int:
+        """Order value that places a new category (or task within `category_id`) last"""
+        raise NotImplementedError
+
+    async def list_due_tasks(self, tenant_id: str, before: datetime = None, after: datetime = None,
+                             category_id: str = None, limit: int = 100) -> List[dict]:
+        """Incomplete tasks with a due_at in [after, before), soonest first"""
+        raise NotImplementedError
+
+    # Archive: old completed tasks leave the hot set but keep counting toward progress
+    async def archive_completed_tasks(self, completed_before: datetime, limit: int) -> int:
+        """Move up to `limit` tasks completed before `completed_before` (by last update for tasks completed
+        before completions were timestamped), across tenants, into the archive and fold them into
+        per-category archived totals; return how many moved"""
+        raise NotImplementedError
+
+    async def list_archived_tasks(self, tenant_id: str, category_id: str = None, fields: List[str] = None) -> List[dict]:
+        """A tenant's archived tasks (optionally of one category) in `order`, optionally with only `fields`"""
+        raise NotImplementedError
+
+    def iter_archived_tasks(self, tenant_id: str, exclude=()):
+        """Async iterator over a tenant's archived tasks in `order`, without `exclude` fields"""
+        raise NotImplementedError
+
+    async def restore_archived_task(self, tenant_id: str, task_id: str) -> Optional[dict]:
+        """Move an archived task back to the hot set and return it; None if it is not archived"""
+        raise NotImplementedError
+
+    # Progress
+    async def progress_rollups(self, tenant_id: str, category_ids: List[str] = None) -> Dict[str, dict]:
+        """Weights and counts per category id, live and archived tasks together, for categories that have any"""
+        raise NotImplementedError
+
+    async def completion_heatmap(self, tenant_id: str, start: datetime, end: datetime) -> List[dict]:
+        """{"day", "completed_weight", "completed_count"} per UTC day with tasks completed in [start, end),
+        live and archived tasks together, in day order; days without completions are left out"""
+        raise NotImplementedError
+
+    async def completion_rows(self, tenant_id: str) -> List[tuple]:
+        """(category_id, weight, completed flag, created day, done day) per task, live and archived together,
+        in no particular order. Days are proleptic ordinals of the UTC day, 0 when unknown; the done day is
+        the completed_at day, else the updated_at day, and 0 for open tasks"""
+        raise NotImplementedError
+
+    # Bulk operations
+    def iter_documents(self, kind: str, tenant_id: str, exclude=()):
+        """Async iterator over a tenant's categories or tasks in `order`, without `exclude` fields"""
+        raise NotImplementedError
+
+    async def insert_many(self, kind: str, documents: List[dict], ignore_duplicates: bool = False):
+        """Insert documents; with ignore_duplicates, ids that already exist are skipped"""
+        raise NotImplementedError
+
+    async def set_orders(self, kind: str, tenant_id: str, orders: Dict[str, int], updated_at: datetime, first_revision: int,
+                         bump_version: bool = True) -> int:
+        """Set `order` on many categories or tasks in one write, bumping `version` unless told not to; revisions
+        count up from `first_revision` in `orders` order. Ids that no longer exist are skipped; return how many were set"""
+        raise NotImplementedError
+
+    async def delete_batch(self, kind: str, tenant_id: str, limit: int) -> int:
+        """Delete up to `limit` of a tenant's categories or tasks (archived tasks once no live ones are
+        left) and return how many went"""
+        raise NotImplementedError
+
+    async def clear_tenant(self, tenant_id: str):
+        """Delete all of a tenant's categories and tasks, archived ones included"""
+        raise NotImplementedError
+
+    # Delta sync bookkeeping
+    async def next_revision(self, tenant_id: str, count: int = 1) -> int:
+        """Reserve `count` consecutive revisions for a tenant and return the last one. They hold back
+        revision_state until released (or until REVISION_LEASE_SECONDS pass); see reserve_revisions"""
+        raise NotImplementedError
+
+    async def release_revisions(self, tenant_id: str, last: int, count: int = 1):
+        """Mark revisions from next_revision as written, or abandoned"""
+        raise NotImplementedError
+
+    @asynccontextmanager
+    async def reserve_revisions(self, tenant_id: str, count: int = 1):
+        """Revisions held for the duration of the write that stores them; yields the last one (None for 0)"""
+        if not count:
+            yield None
+            return
+        last = await self.next_revision(tenant_id, count)
+        try:
+            yield last
+        finally:
+            await self.release_revisions(tenant_id, last, count)
+
+    async def revision_state(self, tenant_id: str) -> Tuple[int, int]:
+        """(revision up to which every write is stored, revision of the last full reset). Revisions that
+        are reserved but not yet written are not counted, so a reader can safely resume after it"""
+        raise NotImplementedError
+
+    async def reset_sync_history(self, tenant_id: str) -> int:
+        """Start a new sync epoch after a bulk replace; clients behind it resync in full"""
+        raise NotImplementedError
+
+    async def record_tombstones(self, tenant_id: str, kind: str, ids: List[str]):
+        """Remember deletions so delta sync can replay them to clients"""
+        raise NotImplementedError
+
+    async def changes_since(self, tenant_id: str, since: int, exclude=()) -> Tuple[List[dict], List[dict], List[dict]]:
+        """(categories, tasks, tombstones) with a revision above `since`, in revision order"""
+        raise NotImplementedError
+
+    async def find_tombstone(self, tenant_id: str, kind: str, item_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    async def delete_tombstone(self, tenant_id: str, kind: str, item_id: str):
+        raise NotImplementedError
+
+    async def upsert_if_newer(self, kind: str, document: dict, updated_at: datetime) -> bool:
+        """Write `document` (bumping `version`) unless the stored copy has an updated_at at or after `updated_at`.
+        Like update_task, an already completed task keeps its stored completed_at"""
+        raise NotImplementedError
+
+    async def delete_if_newer(self, kind: str, tenant_id: str, item_id: str, updated_at: datetime) -> bool:
+        """Delete unless the stored copy has an updated_at at or after `updated_at`"""
+        raise NotImplementedError
+
+class MongoRepository(Repository):
+    """Motor-backed engine; the production default.
+
+    pymongo is imported inside the methods that need it, so choosing another
+    engine (or serving before the first query) never loads it.
+    """
+    name = "mongo"
+    COLLECTIONS = {"category": "categories", "task": "tasks", "archived_task": "archived_tasks"}
+
+    def __init__(self, database):
+        self.db = database
+
+    def _collection(self, kind):
+        return getattr(self.db, self.COLLECTIONS[kind])
+
+    async def initialize(self):
+        # Every index leads with tenant_id, so per-tenant queries stay small as the
+        # collections grow, and {tenant_id: 1, ...} is ready to be the shard key
+        await self.db.categories.create_index([("tenant_id", 1), ("id", 1)], unique=True)
+        await self.db.tasks.create_index([("tenant_id", 1), ("id", 1)], unique=True)
+        await self.db.categories.create_index([("tenant_id", 1), ("order", 1)])
+        await self.db.categories.create_index([("tenant_id", 1), ("group", 1), ("name", 1)])
+        await self.db.tasks.create_index([("tenant_id", 1), ("category_id", 1), ("order", 1)])
+        # Partial: completed and undated tasks stay out, so deadline queries scan only their range
+        await self.db.tasks.create_index(
+            [("tenant_id", 1), ("due_at", 1)], name="tasks_open_due", partialFilterExpression=OPEN_DUE_FILTER
+        )
+        await self.db.categories.create_index([("tenant_id", 1), ("revision", 1)])
+        await self.db.tasks.create_index([("tenant_id", 1), ("revision", 1)])
+        await self.db.tombstones.create_index([("tenant_id", 1), ("revision", 1)])
+        await self.db.tombstones.create_index([("tenant_id", 1), ("type", 1), ("id", 1)])
+        # The archiver sweeps every tenant by completion age (updated_at for untimestamped completions);
+        # archived tasks keep the tenant-leading layout
+        await self.db.tasks.create_index(
+            [("completed_at", 1), ("updated_at", 1)], name="tasks_completed_age", partialFilterExpression={"completed": True}
+        )
+        await self.db.archived_tasks.create_index([("tenant_id", 1), ("id", 1)], unique=True)
+        await self.db.archived_tasks.create_index([("tenant_id", 1), ("category_id", 1), ("order", 1)])
+        # Completion history by day; open tasks (no completed_at) stay out of both
+        for collection in (self.db.tasks, self.db.archived_tasks):
+            await collection.create_index(
+                [("tenant_id", 1), ("completed_at", 1)], name="completed_at", partialFilterExpression={"completed": True}
+            )
+        await self.db.archived_task_totals.create_index([("tenant_id", 1), ("category_id", 1)], unique=True)
+
+    # Categories
+    async def list_categories(self, tenant_id, fields=None):
+        projection = _projection(fields)
+        return await self.db.categories.find({"tenant_id": tenant_id}, projection).sort("order", 1).to_list(length=None)
+
+    async def get_category(self, tenant_id, category_id):
+        return await self.db.categories.find_one({"tenant_id": tenant_id, "id": category_id}, {"_id": 0})
+
+    async def get_categories(self, tenant_id, category_ids):
+        query = {"tenant_id": tenant_id, "id": {"$in": list(category_ids)}}
+        return {document["id"]: document async for document in self.db.categories.find(query, {"_id": 0})}
+
+    async def find_category_by_name(self, tenant_id, name, group, exclude_id=None):
+        query = {"tenant_id": tenant_id, "name": name, "group": group}
+        if exclude_id is not None:
+            query["id"] = {"$ne": exclude_id}
+        return await self.db.categories.find_one(query, {"_id": 0})
+
+    async def insert_category(self, document):
+        await self.db.categories.insert_one(dict(document))
+
+    async def update_category(self, tenant_id, category_id, fields, expected_version=None):
+        return await self._update("category", tenant_id, category_id, fields, expected_version)
+
+    async def delete_category(self, tenant_id, category_id):
+        result = await self.db.categories.delete_one({"tenant_id": tenant_id, "id": category_id})
+        return result.deleted_count > 0
+
+    # Tasks
+    async def list_tasks(self, tenant_id, category_id=None, fields=None):
+        query = {"tenant_id": tenant_id}
+        if category_id:
+            query["category_id"] = category_id
+        return await self.db.tasks.find(query, _projection(fields)).sort("order", 1).to_list(length=None)
+
+    async def get_task(self, tenant_id, task_id):
+        return await self.db.tasks.find_one({"tenant_id": tenant_id, "id": task_id}, {"_id": 0})
+
+    async def insert_task(self, document):
+        await self.db.tasks.insert_one(dict(document))
+
+    async def update_task(self, tenant_id, task_id, fields, expected_version=None):
+        # Still one write: an update pipeline keeps completed_at when the stored task was already completed
+        return await self._update("task", tenant_id, task_id, fields, expected_version, update=_completion_pipeline(fields))
+
+    async def delete_task(self, tenant_id, task_id):
+        result = await self.db.tasks.delete_one({"tenant_id": tenant_id, "id": task_id})
+        return result.deleted_count > 0
+
+    async def delete_category_tasks(self, tenant_id, category_id):
+        query = {"tenant_id": tenant_id, "category_id": category_id}
+        task_ids = await self.db.tasks.distinct("id", query)
+        await self.db.tasks.delete_many(query)
+        archived_ids = await self.db.archived_tasks.distinct("id", query)
+        await self.db.archived_tasks.delete_many(query)
+        await self.db.archived_task_totals.delete_one(query)
+        return task_ids + archived_ids
+
+    async def _update(self, kind, tenant_id, item_id, fields, expected_version=None, update=None):
+        from pymongo import ReturnDocument
+        collection = self._collection(kind)
+        key = {"tenant_id": tenant_id, "id": item_id}
+        # The version check rides along in the filter, so a conditional write is still one round trip
+        query = dict(key)
+        if expected_version is not None:
+            query["version"] = expected_version if expected_version else {"$in": [0, None]}
+        if not fields:
+            document = await collection.find_one(query, {"_id": 0})
+        else:
+            document = await collection.find_one_and_update(
+                query, update or {"$set": _strip(fields, ("version",)), "$inc": {"version": 1}},
+                projection={"_id": 0}, return_document=ReturnDocument.AFTER
+            )
+        if document is None and expected_version is not None:
+            # Only a failed conditional write pays for telling "stale" apart from "gone"
+            current = await collection.find_one(key, {"_id": 0, "version": 1})
+            if current is not None:
+                raise VersionConflict(current.get("version", 0))
+        return document
+
+    async def next_order(self, kind, tenant_id, category_id=None):
+        collection = self._collection(kind)
+        query = {"tenant_id": tenant_id}
+        if category_id is not None:
+            query["category_id"] = category_id
+
+        # Get the highest order number, handling backward compatibility
+        result = await collection.find(query, {"_id": 0, "order": 1}).sort("order", -1).limit(1).to_list(length=1)
+        if result and "order" in result[0]:
+            return result[0]["order"] + 1
+
+        # If no items with order field exist, count total items to get next order
+        return await collection.count_documents(query)
+
+    async def list_due_tasks(self, tenant_id, before=None, after=None, category_id=None, limit=100):
+        # Repeating the partial filter's predicates lets the planner pick tasks_open_due
+        query = {"tenant_id": tenant_id, **OPEN_DUE_FILTER, "due_at": dict(OPEN_DUE_FILTER["due_at"])}
+        if after is not None:
+            query["due_at"]["$gte"] = after
+        if before is not None:
+            query["due_at"]["$lt"] = before
+        if category_id is not None:
+            query["category_id"] = category_id
+        return await self.db.tasks.find(query, {"_id": 0}).sort("due_at", 1).limit(limit).to_list(length=limit)
+
+    # Archive
+    async def _rollups(self, collection, match):
+        pipeline = [
+            {"$match": match},
+            {"$group": {
+                "_id": "$category_id",
+                "completed_weight": {"$sum": {"$cond": ["$completed", "$weight", 0]}},
+                "total_weight": {"$sum": "$weight"},
+                "task_count": {"$sum": 1},
+                "completed_task_count": {"$sum": {"$cond": ["$completed", 1, 0]}}
+            }}
+        ]
+        return {
+            row["_id"]: {field: row[field] for field in ROLLUP_FIELDS}
+            async for row in collection.aggregate(pipeline)
+        }
+
+    async def _refresh_archived_totals(self, tenant_id, category_ids):
+        """Recompute totals from the archive itself, so repeating a step after a crash or race is harmless"""
+        category_ids = list(category_ids)
+        totals = await self._rollups(self.db.archived_tasks, {"tenant_id": tenant_id, "category_id": {"$in": category_ids}})
+        for category_id in category_ids:
+            key = {"tenant_id": tenant_id, "category_id": category_id}
+            if category_id in totals:
+                await self.db.archived_task_totals.update_one(key, {"$set": totals[category_id]}, upsert=True)
+            else:
+                await self.db.archived_task_totals.delete_one(key)
+
+    async def archive_completed_tasks(self, completed_before, limit):
+        from pymongo import ReplaceOne
+        batch = await self.db.tasks.find({"completed": True, "$or": [
+            {"completed_at": {"$lt": completed_before}},
+            {"completed_at": None, "updated_at": {"$lt": completed_before}}
+        ]}, {"_id": 0}).limit(limit).to_list(length=limit)
+        if not batch:
+            return 0
+        
+        # Copy, delete, then recompute totals: a pass interrupted anywhere converges on the next one
+        archived_at = datetime.utcnow()
+        await self.db.archived_tasks.bulk_write([
+            ReplaceOne({"tenant_id": task["tenant_id"], "id": task["id"]}, {**task, "archived_at": archived_at}, upsert=True)
+            for task in batch
+        ], ordered=False)
+        by_tenant = defaultdict(list)
+        for task in batch:
+            by_tenant[task["tenant_id"]].append(task)
+        for tenant_id, tasks in by_tenant.items():
+            task_ids = [task["id"] for task in tasks]
+            result = await self.db.tasks.delete_many({"tenant_id": tenant_id, "id": {"$in": task_ids}, "completed": True})
+            if result.deleted_count < len(task_ids):
+                # Reopened since the read; the live copy wins
+                reopened = await self.db.tasks.distinct("id", {"tenant_id": tenant_id, "id": {"$in": task_ids}})
+                await self.db.archived_tasks.delete_many({"tenant_id": tenant_id, "id": {"$in": reopened}})
+            await self._refresh_archived_totals(tenant_id, {task["category_id"] for task in tasks})
+        return len(batch)
+
+    async def list_archived_tasks(self, tenant_id, category_id=None, fields=None):
+        query = {"tenant_id": tenant_id}
+        if category_id:
+            query["category_id"] = category_id
+        return await self.db.archived_tasks.find(query, _projection(fields)).sort("order", 1).to_list(length=None)
+
+    def iter_archived_tasks(self, tenant_id, exclude=()):
+        return self.iter_documents("archived_task", tenant_id, exclude)
+
+    async def restore_archived_task(self, tenant_id, task_id):
+        key = {"tenant_id": tenant_id, "id": task_id}
+        task = await self.db.archived_tasks.find_one(key, {"_id": 0, "archived_at": 0})
+        if task is None:
+            return None
+        await self.db.tasks.replace_one(key, task, upsert=True)
+        await self.db.archived_tasks.delete_one(key)
+        await self._refresh_archived_totals(tenant_id, [task["category_id"]])
+        return task
+
+    # Progress
+    async def progress_rollups(self, tenant_id, category_ids=None):
+        match = {"tenant_id": tenant_id}
+        if category_ids is not None:
+            match["category_id"] = {"$in": list(category_ids)}
+        rollups = await self._rollups(self.db.tasks, match)
+        archived = {
+            totals["category_id"]: totals
+            async for totals in self.db.archived_task_totals.find(match, {"_id": 0})
+        }
+        return _merge_rollups(rollups, archived)
+
+    async def completion_heatmap(self, tenant_id, start, end):
+        match = {"$match": {"tenant_id": tenant_id, "completed": True, "completed_at": {"$gte": start, "$lt": end}}}
+        pipeline = [
+            match,
+            {"$unionWith": {"coll": "archived_tasks", "pipeline": [match]}},
+            {"$group": {
+                "_id": {"$dateTrunc": {"date": "$completed_at", "unit": "day"}},
+                "completed_weight": {"$sum": "$weight"},
+                "completed_count": {"$sum": 1}
+            }},
+            {"$sort": {"_id": 1}}
+        ]
+        return [
+            {"day": row["_id"], "completed_weight": row["completed_weight"], "completed_count": row["completed_count"]}
+            async for row in self.db.tasks.aggregate(pipeline)
+        ]
+
+    async def completion_rows(self, tenant_id):
+        def ordinal(date):
+            # Whole days since the epoch (date minus date is milliseconds), shifted to proleptic ordinals;
+            # a missing date stays null through every step
+            days = {"$toLong": {"$floor": {"$divide": [{"$subtract": [date, EPOCH]}, 86400000]}}}
+            return {"$ifNull": [{"$add": [days, EPOCH_ORDINAL]}, 0]}
+
+        # Five fields per task with the days already worked out, so the client decodes no datetimes
+        pipeline = [
+            {"$match": {"tenant_id": tenant_id}},
+            {"$project": {
+                "_id": 0,
+                "category_id": {"$ifNull": ["$category_id", None]},
+                "weight": {"$ifNull": ["$weight", 0]},
+                "completed": {"$ifNull": ["$completed", False]},
+                "created": ordinal("$created_at"),
+                "done": {"$cond": ["$completed", ordinal({"$ifNull": ["$completed_at", "$updated_at"]}), 0]}
+            }}
+        ]
+        pipeline.append({"$unionWith": {"coll": "archived_tasks", "pipeline": list(pipeline)}})
+        row = itemgetter("category_id", "weight", "completed", "created", "done")
+        return list(map(row, await self.db.tasks.aggregate(pipeline).to_list(length=None)))
+
+    # Bulk operations
+    async def iter_documents(self, kind, tenant_id, exclude=()):
+        projection = {"_id": 0, **{field: 0 for field in exclude}}
+        async for document in self._collection(kind).find({"tenant_id": tenant_id}, projection).sort("order", 1):
+            yield document
+
+    async def insert_many(self, kind, documents, ignore_duplicates=False):
+        from pymongo.errors import BulkWriteError
+        if not documents:
+            return
+        documents = [dict(document) for document in documents]
+        try:
+            await self._collection(kind).insert_many(documents, ordered=not ignore_duplicates)
+        except BulkWriteError as e:
+            if not ignore_duplicates or any(error["code"] != 11000 for error in e.details["writeErrors"]):
+                raise
+
+    async def set_orders(self, kind, tenant_id, orders, updated_at, first_revision, bump_version=True):
+        from pymongo import UpdateOne
+        if not orders:
+            return 0
+        result = await self._collection(kind).bulk_write([
+            UpdateOne(
+                {"tenant_id": tenant_id, "id": item_id},
+                {"$set": {"order": order, "updated_at": updated_at, "revision": first_revision + offset}, "$inc": {"version": int(bump_version)}}
+            )
+            for offset, (item_id, order) in enumerate(orders.items())
+        ], ordered=False)
+        return result.matched_count
+
+    async def delete_batch(self, kind, tenant_id, limit):
+        collection = self._collection(kind)
+        projection = {"_id": 0, "id": 1, "category_id": 1}
+        batch = await collection.find({"tenant_id": tenant_id}, projection).limit(limit).to_list(length=limit)
+        if not batch:
+            # Archived tasks go once the live ones are gone
+            if kind == "task":
+                return await self.delete_batch("archived_task", tenant_id, limit)
+            return 0
+        result = await collection.delete_many({"tenant_id": tenant_id, "id": {"$in": [doc["id"] for doc in batch]}})
+        if kind == "archived_task":
+            await self._refresh_archived_totals(tenant_id, {doc["category_id"] for doc in batch})
+        return result.deleted_count
+
+    async def clear_tenant(self, tenant_id):
+        for collection in (self.db.categories, self.db.tasks, self.db.archived_tasks, self.db.archived_task_totals):
+            await collection.delete_many({"tenant_id": tenant_id})
+
+    # Delta sync bookkeeping
+    @staticmethod
+    def _counter_id(tenant_id):
+        return f"revision:{tenant_id}"
+
+    async def next_revision(self, tenant_id, count=1):
+        from pymongo import ReturnDocument
+        # One update pipeline bumps the counter and records the reservation, so no reader sees one without
+        # the other; inside the stage "$value" is still the value before the bump
+        value = {"$ifNull": ["$value", 0]}
+        reservation = {"first": {"$add": [value, 1]}, "at": {"$literal": datetime.utcnow()}}
+        counter = await self.db.counters.find_one_and_update(
+            {"_id": self._counter_id(tenant_id)},
+            [{"$set": {
+                "tenant_id": {"$literal": tenant_id},
+                "value": {"$add": [value, count]},
+                "pending": {"$concatArrays": [{"$ifNull": ["$pending", []]}, [reservation]]}
+            }}],
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return counter["value"]
+
+    async def release_revisions(self, tenant_id, last, count=1):
+        await self.db.counters.update_one({"_id": self._counter_id(tenant_id)}, {"$pull": {"pending": {"first": last - count + 1}}})
+
+    async def revision_state(self, tenant_id):
+        counter = await self.db.counters.find_one({"_id": self._counter_id(tenant_id)}) or {}
+        revision = counter.get("value", 0)
+        expired = datetime.utcnow() - timedelta(seconds=REVISION_LEASE_SECONDS)
+        pending = counter.get("pending", [])
+        if any(reservation["at"] < expired for reservation in pending):
+            # Left behind by a writer that died mid-write
+            await self.db.counters.update_one({"_id": self._counter_id(tenant_id)}, {"$pull": {"pending": {"at": {"$lt": expired}}}})
+        firsts = [reservation["first"] for reservation in pending if reservation["at"] >= expired]
+        return min([revision] + [first - 1 for first in firsts]), counter.get("reset_revision", 0)
+
+    async def reset_sync_history(self, tenant_id):
+        async with self.reserve_revisions(tenant_id) as revision:
+            await self.db.counters.update_one({"_id": self._counter_id(tenant_id)}, {"$set": {"reset_revision": revision}})
+            await self.db.tombstones.delete_many({"tenant_id": tenant_id})
+        return revision
+
+    async def record_tombstones(self, tenant_id, kind, ids):
+        if not ids:
+            return
+        async with self.reserve_revisions(tenant_id, len(ids)) as last:
+            first = last - len(ids) + 1
+            deleted_at = datetime.utcnow()
+            await self.db.tombstones.insert_many([
+                {"tenant_id": tenant_id, "type": kind, "id": item_id, "revision": first + offset, "deleted_at": deleted_at}
+                for offset, item_id in enumerate(ids)
+            ])
+
+    async def changes_since(self, tenant_id, since, exclude=()):
+        changed = {"tenant_id": tenant_id, "revision": {"$gt": since}}
+        projection = {"_id": 0, **{field: 0 for field in exclude}}
+        categories = await self.db.categories.find(changed, projection).sort("revision", 1).to_list(length=None)
+        tasks = await self.db.tasks.find(changed, projection).sort("revision", 1).to_list(length=None)
+        tombstones = await self.db.tombstones.find(changed, {"_id": 0, "tenant_id": 0}).sort("revision", 1).to_list(length=None)
+        return categories, tasks, tombstones
+
+    async def find_tombstone(self, tenant_id, kind, item_id):
+        return await self.db.tombstones.find_one({"tenant_id": tenant_id, "type": kind, "id": item_id}, {"_id": 0})
+
+    async def delete_tombstone(self, tenant_id, kind, item_id):
+        await self.db.tombstones.delete_many({"tenant_id": tenant_id, "type": kind, "id": item_id})
+
+    @staticmethod
+    def _older_than(tenant_id, item_id, updated_at):
+        return {
+            "tenant_id": tenant_id,
+            "id": item_id,
+            "$or": [{"updated_at": {"$lt": updated_at}}, {"updated_at": {"$exists": False}}]
+        }
+
+    async def upsert_if_newer(self, kind, document, updated_at):
+        from pymongo.errors import DuplicateKeyError
+        try:
+            await self._collection(kind).update_one(
+                self._older_than(document["tenant_id"], document["id"], updated_at),
+                _completion_pipeline(document) or {"$set": _strip(document, ("version",)), "$inc": {"version": 1}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # The id exists with a newer updated_at, so the filter missed and the upsert collided
+            return False
+        return True
+
+    async def delete_if_newer(self, kind, tenant_id, item_id, updated_at):
+        result = await self._collection(kind).delete_one(self._older_than(tenant_id, item_id, updated_at))
+        return result.deleted_count > 0
+
+class MemoryRepository(Repository):
+    """Process-local engine: dicts keyed by (tenant_id, id) plus bisect-maintained sorted indexes.
+
+    Progress rollups are maintained incrementally on every write, so progress reads
+    never scan tasks. Data lives only as long as the process.
+    """
+    name = "memory"
+
+    def __init__(self):
+        self.documents = {kind: {} for kind in KINDS}  # (tenant_id, id) -> document
+        self.sort_keys = {kind: {} for kind in KINDS}  # (tenant_id, id) -> (order, sequence, id)
+        self.ordered = {kind: defaultdict(list) for kind in KINDS}  # scope -> sorted sort keys
+        self.revisions = {kind: defaultdict(list) for kind in KINDS}  # tenant_id -> sorted (revision, id)
+        self.names = defaultdict(set)  # (tenant_id, group, name) -> category ids
+        self.rollups = defaultdict(dict)  # tenant_id -> category_id -> rollup
+        self.counters = defaultdict(lambda: {"value": 0, "reset_revision": 0, "pending": {}})
+        self.tombstones = defaultdict(dict)  # tenant_id -> (kind, id) -> tombstone
+        self.tombstone_revisions = defaultdict(list)  # tenant_id -> sorted (revision, kind, id)
+        self.due = defaultdict(list)  # tenant_id -> sorted (due_at epoch, id) of open tasks with a deadline
+        self.archived = defaultdict(dict)  # tenant_id -> task id -> archived task
+        self.archived_totals = defaultdict(dict)  # tenant_id -> category_id -> rollup of archived tasks
+        self.sequence = itertools.count()
+
+    @staticmethod
+    def _scopes(kind, document):
+        # Tasks are listed both tenant-wide and per category
+        if kind == "task":
+            return [(document["tenant_id"],), (document["tenant_id"], document.get("category_id"))]
+        return [(document["tenant_id"],)]
+
+    def _index(self, kind, document, sequence=None):
+        key = (document["tenant_id"], document["id"])
+        self.documents[kind][key] = document
+        sort_key = (document.get("order", 0), next(self.sequence) if sequence is None else sequence, document["id"])
+        self.sort_keys[kind][key] = sort_key
+        for scope in self._scopes(kind, document):
+            insort(self.ordered[kind][scope], sort_key)
+        if "revision" in document:
+            insort(self.revisions[kind][document["tenant_id"]], (document["revision"], document["id"]))
+
+        if kind == "category":
+            self.names[(document["tenant_id"], document.get("group"), document.get("name"))].add(document["id"])
+        else:
+            self._adjust_rollup(document, 1)
+            if self._due_key(document):
+                insort(self.due[document["tenant_id"]], self._due_key(document))
+
+    def _unindex(self, kind, document):
+        key = (document["tenant_id"], document["id"])
+        del self.documents[kind][key]
+        sort_key = self.sort_keys[kind].pop(key)
+        for scope in self._scopes(kind, document):
+            entries = self.ordered[kind][scope]
+            del entries[bisect_left(entries, sort_key)]
+        if "revision" in document:
+            entries = self.revisions[kind][document["tenant_id"]]
+            del entries[bisect_left(entries, (document["revision"], document["id"]))]
+
+        if kind == "category":
+            self.names[(document["tenant_id"], document.get("group"), document.get("name"))].discard(document["id"])
+        else:
+            self._adjust_rollup(document, -1)
+            if self._due_key(document):
+                entries = self.due[document["tenant_id"]]
+                del entries[bisect_left(entries, self._due_key(document))]
+        return sort_key[1]
+
+    @staticmethod
+    def _due_key(task):
+        if task.get("completed") or not isinstance(task.get("due_at"), datetime):
+            return None
+        return (_epoch(task["due_at"]), task["id"])
+
+    def _adjust_rollup(self, task, sign, totals=None):
+        rollups = (self.rollups if totals is None else totals)[task["tenant_id"]]
+        rollup = rollups.setdefault(task.get("category_id"), dict.fromkeys(ROLLUP_FIELDS, 0))
+        weight = task.get("weight", 0)
+        completed = bool(task.get("completed"))
+        rollup["total_weight"] += sign * weight
+        rollup["task_count"] += sign
+        if completed:
+            rollup["completed_weight"] += sign * weight
+            rollup["completed_task_count"] += sign
+        if rollup["task_count"] == 0:
+            del rollups[task.get("category_id")]
+
+    def _get(self, kind, tenant_id, item_id, exclude=()):
+        document = self.documents[kind].get((tenant_id, item_id))
+        return _strip(document, exclude) if document is not None else None
+
+    def _insert(self, kind, document):
+        key = (document["tenant_id"], document["id"])
+        if key in self.documents[kind]:
+            raise ValueError(f"Duplicate {kind} id: {document['id']}")
+        self._index(kind, dict(document))
+
+    def _update(self, kind, tenant_id, item_id, fields, expected_version=None, bump_version=True):
+        document = self.documents[kind].get((tenant_id, item_id))
+        if document is None:
+            return None
+        version = document.get("version", 0)
+        if expected_version is not None and version != expected_version:
+            raise VersionConflict(version)
+        if fields:
+            fields = _completion_fields(document, fields)
+            # Keep the insertion sequence so ties in `order` stay stable
+            sequence = self._unindex(kind, document)
+            document = {**document, **fields, "version": version + int(bump_version)}
+            self._index(kind, document, sequence)
+        return dict(document)
+
+    def _delete(self, kind, tenant_id, item_id):
+        document = self.documents[kind].get((tenant_id, item_id))
+        if document is None:
+            return False
+        self._unindex(kind, document)
+        return True
+
+    def _in_order(self, kind, scope):
+        return [self.documents[kind][(scope[0], item_id)] for _, _, item_id in self.ordered[kind].get(scope, ())]
+
+    # Categories
+    async def list_categories(self, tenant_id, fields=None):
+        return [_pick(document, fields) for document in self._in_order("category", (tenant_id,))]
+
+    async def get_category(self, tenant_id, category_id):
+        return self._get("category", tenant_id, category_id)
+
+    async def get_categories(self, tenant_id, category_ids):
+        found = {category_id: self._get("category", tenant_id, category_id) for category_id in category_ids}
+        return {category_id: document for category_id, document in found.items() if document is not None}
+
+    async def find_category_by_name(self, tenant_id, name, group, exclude_id=None):
+        for category_id in self.names.get((tenant_id, group, name), ()):
+            if category_id != exclude_id:
+                return self._get("category", tenant_id, category_id)
+        return None
+
+    async def insert_category(self, document):
+        self._insert("category", document)
+
+    async def update_category(self, tenant_id, category_id, fields, expected_version=None):
+        return self._update("category", tenant_id, category_id, fields, expected_version)
+
+    async def delete_category(self, tenant_id, category_id):
+        return self._delete("category", tenant_id, category_id)
+
+    # Tasks
+    async def list_tasks(self, tenant_id, category_id=None, fields=None):
+        scope = (tenant_id, category_id) if category_id else (tenant_id,)
+        return [_pick(document, fields) for document in self._in_order("task", scope)]
+
+    async def get_task(self, tenant_id, task_id):
+        return self._get("task", tenant_id, task_id)
+
+    async def insert_task(self, document):
+        self._insert("task", document)
+
+    async def update_task(self, tenant_id, task_id, fields, expected_version=None):
+        return self._update("task", tenant_id, task_id, fields, expected_version)
+
+    async def delete_task(self, tenant_id, task_id):
+        return self._delete("task", tenant_id, task_id)
+
+    async def delete_category_tasks(self, tenant_id, category_id):
+        task_ids = [item_id for _, _, item_id in self.ordered["task"].get((tenant_id, category_id), ())]
+        for task_id in task_ids:
+            self._delete("task", tenant_id, task_id)
+        archived = self.archived.get(tenant_id, {})
+        archived_ids = [task_id for task_id, task in archived.items() if task.get("category_id") == category_id]
+        for task_id in archived_ids:
+            self._unarchive(tenant_id, task_id)
+        return task_ids + archived_ids
+
+    async def next_order(self, kind, tenant_id, category_id=None):
+        scope = (tenant_id, category_id) if category_id is not None else (tenant_id,)
+        entries = self.ordered[kind].get(scope)
+        return entries[-1][0] + 1 if entries else 0
+
+    async def list_due_tasks(self, tenant_id, before=None, after=None, category_id=None, limit=100):
+        entries = self.due.get(tenant_id, [])
+        start = bisect_left(entries, (_epoch(after),)) if after is not None else 0
+        stop = bisect_left(entries, (_epoch(before),)) if before is not None else len(entries)
+        tasks = []
+        for _, task_id in entries[start:stop]:
+            task = self.documents["task"][(tenant_id, task_id)]
+            if category_id is None or task.get("category_id") == category_id:
+                tasks.append(dict(task))
+                if len(tasks) >= limit:
+                    break
+        return tasks
+
+    # Archive
+    def _unarchive(self, tenant_id, task_id):
+        task = self.archived[tenant_id].pop(task_id)
+        self._adjust_rollup(task, -1, self.archived_totals)
+        return task
+
+    def _archived_in_order(self, tenant_id, category_id=None):
+        tasks = [
+            task for task in self.archived.get(tenant_id, {}).values()
+            if category_id is None or task.get("category_id") == category_id
+        ]
+        return sorted(tasks, key=lambda task: task.get("order", 0))
+
+    async def archive_completed_tasks(self, completed_before, limit):
+        cutoff = _epoch(completed_before)
+
+        def due_for_archive(task):
+            completed_at = _epoch(task.get("completed_at") or task.get("updated_at"))
+            return task.get("completed") and completed_at is not None and completed_at < cutoff
+
+        batch = list(itertools.islice(filter(due_for_archive, self.documents["task"].values()), limit))
+        archived_at = datetime.utcnow()
+        for task in batch:
+            self._delete("task", task["tenant_id"], task["id"])
+            self.archived[task["tenant_id"]][task["id"]] = {**task, "archived_at": archived_at}
+            self._adjust_rollup(task, 1, self.archived_totals)
+        return len(batch)
+
+    async def list_archived_tasks(self, tenant_id, category_id=None, fields=None):
+        return [_pick(task, fields) for task in self._archived_in_order(tenant_id, category_id)]
+
+    async def iter_archived_tasks(self, tenant_id, exclude=()):
+        for task in self._archived_in_order(tenant_id):
+            yield _strip(task, exclude)
+
+    async def restore_archived_task(self, tenant_id, task_id):
+        if task_id not in self.archived.get(tenant_id, {}):
+            return None
+        task = _strip(self._unarchive(tenant_id, task_id), ("archived_at",))
+        self._insert("task", task)
+        return dict(task)
+
+    # Progress
+    async def progress_rollups(self, tenant_id, category_ids=None):
+        rollups = {}
+        for totals in (self.rollups.get(tenant_id, {}), self.archived_totals.get(tenant_id, {})):
+            if category_ids is not None:
+                totals = {category_id: totals[category_id] for category_id in category_ids if category_id in totals}
+            _merge_rollups(rollups, totals)
+        return rollups
+
+    async def completion_heatmap(self, tenant_id, start, end):
+        days = {}
+        for task in itertools.chain(self._in_order("task", (tenant_id,)), self.archived.get(tenant_id, {}).values()):
+            completed_at = task.get("completed_at")
+            if task.get("completed") and completed_at is not None and start <= completed_at < end:
+                day = days.setdefault(datetime(completed_at.year, completed_at.month, completed_at.day), {"completed_weight": 0, "completed_count": 0})
+                day["completed_weight"] += task.get("weight", 0)
+                day["completed_count"] += 1
+        return [{"day": day, **totals} for day, totals in sorted(days.items())]
+
+    async def completion_rows(self, tenant_id):
+        tasks = itertools.chain(self._in_order("task", (tenant_id,)), self.archived.get(tenant_id, {}).values())
+        return list(map(_completion_row, tasks))
+
+    # Bulk operations
+    async def iter_documents(self, kind, tenant_id, exclude=()):
+        for _, _, item_id in list(self.ordered[kind].get((tenant_id,), ())):
+            document = self.documents[kind].get((tenant_id, item_id))
+            if document is not None:
+                yield _strip(document, exclude)
+
+    async def insert_many(self, kind, documents, ignore_duplicates=False):
+        for document in documents:
+            if ignore_duplicates and (document["tenant_id"], document["id"]) in self.documents[kind]:
+                continue
+            self._insert(kind, document)
+
+    async def set_orders(self, kind, tenant_id, orders, updated_at, first_revision, bump_version=True):
+        updated = [
+            self._update(kind, tenant_id, item_id, {"order": order, "updated_at": updated_at, "revision": first_revision + offset},
+                         bump_version=bump_version)
+            for offset, (item_id, order) in enumerate(orders.items())
+        ]
+        return sum(document is not None for document in updated)
+
+    async def delete_batch(self, kind, tenant_id, limit):
+        item_ids = [item_id for _, _, item_id in self.ordered[kind].get((tenant_id,), ())[:limit]]
+        for item_id in item_ids:
+            self._delete(kind, tenant_id, item_id)
+        if not item_ids and kind == "task":
+            # Archived tasks go once the live ones are gone
+            item_ids = list(itertools.islice(self.archived.get(tenant_id, {}), limit))
+            for item_id in item_ids:
+                self._unarchive(tenant_id, item_id)
+        return len(item_ids)
+
+    async def clear_tenant(self, tenant_id):
+        for kind in KINDS:
+            while await self.delete_batch(kind, tenant_id, 10000):
+                pass
+
+    # Delta sync bookkeeping
+    async def next_revision(self, tenant_id, count=1):
+        counter = self.counters[tenant_id]
+        counter["value"] += count
+        counter["pending"][counter["value"] - count + 1] = time.monotonic()
+        return counter["value"]
+
+    async def release_revisions(self, tenant_id, last, count=1):
+        self.counters[tenant_id]["pending"].pop(last - count + 1, None)
+
+    async def revision_state(self, tenant_id):
+        counter = self.counters[tenant_id]
+        expired = time.monotonic() - REVISION_LEASE_SECONDS
+        firsts = [first for first, reserved_at in counter["pending"].items() if reserved_at >= expired]
+        return min([counter["value"]] + [first - 1 for first in firsts]), counter["reset_revision"]
+
+    def _bump_revision(self, tenant_id, count):
+        counter = self.counters[tenant_id]
+        counter["value"] += count
+        return counter["value"]
+
+    async def reset_sync_history(self, tenant_id):
+        revision = self._bump_revision(tenant_id, 1)
+        self.counters[tenant_id]["reset_revision"] = revision
+        self.tombstones.pop(tenant_id, None)
+        self.tombstone_revisions.pop(tenant_id, None)
+        return revision
+
+    async def record_tombstones(self, tenant_id, kind, ids):
+        if not ids:
+            return
+        # Nothing here awaits between taking the revisions and storing the tombstones
+        last = self._bump_revision(tenant_id, len(ids))
+        first = last - len(ids) + 1
+        deleted_at = datetime.utcnow()
+        for offset, item_id in enumerate(ids):
+            await self.delete_tombstone(tenant_id, kind, item_id)
+            tombstone = {"type": kind, "id": item_id, "revision": first + offset, "deleted_at": deleted_at}
+            self.tombstones[tenant_id][(kind, item_id)] = tombstone
+            insort(self.tombstone_revisions[tenant_id], (tombstone["revision"], kind, item_id))
+
+    async def changes_since(self, tenant_id, since, exclude=()):
+        changes = []
+        for kind in KINDS:
+            entries = self.revisions[kind].get(tenant_id, [])
+            start = bisect_right(entries, (since, chr(0x10FFFF)))
+            changes.append([_strip(self.documents[kind][(tenant_id, item_id)], exclude) for _, item_id in entries[start:]])
+
+        entries = self.tombstone_revisions.get(tenant_id, [])
+        start = bisect_right(entries, (since, chr(0x10FFFF), chr(0x10FFFF)))
+        tombstones = [dict(self.tombstones[tenant_id][(kind, item_id)]) for _, kind, item_id in entries[start:]]
+        return changes[0], changes[1], tombstones
+
+    async def find_tombstone(self, tenant_id, kind, item_id):
+        tombstone = self.tombstones.get(tenant_id, {}).get((kind, item_id))
+        return dict(tombstone) if tombstone else None
+
+    async def delete_tombstone(self, tenant_id, kind, item_id):
+        tombstone = self.tombstones.get(tenant_id, {}).pop((kind, item_id), None)
+        if tombstone:
+            entries = self.tombstone_revisions[tenant_id]
+            del entries[bisect_left(entries, (tombstone["revision"], kind, item_id))]
+
+    def _stored_is_newer(self, kind, tenant_id, item_id, updated_at):
+        document = self.documents[kind].get((tenant_id, item_id))
+        return document is not None and document.get("updated_at") is not None and document["updated_at"] >= updated_at
+
+    async def upsert_if_newer(self, kind, document, updated_at):
+        tenant_id, item_id = document["tenant_id"], document["id"]
+        if self._stored_is_newer(kind, tenant_id, item_id, updated_at):
+            return False
+        if self._update(kind, tenant_id, item_id, document) is None:
+            self._insert(kind, {**document, "version": 1})
+        return True
+
+    async def delete_if_newer(self, kind, tenant_id, item_id, updated_at):
+        if self._stored_is_newer(kind, tenant_id, item_id, updated_at):
+            return False
+        return self._delete(kind, tenant_id, item_id)
+
+def _encode_json(value):
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat()}
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+def _decode_json(value):
+    if len(value) == 1 and "$date" in value:
+        return datetime.fromisoformat(value["$date"])
+    return value
+
+def _epoch(value):
+    if not isinstance(value, datetime):
+        return None
+    return (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).timestamp()
+
+EPOCH = datetime(1970, 1, 1)
+EPOCH_ORDINAL = EPOCH.toordinal()
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS categories (
+    tenant_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    name TEXT,
+    grp TEXT,
+    ord INTEGER NOT NULL,
+    revision INTEGER,
+    updated_at REAL,
+    doc TEXT NOT NULL,
+    UNIQUE (tenant_id, id)
+);
+CREATE INDEX IF NOT EXISTS categories_order ON categories (tenant_id, ord);
+CREATE INDEX IF NOT EXISTS categories_name ON categories (tenant_id, grp, name);
+CREATE INDEX IF NOT EXISTS categories_revision ON categories (tenant_id, revision);
+CREATE TABLE IF NOT EXISTS tasks (
+    tenant_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    category_id TEXT,
+    ord INTEGER NOT NULL,
+    weight INTEGER NOT NULL,
+    completed INTEGER NOT NULL,
+    due_at REAL,
+    completed_at REAL,
+    revision INTEGER,
+    updated_at REAL,
+    doc TEXT NOT NULL,
+    UNIQUE (tenant_id, id)
+);
+CREATE INDEX IF NOT EXISTS tasks_order ON tasks (tenant_id, ord);
+CREATE INDEX IF NOT EXISTS tasks_category ON tasks (tenant_id, category_id, ord);
+CREATE INDEX IF NOT EXISTS tasks_revision ON tasks (tenant_id, revision);
+CREATE INDEX IF NOT EXISTS tasks_open_due ON tasks (tenant_id, due_at) WHERE completed = 0 AND due_at IS NOT NULL;
+CREATE INDEX IF NOT EXISTS tasks_completed_at ON tasks (tenant_id, completed_at) WHERE completed = 1;
+CREATE INDEX IF NOT EXISTS tasks_completed_age ON tasks (COALESCE(completed_at, updated_at)) WHERE completed = 1;
+CREATE TABLE IF NOT EXISTS archived_tasks (
+    tenant_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    category_id TEXT,
+    ord INTEGER NOT NULL,
+    weight INTEGER NOT NULL,
+    completed INTEGER NOT NULL,
+    due_at REAL,
+    completed_at REAL,
+    revision INTEGER,
+    updated_at REAL,
+    doc TEXT NOT NULL,
+    UNIQUE (tenant_id, id)
+);
+CREATE INDEX IF NOT EXISTS archived_tasks_category ON archived_tasks (tenant_id, category_id, ord);
+CREATE INDEX IF NOT EXISTS archived_tasks_completed_at ON archived_tasks (tenant_id, completed_at) WHERE completed = 1;
+CREATE TABLE IF NOT EXISTS archived_task_totals (
+    tenant_id TEXT NOT NULL,
+    category_id TEXT NOT NULL,
+    completed_weight INTEGER NOT NULL,
+    total_weight INTEGER NOT NULL,
+    task_count INTEGER NOT NULL,
+    completed_task_count INTEGER NOT NULL,
+    PRIMARY KEY (tenant_id, category_id)
+);
+CREATE TABLE IF NOT EXISTS tombstones (
+    tenant_id TEXT NOT NULL,
+    type TEXT NOT NULL,
+    id TEXT NOT NULL,
+    revision INTEGER NOT NULL,
+    deleted_at TEXT NOT NULL,
+    PRIMARY KEY (tenant_id, type, id)
+);
+CREATE INDEX IF NOT EXISTS tombstones_revision ON tombstones (tenant_id, revision);
+CREATE TABLE IF NOT EXISTS counters (
+    tenant_id TEXT PRIMARY KEY,
+    value INTEGER NOT NULL,
+    reset_revision INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS revision_reservations (
+    tenant_id TEXT NOT NULL,
+    first INTEGER NOT NULL,
+    reserved_at REAL NOT NULL,
+    PRIMARY KEY (tenant_id, first)
+);
+"""
+
+class SQLiteRepository(Repository):
+    """SQLite engine; queries run on one dedicated thread so the event loop never blocks.
+
+    Documents are stored as JSON next to the columns that are filtered, sorted or
+    summed, each of which is covered by a tenant-leading index.
+    """
+    name = "sqlite"
+    TABLES = {"category": "categories", "task": "tasks", "archived_task": "archived_tasks"}
+
+    def __init__(self, path: str):
+        self.path = path
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        self.connection = None
+        self.query_listener = None  # called with each query's duration in seconds
+
+    async def _call(self, function, *args):
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+        finally:
+            if self.query_listener is not None:
+                self.query_listener(time.perf_counter() - started)
+
+    def _connect(self):
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+        return self.connection
+
+    def _initialize_sync(self):
+        connection = self._connect()
+        connection.executescript(SQLITE_SCHEMA)
+
+    async def initialize(self):
+        await self._call(self._initialize_sync)
+
+    async def close(self):
+        if self.connection is not None:
+            await self._call(self.connection.close)
+            self.connection = None
+        self.executor.shutdown(wait=False)
+
+    @staticmethod
+    def _row(kind, document):
+        doc = json.dumps(document, default=_encode_json)
+        common = (document["tenant_id"], document["id"])
+        tail = (document.get("revision"), _epoch(document.get("updated_at")), doc)
+        if kind == "category":
+            return common + (document.get("name"), document.get("group"), document.get("order", 0)) + tail
+        return common + (
+            document.get("category_id"), document.get("order", 0),
+            document.get("weight", 0), int(bool(document.get("completed"))), _epoch(document.get("due_at")),
+            _epoch(document.get("completed_at"))
+        ) + tail
+
+    INSERTS = {
+        "category": "INSERT {verb} INTO categories (tenant_id, id, name, grp, ord, revision, updated_at, doc) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        "task": "INSERT {verb} INTO tasks (tenant_id, id, category_id, ord, weight, completed, due_at, completed_at, revision, updated_at, doc) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        "archived_task": "INSERT {verb} INTO archived_tasks (tenant_id, id, category_id, ord, weight, completed, due_at, completed_at, revision, updated_at, doc) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    }
+
+    @staticmethod
+    def _load(doc, exclude=()):
+        document = json.loads(doc, object_hook=_decode_json)
+        return _strip(document, exclude) if exclude else document
+
+    def _fetch(self, sql, params=(), exclude=()):
+        return [self._load(row[0], exclude) for row in self._connect().execute(sql, params)]
+
+    def _fetch_one(self, sql, params=()):
+        row = self._connect().execute(sql, params).fetchone()
+        return self._load(row[0]) if row else None
+
+    def _write(self, kind, document, verb=""):
+        self._connect().execute(self.INSERTS[kind].format(verb=verb), self._row(kind, document))
+
+    def _update_sync(self, kind, tenant_id, item_id, fields, expected_version=None):
+        table = self.TABLES[kind]
+        connection = self._connect()
+        with connection:
+            document = self._fetch_one(f"SELECT doc FROM {table} WHERE tenant_id = ? AND id = ?", (tenant_id, item_id))
+            if document is None:
+                return None
+            # Reads and writes share the one SQLite thread, so check-then-write cannot interleave
+            version = document.get("version", 0)
+            if expected_version is not None and version != expected_version:
+                raise VersionConflict(version)
+            if fields:
+                document.update(_completion_fields(document, fields), version=version + 1)
+                self._rewrite(connection, kind, document)
+        return document
+
+    def _rewrite(self, connection, kind, document):
+        # REPLACE would allocate a new rowid and lose the tie-break order
+        row = self._row(kind, document)
+        columns = self.INSERTS[kind].split("(")[1].split(")")[0].split(", ")
+        assignments = ", ".join(f"{column} = ?" for column in columns[2:])
+        connection.execute(f"UPDATE {self.TABLES[kind]} SET {assignments} WHERE tenant_id = ? AND id = ?", row[2:] + row[:2])
+
+    def _delete_sync(self, kind, tenant_id, item_id):
+        with self._connect() as connection:
+            cursor = connection.execute(f"DELETE FROM {self.TABLES[kind]} WHERE tenant_id = ? AND id = ?", (tenant_id, item_id))
+        return cursor.rowcount > 0
+
+    def _insert_sync(self, kind, document):
+        with self._connect():
+            self._write(kind, document)
+
+    # Categories
+    async def list_categories(self, tenant_id, fields=None):
+        categories = await self._call(self._fetch, "SELECT doc FROM categories WHERE tenant_id = ? ORDER BY ord, rowid", (tenant_id,))
+        return categories if fields is None else [_pick(category, fields) for category in categories]
+
+    async def get_category(self, tenant_id, category_id):
+        return await self._call(self._fetch_one, "SELECT doc FROM categories WHERE tenant_id = ? AND id = ?", (tenant_id, category_id))
+
+    async def get_categories(self, tenant_id, category_ids):
+        category_ids = list(category_ids)
+        if not category_ids:
+            return {}
+        sql = f"SELECT doc FROM categories WHERE tenant_id = ? AND id IN ({', '.join('?' * len(category_ids))})"
+        documents = await self._call(self._fetch, sql, [tenant_id] + category_ids)
+        return {document["id"]: document for document in documents}
+
+    async def find_category_by_name(self, tenant_id, name, group, exclude_id=None):
+        return await self._call(
+            self._fetch_one,
+            "SELECT doc FROM categories WHERE tenant_id = ? AND grp IS ? AND name = ? AND id IS NOT ? LIMIT 1",
+            (tenant_id, group, name, exclude_id)
+        )
+
+    async def insert_category(self, document):
+        await self._call(self._insert_sync, "category", document)
+
+    async def update_category(self, tenant_id, category_id, fields, expected_version=None):
+        return await self._call(self._update_sync, "category", tenant_id, category_id, fields, expected_version)
+
+    async def delete_category(self, tenant_id, category_id):
+        return await self._call(self._delete_sync, "category", tenant_id, category_id)
+
+    # Tasks
+    async def list_tasks(self, tenant_id, category_id=None, fields=None):
+        if category_id:
+            sql, params = "SELECT doc FROM tasks WHERE tenant_id = ? AND category_id = ? ORDER BY ord, rowid", (tenant_id, category_id)
+        else:
+            sql, params = "SELECT doc FROM tasks WHERE tenant_id = ? ORDER BY ord, rowid", (tenant_id,)
+        tasks = await self._call(self._fetch, sql, params)
+        return tasks if fields is None else [_pick(task, fields) for task in tasks]
+
+    async def get_task(self, tenant_id, task_id):
+        return await self._call(self._fetch_one, "SELECT doc FROM tasks WHERE tenant_id = ? AND id = ?", (tenant_id, task_id))
+
+    async def insert_task(self, document):
+        await self._call(self._insert_sync, "task", document)
+
+    async def update_task(self, tenant_id, task_id, fields, expected_version=None):
+        return await self._call(self._update_sync, "task", tenant_id, task_id, fields, expected_version)
+
+    async def delete_task(self, tenant_id, task_id):
+        return await self._call(self._delete_sync, "task", tenant_id, task_id)
+
+    async def delete_category_tasks(self, tenant_id, category_id):
+        def delete():
+            task_ids = []
+            with self._connect() as connection:
+                for table in ("tasks", "archived_tasks"):
+                    query = f"FROM {table} WHERE tenant_id = ? AND category_id = ?"
+                    task_ids += [row[0] for row in connection.execute(f"SELECT id {query}", (tenant_id, category_id))]
+                    connection.execute(f"DELETE {query}", (tenant_id, category_id))
+                connection.execute("DELETE FROM archived_task_totals WHERE tenant_id = ? AND category_id = ?", (tenant_id, category_id))
+            return task_ids
+        return await self._call(delete)
+
+    async def next_order(self, kind, tenant_id, category_id=None):
+        if category_id is not None:
+            sql, params = "SELECT MAX(ord) FROM tasks WHERE tenant_id = ? AND category_id = ?", (tenant_id, category_id)
+        else:
+            sql, params = f"SELECT MAX(ord) FROM {self.TABLES[kind]} WHERE tenant_id = ?", (tenant_id,)
+        highest = await self._call(lambda: self._connect().execute(sql, params).fetchone()[0])
+        return highest + 1 if highest is not None else 0
+
+    async def list_due_tasks(self, tenant_id, before=None, after=None, category_id=None, limit=100):
+        sql = "SELECT doc FROM tasks WHERE tenant_id = ? AND completed = 0 AND due_at IS NOT NULL"
+        params = [tenant_id]
+        for clause, value in (("due_at >= ?", _epoch(after)), ("due_at < ?", _epoch(before)), ("category_id = ?", category_id)):
+            if value is not None:
+                sql += f" AND {clause}"
+                params.append(value)
+        sql += " ORDER BY due_at, rowid LIMIT ?"
+        return await self._call(self._fetch, sql, params + [limit])
+
+    # Archive
+    ROLLUP_COLUMNS = "SUM(CASE WHEN completed THEN weight ELSE 0 END), SUM(weight), COUNT(*), SUM(completed)"
+
+    def _refresh_archived_totals(self, connection, keys):
+        for tenant_id, category_id in keys:
+            connection.execute("DELETE FROM archived_task_totals WHERE tenant_id = ? AND category_id = ?", (tenant_id, category_id))
+            connection.execute(
+                f"INSERT INTO archived_task_totals SELECT tenant_id, category_id, {self.ROLLUP_COLUMNS} "
+                "FROM archived_tasks WHERE tenant_id = ? AND category_id = ? GROUP BY tenant_id, category_id",
+                (tenant_id, category_id)
+            )
+
+    def _archive_sync(self, completed_before, limit):
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT rowid, doc FROM tasks WHERE completed = 1 AND COALESCE(completed_at, updated_at) < ? LIMIT ?",
+                (_epoch(completed_before), limit)
+            ).fetchall()
+            archived_at = datetime.utcnow()
+            tasks = [self._load(row[1]) for row in rows]
+            for task in tasks:
+                self._write("archived_task", {**task, "archived_at": archived_at}, verb="OR REPLACE")
+            connection.executemany("DELETE FROM tasks WHERE rowid = ?", [(row[0],) for row in rows])
+            self._refresh_archived_totals(connection, {(task["tenant_id"], task["category_id"]) for task in tasks})
+        return len(rows)
+
+    async def archive_completed_tasks(self, completed_before, limit):
+        return await self._call(self._archive_sync, completed_before, limit)
+
+    async def list_archived_tasks(self, tenant_id, category_id=None, fields=None):
+        sql, params = "SELECT doc FROM archived_tasks WHERE tenant_id = ?", [tenant_id]
+        if category_id:
+            sql += " AND category_id = ?"
+            params.append(category_id)
+        tasks = await self._call(self._fetch, sql + " ORDER BY ord, rowid", params)
+        return tasks if fields is None else [_pick(task, fields) for task in tasks]
+
+    def iter_archived_tasks(self, tenant_id, exclude=()):
+        return self.iter_documents("archived_task", tenant_id, exclude)
+
+    def _restore_sync(self, tenant_id, task_id):
+        with self._connect() as connection:
+            task = self._fetch_one("SELECT doc FROM archived_tasks WHERE tenant_id = ? AND id = ?", (tenant_id, task_id))
+            if task is None:
+                return None
+            task.pop("archived_at", None)
+            self._write("task", task, verb="OR REPLACE")
+            connection.execute("DELETE FROM archived_tasks WHERE tenant_id = ? AND id = ?", (tenant_id, task_id))
+            self._refresh_archived_totals(connection, [(tenant_id, task["category_id"])])
+        return task
+
+    async def restore_archived_task(self, tenant_id, task_id):
+        return await self._call(self._restore_sync, tenant_id, task_id)
+
+    # Progress
+    async def progress_rollups(self, tenant_id, category_ids=None):
+        live = f"SELECT category_id, {self.ROLLUP_COLUMNS} FROM tasks WHERE tenant_id = ?"
+        archived = "SELECT category_id, completed_weight, total_weight, task_count, completed_task_count FROM archived_task_totals WHERE tenant_id = ?"
+        params = [tenant_id]
+        if category_ids is not None:
+            category_ids = list(category_ids)
+            if not category_ids:
+                return {}
+            condition = f" AND category_id IN ({', '.join('?' * len(category_ids))})"
+            live += condition
+            archived += condition
+            params += category_ids
+        live += " GROUP BY category_id"
+
+        def fetch():
+            connection = self._connect()
+            return connection.execute(live, params).fetchall(), connection.execute(archived, params).fetchall()
+
+        live_rows, archived_rows = await self._call(fetch)
+        rollups = {row[0]: dict(zip(ROLLUP_FIELDS, row[1:])) for row in live_rows}
+        return _merge_rollups(rollups, {row[0]: dict(zip(ROLLUP_FIELDS, row[1:])) for row in archived_rows})
+
+    async def completion_heatmap(self, tenant_id, start, end):
+        completed = "SELECT completed_at, weight FROM {table} WHERE tenant_id = ? AND completed = 1 AND completed_at >= ? AND completed_at < ?"
+        sql = (
+            "SELECT CAST(completed_at / 86400 AS INTEGER) AS day, SUM(weight), COUNT(*) FROM ("
+            f"{completed.format(table='tasks')} UNION ALL {completed.format(table='archived_tasks')}"
+            ") GROUP BY day ORDER BY day"
+        )
+        params = (tenant_id, _epoch(start), _epoch(end)) * 2
+
+        def fetch():
+            return self._connect().execute(sql, params).fetchall()
+
+        return [
+            {"day": EPOCH + timedelta(days=day), "completed_weight": weight, "completed_count": count}
+            for day, weight, count in await self._call(fetch)
+        ]
+
+    async def completion_rows(self, tenant_id):
+        # created_at is only kept in the JSON document, as {"$date": <ISO naive UTC>}; its first ten
+        # characters are the day. julianday() of a bare date is a whole day plus .5
+        columns = (
+            "SELECT category_id, weight, completed, "
+            "COALESCE(CAST(julianday(substr(json_extract(doc, '$.created_at.\"$date\"'), 1, 10)) - 1721424.5 AS INTEGER), 0), "
+            f"CASE WHEN completed = 1 THEN COALESCE(CAST(COALESCE(completed_at, updated_at) / 86400 AS INTEGER) + {EPOCH_ORDINAL}, 0) ELSE 0 END "
+            "FROM {table} WHERE tenant_id = ?"
+        )
+        sql = f"{columns.format(table='tasks')} UNION ALL {columns.format(table='archived_tasks')}"
+
+        def fetch():
+            return self._connect().execute(sql, (tenant_id, tenant_id)).fetchall()
+
+        return await self._call(fetch)
+
+    # Bulk operations
+    async def iter_documents(self, kind, tenant_id, exclude=(), page_size=1000):
+        # Keyset pagination keeps memory flat for large exports
+        table = self.TABLES[kind]
+        position = (-(2 ** 63), 0)
+        while True:
+            rows = await self._call(lambda: self._connect().execute(
+                f"SELECT ord, rowid, doc FROM {table} WHERE tenant_id = ? AND (ord, rowid) > (?, ?) ORDER BY ord, rowid LIMIT ?",
+                (tenant_id, position[0], position[1], page_size)
+            ).fetchall())
+            for row in rows:
+                yield self._load(row[2], exclude)
+            if len(rows) < page_size:
+                return
+            position = rows[-1][:2]
+
+    async def insert_many(self, kind, documents, ignore_duplicates=False):
+        def insert():
+            with self._connect():
+                for document in documents:
+                    self._write(kind, document, verb="OR IGNORE" if ignore_duplicates else "")
+        await self._call(insert)
+
+    async def set_orders(self, kind, tenant_id, orders, updated_at, first_revision, bump_version=True):
+        def set_orders():
+            updated = 0
+            with self._connect() as connection:
+                for offset, (item_id, order) in enumerate(orders.items()):
+                    document = self._fetch_one(f"SELECT doc FROM {self.TABLES[kind]} WHERE tenant_id = ? AND id = ?", (tenant_id, item_id))
+                    if document is None:
+                        continue
+                    document.update(order=order, updated_at=updated_at, revision=first_revision + offset,
+                                    version=document.get("version", 0) + int(bump_version))
+                    self._rewrite(connection, kind, document)
+                    updated += 1
+            return updated
+        return await self._call(set_orders)
+
+    async def delete_batch(self, kind, tenant_id, limit):
+        def delete():
+            table = self.TABLES[kind]
+            with self._connect() as connection:
+                cursor = connection.execute(
+                    f"DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} WHERE tenant_id = ? LIMIT ?)",
+                    (tenant_id, limit)
+                )
+                if cursor.rowcount or kind != "task":
+                    return cursor.rowcount
+                # Archived tasks go once the live ones are gone
+                rows = connection.execute(
+                    "SELECT rowid, category_id FROM archived_tasks WHERE tenant_id = ? LIMIT ?", (tenant_id, limit)
+                ).fetchall()
+                connection.executemany("DELETE FROM archived_tasks WHERE rowid = ?", [(row[0],) for row in rows])
+                self._refresh_archived_totals(connection, {(tenant_id, row[1]) for row in rows})
+            return len(rows)
+        return await self._call(delete)
+
+    async def clear_tenant(self, tenant_id):
+        def clear():
+            with self._connect() as connection:
+                for table in ("categories", "tasks", "archived_tasks", "archived_task_totals"):
+                    connection.execute(f"DELETE FROM {table} WHERE tenant_id = ?", (tenant_id,))
+        await self._call(clear)
+
+    # Delta sync bookkeeping
+    def _next_revision_sync(self, tenant_id, count):
+        connection = self._connect()
+        connection.execute(
+            "INSERT INTO counters (tenant_id, value) VALUES (?, ?) "
+            "ON CONFLICT (tenant_id) DO UPDATE SET value = value + excluded.value",
+            (tenant_id, count)
+        )
+        return connection.execute("SELECT value FROM counters WHERE tenant_id = ?", (tenant_id,)).fetchone()[0]
+
+    async def next_revision(self, tenant_id, count=1):
+        def reserve():
+            with self._connect() as connection:
+                last = self._next_revision_sync(tenant_id, count)
+                connection.execute(
+                    "INSERT INTO revision_reservations (tenant_id, first, reserved_at) VALUES (?, ?, ?)",
+                    (tenant_id, last - count + 1, time.time())
+                )
+            return last
+        return await self._call(reserve)
+
+    async def release_revisions(self, tenant_id, last, count=1):
+        def release():
+            with self._connect() as connection:
+                connection.execute("DELETE FROM revision_reservations WHERE tenant_id = ? AND first = ?", (tenant_id, last - count + 1))
+        await self._call(release)
+
+    async def revision_state(self, tenant_id):
+        row = await self._call(lambda: self._connect().execute(
+            "SELECT value, reset_revision, (SELECT MIN(first) FROM revision_reservations WHERE tenant_id = ? AND reserved_at >= ?) "
+            "FROM counters WHERE tenant_id = ?",
+            (tenant_id, time.time() - REVISION_LEASE_SECONDS, tenant_id)
+        ).fetchone())
+        if not row:
+            return 0, 0
+        value, reset_revision, first_pending = row
+        return (value if first_pending is None else min(value, first_pending - 1)), reset_revision
+
+    async def reset_sync_history(self, tenant_id):
+        def reset():
+            with self._connect() as connection:
+                revision = self._next_revision_sync(tenant_id, 1)
+                connection.execute("UPDATE counters SET reset_revision = ? WHERE tenant_id = ?", (revision, tenant_id))
+                connection.execute("DELETE FROM tombstones WHERE tenant_id = ?", (tenant_id,))
+            return revision
+        return await self._call(reset)
+
+    async def record_tombstones(self, tenant_id, kind, ids):
+        if not ids:
+            return
+        def record():
+            with self._connect() as connection:
+                last = self._next_revision_sync(tenant_id, len(ids))
+                first = last - len(ids) + 1
+                deleted_at = datetime.utcnow().isoformat()
+                connection.executemany(
+                    "INSERT OR REPLACE INTO tombstones (tenant_id, type, id, revision, deleted_at) VALUES (?, ?, ?, ?, ?)",
+                    [(tenant_id, kind, item_id, first + offset, deleted_at) for offset, item_id in enumerate(ids)]
+                )
+        await self._call(record)
+
+    @staticmethod
+    def _tombstone(row):
+        return {"type": row[0], "id": row[1], "revision": row[2], "deleted_at": datetime.fromisoformat(row[3])}
+
+    async def changes_since(self, tenant_id, since, exclude=()):
+        def changes():
+            categories = self._fetch(
+                "SELECT doc FROM categories WHERE tenant_id = ? AND revision > ? ORDER BY revision", (tenant_id, since), exclude
+            )
+            tasks = self._fetch(
+                "SELECT doc FROM tasks WHERE tenant_id = ? AND revision > ? ORDER BY revision", (tenant_id, since), exclude
+            )
+            tombstones = [self._tombstone(row) for row in self._connect().execute(
+                "SELECT type, id, revision, deleted_at FROM tombstones WHERE tenant_id = ? AND revision > ? ORDER BY revision",
+                (tenant_id, since)
+            )]
+            return categories, tasks, tombstones
+        return await self._call(changes)
+
+    async def find_tombstone(self, tenant_id, kind, item_id):
+        row = await self._call(lambda: self._connect().execute(
+            "SELECT type, id, revision, deleted_at FROM tombstones WHERE tenant_id = ? AND type = ? AND id = ?",
+            (tenant_id, kind, item_id)
+        ).fetchone())
+        return self._tombstone(row) if row else None
+
+    async def delete_tombstone(self, tenant_id, kind, item_id):
+        def delete():
+            with self._connect() as connection:
+                connection.execute("DELETE FROM tombstones WHERE tenant_id = ? AND type = ? AND id = ?", (tenant_id, kind, item_id))
+        await self._call(delete)
+
+    def _stored_is_newer(self, kind, tenant_id, item_id, updated_at):
+        row = self._connect().execute(
+            f"SELECT updated_at FROM {self.TABLES[kind]} WHERE tenant_id = ? AND id = ?", (tenant_id, item_id)
+        ).fetchone()
+        return row is not None and row[0] is not None and row[0] >= _epoch(updated_at)
+
+    async def upsert_if_newer(self, kind, document, updated_at):
+        def upsert():
+            tenant_id, item_id = document["tenant_id"], document["id"]
+            if self._stored_is_newer(kind, tenant_id, item_id, updated_at):
+                return False
+            if self._update_sync(kind, tenant_id, item_id, document) is None:
+                self._insert_sync(kind, {**document, "version": 1})
+            return True
+        return await self._call(upsert)
+
+    async def delete_if_newer(self, kind, tenant_id, item_id, updated_at):
+        def delete():
+            if self._stored_is_newer(kind, tenant_id, item_id, updated_at):
+                return False
+            return self._delete_sync(kind, tenant_id, item_id)
+        return await self._call(delete)
+
+STORAGE_BACKENDS = ("mongo", "memory", "sqlite")
+
+def create_repository(backend: str, mongo_database=None, sqlite_path: str = "progress_tracker.db"):
+    """Build the engine named by STORAGE_BACKEND"""
+    if backend == "mongo":
+        return MongoRepository(mongo_database)
+    if backend == "memory":
+        return MemoryRepository()
+    if backend == "sqlite":
+        return SQLiteRepository(sqlite_path)
+    raise ValueError(f"Unknown storage backend {backend!r}; expected one of {', '.join(STORAGE_BACKENDS)}")
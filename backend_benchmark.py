@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for Progress Tracker v2.0
+Runs offline against synthetic data using the same code paths as backend/server.py
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+import analytics  # noqa: E402
+import server  # noqa: E402
+import storage  # noqa: E402
+
+def make_dataset(category_count, task_count):
+    """Build categories/tasks shaped like the documents stored in MongoDB"""
+    now = datetime.utcnow().replace(microsecond=0)
+    categories = [
+        {
+            "id": str(uuid.uuid4()),
+            "name": f"Category {i}",
+            "name_key": f"category {i}",
+            "group": random.choice(["default", "work", "personal", "health", "learning"]),
+            "order": i,
+            "created_at": now - timedelta(days=random.randint(0, 365)),
+            "updated_at": now,
+            "revision": i + 1
+        }
+        for i in range(category_count)
+    ]
+    tasks = [
+        {
+            "id": str(uuid.uuid4()),
+            "title": f"Task {i} {uuid.uuid4().hex[:12]}",
+            "title_key": f"task {i}",
+            "weight": random.randint(1, 20),
+            "category_id": random.choice(categories)["id"],
+            "priority": random.choice(["high", "medium", "low"]),
+            "completed": random.random() < 0.4,
+            "pinned": random.random() < 0.05,
+            "order": i,
+            "created_at": now - timedelta(minutes=random.randint(0, 500000)),
+            "updated_at": now,
+            "revision": category_count + i + 1
+        }
+        for i in range(task_count)
+    ]
+    return categories, tasks
+
+def timed(fn, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def bench_json(categories, tasks):
+    # Mirrors FastAPI: response_model serialization + json.dumps out, json.loads + validation in
+    def encode():
+        data = server.ExportData(categories=categories, tasks=tasks, exported_at=datetime.utcnow())
+        return json.dumps(data.model_dump(mode="json")).encode()
+
+    def decode(payload):
+        return server.ExportData.model_validate(json.loads(payload))
+
+    return encode, decode
+
+def bench_snapshot(categories, tasks, encoding):
+    def encode():
+        encoder = server.SnapshotEncoder(encoding)
+        chunks = [encoder.encode("header", {"version": 1, "exported_at": datetime.utcnow()})]
+        chunks += [encoder.encode("category", category) for category in categories]
+        chunks += [encoder.encode("task", task) for task in tasks]
+        chunks.append(encoder.finish())
+        return b"".join(chunks)
+
+    def decode(payload):
+        decoder = server.SnapshotDecoder(encoding)
+        records = []
+        # Feed in network-sized pieces, as the streaming import does
+        for offset in range(0, len(payload), server.SNAPSHOT_CHUNK_BYTES):
+            records.extend(decoder.feed(payload[offset:offset + server.SNAPSHOT_CHUNK_BYTES]))
+        return records
+
+    return encode, decode
+
+def run_export_formats(args):
+    categories, tasks = make_dataset(args.categories, args.tasks)
+    print(f"Export/import formats: {len(categories)} categories, {len(tasks)} tasks (best of {args.repeat})")
+    print(f"{'format':<18}{'bytes':>14}{'ratio':>8}{'encode ms':>12}{'decode ms':>12}")
+
+    baseline = None
+    formats = [("json", bench_json(categories, tasks))]
+    formats += [
+        (f"msgpack+{encoding}", bench_snapshot(categories, tasks, encoding))
+        for encoding in server.snapshot_encodings()
+    ]
+    for name, (encode, decode) in formats:
+        encode_time, payload = timed(encode, args.repeat)
+        decode_time, _ = timed(lambda: decode(payload), args.repeat)
+        baseline = baseline or len(payload)
+        print(f"{name:<18}{len(payload):>14,}{len(payload) / baseline:>8.2f}"
+              f"{encode_time * 1000:>12.1f}{decode_time * 1000:>12.1f}")
+
+async def atimed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+async def bench_repository(repository, categories, tasks, repeat):
+    """Time the operations behind the hot endpoints on one storage engine"""
+    tenant_id = "bench"
+    await repository.initialize()
+    await repository.clear_tenant(tenant_id)
+    timings = {}
+    try:
+        start = time.perf_counter()
+        await repository.insert_many("category", [dict(category, tenant_id=tenant_id) for category in categories])
+        await repository.insert_many("task", [dict(task, tenant_id=tenant_id) for task in tasks])
+        timings["bulk insert"] = time.perf_counter() - start
+
+        category_ids = [category["id"] for category in categories]
+        timings["progress (all)"] = await atimed(lambda: repository.progress_rollups(tenant_id), repeat)
+        timings["list tasks (1 cat)"] = await atimed(lambda: repository.list_tasks(tenant_id, category_ids[0]), repeat)
+
+        async def updates():
+            for task in random.sample(tasks, min(200, len(tasks))):
+                await repository.update_task(tenant_id, task["id"], {"completed": not task["completed"]})
+        timings["200 task updates"] = await atimed(updates, repeat)
+
+        async def export():
+            async for _ in repository.iter_documents("task", tenant_id):
+                pass
+        timings["iterate all tasks"] = await atimed(export, repeat)
+    finally:
+        await repository.clear_tenant(tenant_id)
+        await repository.close()
+    return timings
+
+def storage_engines(args):
+    """(name, factory) for every engine the run can reach"""
+    engines = [("memory", storage.MemoryRepository)]
+    engines.append(("sqlite", lambda: storage.SQLiteRepository(args.sqlite_path)))
+    if args.mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        engines.append(("mongo", lambda: storage.MongoRepository(AsyncIOMotorClient(args.mongo_url).progress_tracker_bench)))
+    return engines
+
+def run_storage_engines(args):
+    categories, tasks = make_dataset(args.categories, args.tasks)
+    print(f"Storage engines: {len(categories)} categories, {len(tasks)} tasks (best of {args.repeat}, ms)")
+
+    results = {}
+    for name, build in storage_engines(args):
+        results[name] = asyncio.run(bench_repository(build(), categories, tasks, args.repeat))
+    if os.path.exists(args.sqlite_path):
+        os.remove(args.sqlite_path)
+
+    operations = list(next(iter(results.values())))
+    print(f"{'operation':<22}" + "".join(f"{name:>12}" for name in results))
+    for operation in operations:
+        print(f"{operation:<22}" + "".join(f"{timings[operation] * 1000:>12.1f}" for timings in results.values()))
+
+async def bench_completion_rows(repository, categories, tasks, repeat):
+    """Load a tenant, then time the read behind GET /api/analytics; returns (best seconds, rows)"""
+    tenant_id = "bench"
+    await repository.initialize()
+    await repository.clear_tenant(tenant_id)
+    try:
+        await repository.insert_many("category", [dict(category, tenant_id=tenant_id) for category in categories])
+        await repository.insert_many("task", [dict(task, tenant_id=tenant_id) for task in tasks])
+        elapsed = await atimed(lambda: repository.completion_rows(tenant_id), repeat)
+        return elapsed, await repository.completion_rows(tenant_id)
+    finally:
+        await repository.clear_tenant(tenant_id)
+        await repository.close()
+
+def run_analytics(args):
+    categories, tasks = make_dataset(args.categories, args.analytics_tasks)
+    today = datetime.utcnow().date()
+    print(f"Analytics: {len(categories)} categories, {len(tasks)} tasks, {args.analytics_days}-day window (best of {args.repeat}, ms)")
+    print(f"{'engine':<10}{'read rows':>12}{'compute':>12}{'total':>12}")
+
+    for name, build in storage_engines(args):
+        read_time, rows = asyncio.run(bench_completion_rows(build(), categories, tasks, args.repeat))
+        compute_time, _ = timed(lambda: analytics.completion_analytics(rows, categories, today, args.analytics_days), args.repeat)
+        print(f"{name:<10}{read_time * 1000:>12.1f}{compute_time * 1000:>12.1f}{(read_time + compute_time) * 1000:>12.1f}")
+    if os.path.exists(args.sqlite_path):
+        os.remove(args.sqlite_path)
+
+def run_response_compression(args):
+    categories, tasks = make_dataset(args.categories, args.tasks)
+    # The bodies GET /api/tasks and GET /api/export produce
+    payloads = {
+        "tasks": server.TypeAdapter(list[server.Task]).dump_json([server.Task(**task) for task in tasks]),
+        "export": json.dumps(server.ExportData(categories=categories, tasks=tasks, exported_at=datetime.utcnow())
+                             .model_dump(mode="json")).encode(),
+    }
+    print(f"Response compression: {len(tasks)} tasks (best of {args.repeat})")
+    print(f"{'payload':<10}{'encoding':<12}{'bytes':>14}{'ratio':>8}{'cpu ms':>10}{'MB/s':>10}")
+
+    settings = [("identity", None)]
+    settings += [("gzip", level) for level in (1, 4, 6, 9)]
+    if server.HAS_BROTLI:
+        settings += [("br", level) for level in (1, 4, 5, 9)]
+    for name, payload in payloads.items():
+        for encoding, level in settings:
+            def compress():
+                # Compress in response-sized chunks, as the middleware does for streams
+                compressor = server.new_compressor(encoding, level)
+                parts = [compressor.compress(payload[offset:offset + server.SNAPSHOT_CHUNK_BYTES])
+                         for offset in range(0, len(payload), server.SNAPSHOT_CHUNK_BYTES)]
+                return b"".join(parts) + compressor.flush()
+            elapsed, body = timed(compress, args.repeat)
+            label = encoding if level is None else f"{encoding}-{level}"
+            print(f"{name:<10}{label:<12}{len(body):>14,}{len(body) / len(payload):>8.3f}"
+                  f"{elapsed * 1000:>10.1f}{len(payload) / elapsed / 1e6:>10.0f}")
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend")
+
+# Runs in a fresh interpreter: import the app, run startup, serve GET / in-process, report the status
+FIRST_RESPONSE_PROBE = """
+import asyncio
+import server
+
+async def main():
+    await server.app.router.startup()
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+             "scheme": "http", "path": "/", "raw_path": b"/", "query_string": b"", "root_path": "",
+             "headers": [], "client": ("127.0.0.1", 0), "server": ("127.0.0.1", 8001), "app": server.app}
+    await server.app(scope, receive, send)
+    print(messages[0]["status"], flush=True)
+
+asyncio.run(main())
+"""
+FRAMEWORK_BASELINE_PROBE = "import fastapi, fastapi.middleware.cors, pydantic; print(200, flush=True)"
+
+def cold_start_ms(code, env=None):
+    """Wall time from spawning an interpreter until it prints its first line"""
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-c", code], cwd=BACKEND_DIR, stdout=subprocess.PIPE,
+                               env={**os.environ, **(env or {})}, text=True)
+    try:
+        line = process.stdout.readline().strip()
+        elapsed = (time.perf_counter() - start) * 1000
+    finally:
+        process.kill()
+        process.wait()
+    if line != "200":
+        raise RuntimeError(f"probe failed: {line!r}")
+    return elapsed
+
+def import_time_report(top=15):
+    """Per-module (self, cumulative) import microseconds from `python -X importtime -c 'import server'`"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import server"], cwd=BACKEND_DIR,
+                            capture_output=True, text=True, check=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        rows.append((int(self_us), int(cumulative_us), module.strip()))
+    return sorted(rows, key=lambda row: row[1], reverse=True)[:top]
+
+def run_startup(args):
+    print(f"Cold start (best of {args.repeat})")
+    baseline = min(cold_start_ms(FRAMEWORK_BASELINE_PROBE) for _ in range(args.repeat))
+    first_response = min(cold_start_ms(FIRST_RESPONSE_PROBE) for _ in range(args.repeat))
+    print(f"{'interpreter + framework imports':<36}{baseline:>10.1f} ms")
+    print(f"{'first response':<36}{first_response:>10.1f} ms")
+    print(f"{'owned by the app':<36}{first_response - baseline:>10.1f} ms")
+
+    print("\nSlowest imports (-X importtime, cumulative)")
+    print(f"{'module':<48}{'self ms':>10}{'total ms':>10}")
+    for self_us, cumulative_us, module in import_time_report():
+        print(f"{module:<48}{self_us / 1000:>10.1f}{cumulative_us / 1000:>10.1f}")
+
+BENCHMARKS = {
+    "export": run_export_formats,
+    "storage": run_storage_engines,
+    "startup": run_startup,
+    "compression": run_response_compression,
+    "analytics": run_analytics,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("benchmarks", nargs="*", help=f"any of: {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument("--categories", type=int, default=200)
+    parser.add_argument("--tasks", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--analytics-tasks", type=int, default=1000000)
+    parser.add_argument("--analytics-days", type=int, default=28)
+    parser.add_argument("--sqlite-path", default="benchmark.db")
+    parser.add_argument("--mongo-url", default=os.environ.get("BENCH_MONGO_URL"), help="include MongoDB in storage")
+    args = parser.parse_args()
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(sorted(unknown))}")
+
+    for name in args.benchmarks or BENCHMARKS:
+        BENCHMARKS[name](args)
+        print()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Concurrency Stress Testing for Progress Tracker v2.0
+Fires hundreds of overlapping creates/updates/reorders/deletes at the same categories
+and then checks the data invariants that racy write paths tend to break
+"""
+
+import asyncio
+import os
+import random
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Configuration
+# Local by default; pointing the stress run at a shared deployment has to be an explicit choice
+BASE_URL = os.environ.get("STRESS_BASE_URL", "http://localhost:8001/api")
+HEADERS = {"Content-Type": "application/json"}
+CONCURRENCY = int(os.environ.get("STRESS_CONCURRENCY", "64"))
+ROUNDS = int(os.environ.get("STRESS_ROUNDS", "200"))
+
+class ProgressTrackerStressTester:
+    def __init__(self):
+        self.base_url = BASE_URL
+        self.headers = HEADERS
+        # Every run works inside its own group so invariants are checked only against our data
+        self.group = f"stress-{uuid.uuid4().hex[:8]}"
+        self.test_categories = []
+        self.results = {
+            "passed": 0,
+            "failed": 0,
+            "errors": []
+        }
+        self.executor = ThreadPoolExecutor(max_workers=CONCURRENCY)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=CONCURRENCY, pool_maxsize=CONCURRENCY)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def log_result(self, test_name, success, message=""):
+        if success:
+            self.results["passed"] += 1
+            print(f"✅ {test_name}: PASSED {message}")
+        else:
+            self.results["failed"] += 1
+            self.results["errors"].append(f"{test_name}: {message}")
+            print(f"❌ {test_name}: FAILED - {message}")
+
+    async def request(self, method, path, **kwargs):
+        """Run a blocking request on the worker pool so many of them overlap"""
+        loop = asyncio.get_running_loop()
+        url = f"{self.base_url}{path}"
+        return await loop.run_in_executor(
+            self.executor,
+            lambda: self.session.request(method, url, headers=self.headers, timeout=60, **kwargs)
+        )
+
+    async def burst(self, coroutines):
+        """Start all coroutines together and collect responses (or exceptions)"""
+        return await asyncio.gather(*coroutines, return_exceptions=True)
+
+    def our_categories(self, categories):
+        return [cat for cat in categories if cat.get("group") == self.group]
+
+    async def fetch_state(self):
+        categories_response, tasks_response, progress_response = await self.burst([
+            self.request("GET", "/categories"),
+            self.request("GET", "/tasks"),
+            self.request("GET", "/progress"),
+        ])
+        categories = self.our_categories(categories_response.json())
+        category_ids = {cat["id"] for cat in categories}
+        tasks = [task for task in tasks_response.json() if task["category_id"] in category_ids]
+        progress = [item for item in progress_response.json() if item["category_id"] in category_ids]
+        return categories, tasks, progress
+
+    async def test_concurrent_category_creates(self):
+        """Create the same (group, name) many times at once - only one may win"""
+        print("\n=== Concurrent Category Creates ===")
+
+        name = f"Contended {uuid.uuid4().hex[:8]}"
+        responses = await self.burst([
+            self.request("POST", "/categories", json={"name": name, "group": self.group})
+            for _ in range(CONCURRENCY)
+        ])
+        created = [r.json() for r in responses if not isinstance(r, Exception) and r.status_code == 200]
+        self.test_categories.extend(created)
+
+        if len(created) == 1:
+            self.log_result("Duplicate Name Race", True, f"1 of {CONCURRENCY} concurrent creates succeeded")
+        else:
+            self.log_result("Duplicate Name Race", False, f"{len(created)} categories created with the same name")
+
+        # Distinct names in the same group must all get distinct orders
+        responses = await self.burst([
+            self.request("POST", "/categories", json={"name": f"Stress {i} {uuid.uuid4().hex[:6]}", "group": self.group})
+            for i in range(CONCURRENCY)
+        ])
+        created = [r.json() for r in responses if not isinstance(r, Exception) and r.status_code == 200]
+        self.test_categories.extend(created)
+
+        # 429 is the rate limiter pushing back, not a lost race
+        throttled = [r for r in responses if not isinstance(r, Exception) and r.status_code == 429]
+        errors = [r for r in responses if isinstance(r, Exception) or r.status_code not in (200, 429)]
+        self.log_result("Bulk Category Create", not errors,
+                        f"{len(created)} created, {len(throttled)} throttled, {len(errors)} failed")
+
+    async def test_overlapping_writes(self):
+        """Interleave task creates, updates, reorders and deletes on shared categories"""
+        print("\n=== Overlapping Task Writes ===")
+
+        if not self.test_categories:
+            self.log_result("Overlapping Writes", False, "No categories to stress")
+            return
+
+        # A handful of hot categories receive all of the traffic
+        hot = self.test_categories[:4]
+        known_tasks = []
+
+        async def create(category):
+            response = await self.request("POST", "/tasks", json={
+                "title": f"Stress Task {uuid.uuid4().hex[:8]}",
+                "weight": random.randint(1, 20),
+                "category_id": category["id"],
+                "priority": random.choice(["high", "medium", "low"])
+            })
+            if response.status_code == 200:
+                known_tasks.append(response.json())
+            return response
+
+        async def update():
+            if not known_tasks:
+                return await create(random.choice(hot))
+            task = random.choice(known_tasks)
+            payload = random.choice([
+                {"completed": random.choice([True, False])},
+                {"weight": random.randint(1, 20)},
+                {"pinned": random.choice([True, False])},
+                {"priority": random.choice(["high", "medium", "low"])},
+                {"completed": True, "weight": random.randint(1, 20)},
+            ])
+            return await self.request("PUT", f"/tasks/{task['id']}", json=payload)
+
+        async def reorder():
+            category = random.choice(hot)
+            ids = [task["id"] for task in known_tasks if task["category_id"] == category["id"]]
+            random.shuffle(ids)
+            return await self.request("PUT", "/tasks/reorder", json=[
+                {"id": task_id, "order": order} for order, task_id in enumerate(ids)
+            ])
+
+        async def delete():
+            if not known_tasks:
+                return await create(random.choice(hot))
+            task = known_tasks.pop(random.randrange(len(known_tasks)))
+            return await self.request("DELETE", f"/tasks/{task['id']}")
+
+        # Seed with a burst of pure creates so the later mix has something to fight over
+        await self.burst([create(random.choice(hot)) for _ in range(CONCURRENCY)])
+
+        operations = [create, create, update, update, update, reorder, delete]
+        calls = []
+        for _ in range(ROUNDS):
+            operation = random.choice(operations)
+            calls.append(operation(random.choice(hot)) if operation is create else operation())
+        responses = await self.burst(calls)
+
+        server_errors = [r for r in responses if isinstance(r, Exception) or r.status_code >= 500]
+        self.log_result("Overlapping Writes", not server_errors,
+                        f"{len(responses)} requests, {len(server_errors)} errors")
+
+    async def test_reorders_during_creates(self):
+        """Run a full category reorder while new tasks keep arriving"""
+        print("\n=== Reorder During Creates ===")
+
+        if not self.test_categories:
+            return
+
+        category = self.test_categories[0]
+        response = await self.request("GET", "/tasks", params={"category_id": category["id"]})
+        ids = [task["id"] for task in response.json()]
+
+        calls = [
+            self.request("PUT", "/tasks/reorder", json=[
+                {"id": task_id, "order": order} for order, task_id in enumerate(reversed(ids))
+            ])
+        ]
+        calls += [
+            self.request("POST", "/tasks", json={
+                "title": f"Late Task {i}",
+                "weight": 1,
+                "category_id": category["id"]
+            })
+            for i in range(CONCURRENCY // 2)
+        ]
+        responses = await self.burst(calls)
+        server_errors = [r for r in responses if isinstance(r, Exception) or r.status_code >= 500]
+        self.log_result("Reorder During Creates", not server_errors, f"{len(server_errors)} errors")
+
+    async def check_invariants(self):
+        """Verify unique orders, unique names and progress against a from-scratch recomputation"""
+        print("\n=== Checking Invariants ===")
+
+        categories, tasks, progress = await self.fetch_state()
+        self.test_categories = categories
+
+        # Unique (group, name)
+        names = Counter((cat["group"], cat["name"]) for cat in categories)
+        duplicates = [name for (_, name), count in names.items() if count > 1]
+        self.log_result("Unique Category Names", not duplicates,
+                        f"duplicates: {duplicates[:5]}" if duplicates else f"{len(categories)} categories")
+
+        # Unique category orders
+        category_orders = Counter(cat["order"] for cat in categories)
+        clashes = [order for order, count in category_orders.items() if count > 1]
+        self.log_result("Unique Category Orders", not clashes,
+                        f"clashing orders: {clashes[:10]}" if clashes else "")
+
+        # Unique task orders per category
+        per_category = {}
+        for task in tasks:
+            per_category.setdefault(task["category_id"], Counter())[task["order"]] += 1
+        clashing = {
+            category_id: [order for order, count in orders.items() if count > 1]
+            for category_id, orders in per_category.items()
+        }
+        clashing = {category_id: orders for category_id, orders in clashing.items() if orders}
+        self.log_result("Unique Task Orders Per Category", not clashing,
+                        f"{len(clashing)} categories with clashing orders" if clashing else f"{len(tasks)} tasks")
+
+        # Progress matches a recomputation from the raw tasks
+        mismatches = []
+        for item in progress:
+            category_tasks = [task for task in tasks if task["category_id"] == item["category_id"]]
+            total_weight = sum(task["weight"] for task in category_tasks)
+            completed_weight = sum(task["weight"] for task in category_tasks if task["completed"])
+            expected = (completed_weight / total_weight * 100) if total_weight > 0 else 0.0
+            if (item["total_weight"] != total_weight or
+                item["completed_weight"] != completed_weight or
+                item["task_count"] != len(category_tasks) or
+                item["completed_task_count"] != sum(1 for task in category_tasks if task["completed"]) or
+                abs(item["progress_percentage"] - expected) > 0.01):
+                mismatches.append(item["category_id"])
+        self.log_result("Progress Matches Recomputation", not mismatches,
+                        f"{len(mismatches)} categories disagree" if mismatches else f"{len(progress)} categories")
+
+    def cleanup(self):
+        """Clean up test data"""
+        print("\n=== Cleaning Up Test Data ===")
+
+        for category in self.test_categories:
+            try:
+                requests.delete(f"{self.base_url}/categories/{category['id']}")
+            except:
+                pass
+
+        print("Cleanup completed")
+
+    async def run(self):
+        await self.test_concurrent_category_creates()
+        await self.test_overlapping_writes()
+        await self.test_reorders_during_creates()
+        await self.check_invariants()
+
+    def run_all_tests(self):
+        """Run the stress suite"""
+        print("🚀 Starting Progress Tracker Concurrency Stress Tests")
+        print(f"Testing against: {self.base_url} (concurrency={CONCURRENCY}, rounds={ROUNDS})")
+        print("=" * 60)
+
+        try:
+            asyncio.run(self.run())
+        finally:
+            self.cleanup()
+            self.executor.shutdown()
+
+        print("\n" + "=" * 60)
+        print("📊 TEST SUMMARY")
+        print("=" * 60)
+        print(f"✅ Passed: {self.results['passed']}")
+        print(f"❌ Failed: {self.results['failed']}")
+
+        if self.results['errors']:
+            print("\n🔍 FAILED TESTS:")
+            for error in self.results['errors']:
+                print(f"  • {error}")
+
+        return self.results
+
+if __name__ == "__main__":
+    tester = ProgressTrackerStressTester()
+    results = tester.run_all_tests()
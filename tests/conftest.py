@@ -0,0 +1,51 @@
+import os
+import sys
+import uuid
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+TEST_MONGO_URL = os.environ.get("TEST_MONGO_URL")
+
+@pytest.fixture
+def memory_server(monkeypatch):
+    """The server module backed by a fresh in-memory repository; without a lifespan, requests skip the readiness gate"""
+    import server
+    from storage import create_repository
+
+    monkeypatch.setattr(server, "STORAGE_BACKEND", "memory")
+    monkeypatch.setattr(server, "repository", create_repository("memory"))
+    return server
+
+@pytest.fixture
+def mongo_server(monkeypatch):
+    """The server module on a throwaway MongoDB database (skipped without TEST_MONGO_URL).
+
+    Open `TestClient(server.app)` as a context manager so startup builds the indexes.
+    The background loops stay off; tests take snapshots and run jobs themselves.
+    """
+    if not TEST_MONGO_URL:
+        pytest.skip("TEST_MONGO_URL not set")
+    import server
+    from pymongo import MongoClient
+    from storage import create_repository
+
+    database = server.LazyDatabase(TEST_MONGO_URL, f"server_{uuid.uuid4().hex[:8]}", profiles=server.READ_PROFILES)
+    monkeypatch.setattr(server, "STORAGE_BACKEND", "mongo")
+    monkeypatch.setattr(server, "RUN_BACKGROUND_LOOPS", False)
+    monkeypatch.setattr(server, "db", database)
+    monkeypatch.setattr(server, "repository", create_repository("mongo", mongo_database=database))
+    yield server
+    if database.database is not None:
+        database.database.client.close()
+    with MongoClient(TEST_MONGO_URL) as client:
+        client.drop_database(database.name)
+
+@pytest.fixture
+def mongo_database(mongo_server):
+    """Synchronous pymongo handle on mongo_server's database, for seeding and inspecting documents"""
+    from pymongo import MongoClient
+
+    with MongoClient(TEST_MONGO_URL) as client:
+        yield client[mongo_server.db.name]
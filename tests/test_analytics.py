@@ -0,0 +1,37 @@
+"""Completion analytics over a small hand-checked set of tasks"""
+from datetime import date
+
+from analytics import completion_analytics
+
+def day(month, day_of_month):
+    return date(2026, month, day_of_month).toordinal()
+
+CATEGORIES = [{"id": "a", "name": "A", "group": "work"}, {"id": "b", "name": "B", "group": "work"}]
+# (category_id, weight, completed, created day, done day), as Repository.completion_rows returns them
+TASKS = [
+    ("a", 2, True, day(10, 1), day(10, 18)),
+    ("a", 3, False, day(10, 17), 0),
+    # Completed before the window
+    ("b", 5, True, day(9, 1), day(9, 2)),
+    ("gone", 9, False, day(10, 17), 0),
+]
+
+def test_velocity_burndown_and_forecast():
+    result = completion_analytics(TASKS, CATEGORIES, date(2026, 10, 19), 3)
+    assert result["days"] == [date(2026, 10, 17), date(2026, 10, 18), date(2026, 10, 19)]
+    a, b = result["categories"]
+    assert a["burndown"] == [5.0, 3.0, 3.0]
+    assert a["velocity"] == 2 / 3
+    assert (a["forecast_days"], a["forecast_date"]) == (4.5, date(2026, 10, 24))
+    assert (b["remaining_weight"], b["velocity"], b["forecast_days"]) == (0.0, 0.0, 0.0)
+
+def test_groups_sum_their_categories():
+    (work,) = completion_analytics(TASKS, CATEGORIES, date(2026, 10, 19), 3)["groups"]
+    assert (work["id"], work["task_count"], work["total_weight"], work["completed_weight"]) == ("work", 3, 10.0, 7.0)
+    assert work["burndown"] == [5.0, 3.0, 3.0]
+
+def test_no_completions_has_no_forecast():
+    tasks = [("a", 4, False, day(10, 18), 0)]
+    (a, _) = completion_analytics(tasks, CATEGORIES, date(2026, 10, 19), 3)["categories"]
+    assert a["burndown"] == [0.0, 4.0, 4.0]
+    assert (a["forecast_days"], a["forecast_date"]) == (None, None)
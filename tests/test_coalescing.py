@@ -0,0 +1,58 @@
+"""SingleFlight: concurrent identical reads share one computation, failures are shared but never cached"""
+import asyncio
+
+from server import SingleFlight
+
+def test_concurrent_identical_calls_share_one_computation():
+    async def scenario():
+        flight = SingleFlight()
+        calls = 0
+        release = asyncio.Event()
+        async def compute():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return {"value": calls}
+        waiters = [asyncio.create_task(flight.do(("/api/stats", "t1"), compute)) for _ in range(5)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*waiters)
+        return calls, results, flight
+    calls, results, flight = asyncio.run(scenario())
+    assert calls == 1
+    assert all(result is results[0] for result in results)
+    assert flight.stats["/api/stats"] == {"executed": 1, "coalesced": 4}
+    assert flight.inflight == {}
+
+def test_errors_reach_every_waiter_and_are_not_cached():
+    async def scenario():
+        flight = SingleFlight()
+        calls = 0
+        release = asyncio.Event()
+        async def failing():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            raise RuntimeError("boom")
+        waiters = [asyncio.create_task(flight.do(("/api/stats", "t1"), failing)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        outcomes = await asyncio.gather(*waiters, return_exceptions=True)
+        async def succeeding():
+            return "fresh"
+        retried = await flight.do(("/api/stats", "t1"), succeeding)
+        return calls, outcomes, retried
+    calls, outcomes, retried = asyncio.run(scenario())
+    assert calls == 1
+    assert all(isinstance(outcome, RuntimeError) for outcome in outcomes)
+    assert retried == "fresh"
+
+def test_distinct_keys_do_not_coalesce():
+    async def scenario():
+        flight = SingleFlight()
+        async def compute():
+            await asyncio.sleep(0)
+            return object()
+        return await asyncio.gather(flight.do(("/api/stats", "t1"), compute), flight.do(("/api/stats", "t2"), compute))
+    first, second = asyncio.run(scenario())
+    assert first is not second
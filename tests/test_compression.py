@@ -0,0 +1,81 @@
+"""Response compression: encoding negotiation, Vary, the size threshold and streamed bodies"""
+import zlib
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+import server
+
+LARGE = {"items": ["x" * 64] * 64}
+
+def build_client():
+    async def large(request):
+        return JSONResponse(LARGE)
+    async def small(request):
+        return JSONResponse({"ok": True})
+    async def binary(request):
+        return Response(b"\0" * 4096, media_type="application/octet-stream")
+    async def streamed(request):
+        async def chunks():
+            for n in range(50):
+                yield f'{{"line": {n}, "pad": "{"y" * 100}"}}\n'.encode()
+        return StreamingResponse(chunks(), media_type="text/plain")
+    routes = [Route("/large", large), Route("/small", small), Route("/binary", binary), Route("/streamed", streamed)]
+    return TestClient(server.CompressionMiddleware(Starlette(routes=routes)))
+
+def raw_get(client, path, accept_encoding):
+    # Read the undecoded bytes so the test sees exactly what went over the wire
+    with client.stream("GET", path, headers={"Accept-Encoding": accept_encoding}) as response:
+        return response, b"".join(response.iter_raw())
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+    ("gzip", "gzip"),
+    ("gzip;q=0.5, identity", "gzip"),
+    ("gzip;q=0", None),
+    ("br;q=0, gzip;q=0", None),
+    ("*", server.response_encodings()[0]),
+    ("*;q=0", None),
+    ("gzip;q=bogus", None),
+    ("", None),
+])
+def test_negotiation_honours_q_values(accept_encoding, expected):
+    assert server.accepted_response_encoding(accept_encoding) == expected
+
+def test_large_json_is_gzipped_with_vary_and_length():
+    response, body = raw_get(build_client(), "/large", "gzip")
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert int(response.headers["content-length"]) == len(body)
+    assert zlib.decompress(body, 47) == JSONResponse(LARGE).body
+
+def test_refused_encoding_passes_through():
+    response, body = raw_get(build_client(), "/large", "gzip;q=0")
+    assert "content-encoding" not in response.headers
+    assert body == JSONResponse(LARGE).body
+
+def test_small_bodies_stay_uncompressed_but_vary():
+    response, body = raw_get(build_client(), "/small", "gzip")
+    assert "content-encoding" not in response.headers
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert body == b'{"ok":true}'
+
+def test_threshold_is_configurable(monkeypatch):
+    monkeypatch.setattr(server, "COMPRESSION_MIN_BYTES", 1)
+    response, _ = raw_get(build_client(), "/small", "gzip")
+    assert response.headers["content-encoding"] == "gzip"
+
+def test_incompressible_types_are_left_alone():
+    response, body = raw_get(build_client(), "/binary", "gzip")
+    assert "content-encoding" not in response.headers
+    assert "vary" not in response.headers
+    assert len(body) == 4096
+
+def test_streamed_bodies_are_compressed_chunk_by_chunk():
+    response, body = raw_get(build_client(), "/streamed", "gzip")
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    lines = zlib.decompress(body, 47).decode().splitlines()
+    assert len(lines) == 50 and lines[-1].startswith('{"line": 49')
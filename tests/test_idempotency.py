@@ -0,0 +1,89 @@
+"""Idempotency-Key: replays, key reuse for a different request, concurrent duplicates and expiry"""
+import asyncio
+import uuid
+
+import httpx
+from fastapi.testclient import TestClient
+
+def key():
+    return f"test-{uuid.uuid4()}"
+
+def test_retry_replays_the_first_response(memory_server):
+    client = TestClient(memory_server.app)
+    headers = {"Idempotency-Key": key()}
+    first = client.post("/api/categories", json={"name": "Work"}, headers=headers)
+    retry = client.post("/api/categories", json={"name": "Work"}, headers=headers)
+    assert first.status_code == retry.status_code == 200
+    assert retry.json() == first.json()
+    assert retry.headers["idempotent-replayed"] == "true" and "idempotent-replayed" not in first.headers
+    assert len(client.get("/api/categories").json()) == 1
+
+def test_reusing_a_key_for_a_different_request_is_rejected(memory_server):
+    client = TestClient(memory_server.app)
+    headers = {"Idempotency-Key": key()}
+    assert client.post("/api/categories", json={"name": "Work"}, headers=headers).status_code == 200
+    response = client.post("/api/categories", json={"name": "Home"}, headers=headers)
+    assert response.status_code == 422
+    assert [category["name"] for category in client.get("/api/categories").json()] == ["Work"]
+
+def test_keys_are_scoped_per_tenant(memory_server):
+    client = TestClient(memory_server.app)
+    idempotency_key = key()
+    for tenant_id in ("t1", "t2"):
+        response = client.post("/api/categories", json={"name": "Work"}, headers={"Idempotency-Key": idempotency_key, "X-Tenant-ID": tenant_id})
+        assert response.status_code == 200 and "idempotent-replayed" not in response.headers
+
+def test_concurrent_duplicates_run_once(memory_server):
+    repository = memory_server.repository
+    insert_category = repository.insert_category
+    release = asyncio.Event()
+    inserts = 0
+
+    async def slow_insert_category(document):
+        nonlocal inserts
+        inserts += 1
+        await release.wait()
+        await insert_category(document)
+
+    async def main():
+        repository.insert_category = slow_insert_category
+        transport = httpx.ASGITransport(app=memory_server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            headers = {"Idempotency-Key": key()}
+            first = asyncio.ensure_future(client.post("/api/categories", json={"name": "Work"}, headers=headers))
+            await asyncio.sleep(0.05)
+            second = asyncio.ensure_future(client.post("/api/categories", json={"name": "Work"}, headers=headers))
+            await asyncio.sleep(0.05)
+            assert not second.done()  # waiting for the first, not executing
+            release.set()
+            return await first, await second
+    first, second = asyncio.run(main())
+    assert inserts == 1
+    assert first.status_code == second.status_code == 200
+    assert second.json() == first.json() and second.headers["idempotent-replayed"] == "true"
+
+def test_expired_records_are_not_replayed(memory_server, monkeypatch):
+    client = TestClient(memory_server.app)
+    monkeypatch.setattr(memory_server, "IDEMPOTENCY_TTL_SECONDS", 0)
+    headers = {"Idempotency-Key": key()}
+    first = client.post("/api/categories", json={"name": "Work"}, headers=headers)
+    retry = client.post("/api/categories", json={"name": "Work"}, headers=headers)
+    assert first.status_code == 200
+    # Executed again: the duplicate-name check answers instead of the stored response
+    assert "idempotent-replayed" not in retry.headers
+    assert retry.json() != first.json()
+
+def test_server_errors_are_not_stored(memory_server):
+    client = TestClient(memory_server.app, raise_server_exceptions=False)
+    repository = memory_server.repository
+    insert_category = repository.insert_category
+    headers = {"Idempotency-Key": key()}
+
+    async def failing(document):
+        raise RuntimeError("storage down")
+
+    repository.insert_category = failing
+    assert client.post("/api/categories", json={"name": "Work"}, headers=headers).status_code == 500
+    repository.insert_category = insert_category
+    response = client.post("/api/categories", json={"name": "Work"}, headers=headers)
+    assert response.status_code == 200 and "idempotent-replayed" not in response.headers
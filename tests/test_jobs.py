@@ -0,0 +1,150 @@
+"""Background jobs end to end; MongoDB-only, so these run with TEST_MONGO_URL.
+
+The job worker loops stay off (see the mongo_server fixture); each test claims
+and executes jobs itself through the TestClient's event loop.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+TENANT = {"X-Tenant-ID": "jobs-a"}
+
+SNAPSHOT = {
+    "exported_at": "2026-01-01T00:00:00",
+    "categories": [{"id": "c1", "name": "Work", "group": "default", "order": 0}],
+    "tasks": [
+        {"id": "t1", "title": "Report", "weight": 2, "category_id": "c1", "completed": False, "order": 0},
+        {"id": "t2", "title": "Slides", "weight": 1, "category_id": "c1", "completed": True, "order": 1},
+    ],
+}
+
+async def run_next_job(server):
+    """What one turn of run_job_worker does"""
+    job = await server.claim_next_job()
+    if job is not None:
+        await server.execute_job(job)
+    return job
+
+def job(client, job_id):
+    return client.get(f"/api/jobs/{job_id}", headers=TENANT).json()
+
+def test_import_job_runs_from_queued_to_succeeded(mongo_server, mongo_database):
+    with TestClient(mongo_server.app) as client:
+        submitted = client.post("/api/jobs/import", json=SNAPSHOT, headers=TENANT)
+        assert submitted.status_code == 202
+        assert submitted.json()["status"] == "queued"
+        assert submitted.json()["progress"] == {"done": 0, "total": 3}
+
+        client.portal.call(run_next_job, mongo_server)
+        finished = job(client, submitted.json()["id"])
+
+    assert finished["status"] == "succeeded"
+    assert finished["progress"] == {"done": 3, "total": 3}
+    assert finished["result_url"] is None
+    assert sorted(document["id"] for document in mongo_database.tasks.find({"tenant_id": "jobs-a"})) == ["t1", "t2"]
+    # Staged payloads are dropped once the job is done
+    assert mongo_database.job_payloads.count_documents({}) == 0
+
+def test_export_job_result_downloads_as_a_snapshot(mongo_server):
+    with TestClient(mongo_server.app) as client:
+        client.post("/api/jobs/import", json=SNAPSHOT, headers=TENANT)
+        client.portal.call(run_next_job, mongo_server)
+        export = client.post("/api/jobs/export", headers=TENANT).json()
+        early = client.get(f"/api/jobs/{export['id']}/result", headers=TENANT)
+
+        client.portal.call(run_next_job, mongo_server)
+        finished = job(client, export["id"])
+        result = client.get(finished["result_url"], headers=TENANT)
+        other = client.get(finished["result_url"], headers={"X-Tenant-ID": "jobs-b"})
+
+    assert early.status_code == 409
+    assert finished["status"] == "succeeded"
+    assert result.status_code == 200
+    assert result.headers["content-type"] == mongo_server.MSGPACK_MEDIA_TYPE
+    # httpx has already undone the gzip Content-Encoding
+    records = list(mongo_server.SnapshotDecoder("identity").feed(result.content))
+    assert [kind for kind, _ in records] == ["header", "category", "task", "task"]
+    assert {document["id"] for kind, document in records if kind == "task"} == {"t1", "t2"}
+    assert other.status_code == 404
+
+def test_cancelling_a_queued_job_stops_it_before_it_runs(mongo_server, mongo_database):
+    with TestClient(mongo_server.app) as client:
+        submitted = client.post("/api/jobs/import", json=SNAPSHOT, headers=TENANT).json()
+        cancelled = client.post(f"/api/jobs/{submitted['id']}/cancel", headers=TENANT).json()
+        claimed = client.portal.call(run_next_job, mongo_server)
+
+    assert cancelled["status"] == "cancelled"
+    assert claimed is None
+    assert mongo_database.job_payloads.count_documents({"job_id": submitted["id"]}) == 0
+    assert mongo_database.tasks.count_documents({"tenant_id": "jobs-a"}) == 0
+
+def test_cancelling_a_running_job_stops_it_at_the_next_checkpoint(mongo_server, mongo_database):
+    with TestClient(mongo_server.app) as client:
+        submitted = client.post("/api/jobs/import", json=SNAPSHOT, headers=TENANT).json()
+        running = client.portal.call(mongo_server.claim_next_job)
+        requested = client.post(f"/api/jobs/{submitted['id']}/cancel", headers=TENANT).json()
+        client.portal.call(mongo_server.execute_job, running)
+        finished = job(client, submitted["id"])
+
+    assert requested["status"] == "running"
+    assert finished["status"] == "cancelled"
+    assert finished["progress"]["done"] == 0
+    assert mongo_database.tasks.count_documents({"tenant_id": "jobs-a"}) == 0
+
+def test_expired_lease_is_reclaimed_and_resumes_at_the_checkpoint(mongo_server, mongo_database, monkeypatch):
+    # One document per staged chunk: seq 0 is the category, seq 1 and 2 the tasks
+    monkeypatch.setattr(mongo_server, "IMPORT_BATCH_SIZE", 1)
+    original_insert_many = mongo_server.repository.insert_many
+    inserted = []
+
+    async def worker_dies_on_tasks(kind, documents, **kwargs):
+        if kind == "task":
+            raise RuntimeError("worker died")
+        return await original_insert_many(kind, documents, **kwargs)
+
+    async def recording(kind, documents, **kwargs):
+        inserted.extend(document["id"] for document in documents)
+        return await original_insert_many(kind, documents, **kwargs)
+
+    with TestClient(mongo_server.app) as client:
+        submitted = client.post("/api/jobs/import", json=SNAPSHOT, headers=TENANT).json()
+        first = client.portal.call(mongo_server.claim_next_job)
+        monkeypatch.setattr(mongo_server.repository, "insert_many", worker_dies_on_tasks)
+        # The handler itself, so the crash leaves the job running rather than failed
+        with pytest.raises(RuntimeError):
+            client.portal.call(mongo_server.run_import_job, first)
+
+        # Still leased to the dead worker
+        assert client.portal.call(mongo_server.claim_next_job) is None
+        mongo_database.jobs.update_one({"id": submitted["id"]}, {"$set": {"lease_until": datetime.utcnow() - timedelta(seconds=1)}})
+
+        monkeypatch.setattr(mongo_server.repository, "insert_many", recording)
+        resumed = client.portal.call(run_next_job, mongo_server)
+        finished = job(client, submitted["id"])
+
+    assert resumed["id"] == submitted["id"]
+    assert resumed["attempts"] == 2
+    # The category chunk was not imported a second time
+    assert inserted == ["t1", "t2"]
+    assert finished["status"] == "succeeded"
+    assert finished["progress"]["done"] == 3
+    assert mongo_database.categories.count_documents({"tenant_id": "jobs-a"}) == 1
+
+def test_job_fails_once_it_runs_out_of_attempts(mongo_server, mongo_database):
+    with TestClient(mongo_server.app) as client:
+        submitted = client.post("/api/jobs/import", json=SNAPSHOT, headers=TENANT).json()
+        # Every earlier worker died holding the lease
+        mongo_database.jobs.update_one({"id": submitted["id"]}, {"$set": {
+            "status": "running", "attempts": mongo_server.JOB_MAX_ATTEMPTS,
+            "lease_until": datetime.utcnow() - timedelta(seconds=1)
+        }})
+        client.portal.call(run_next_job, mongo_server)
+        finished = job(client, submitted["id"])
+        reclaimed = client.portal.call(run_next_job, mongo_server)
+
+    assert finished["status"] == "failed"
+    assert finished["error"] == f"Gave up after {mongo_server.JOB_MAX_ATTEMPTS} attempts"
+    assert reclaimed is None
+    assert mongo_database.job_payloads.count_documents({"job_id": submitted["id"]}) == 0
+    assert mongo_database.tasks.count_documents({"tenant_id": "jobs-a"}) == 0
@@ -0,0 +1,78 @@
+"""Multi-worker launcher: only slot 0 runs the deployment-wide background loops, and single-process
+engines never get a second worker"""
+import asyncio
+
+import pytest
+import uvicorn
+
+import launcher
+
+class RecordingContext:
+    def __init__(self):
+        self.started = []
+        self.events = []
+
+    def Process(self, target, args):
+        context = self
+        class Process:
+            pid = len(context.started)
+
+            def start(self):
+                context.started.append((target, args[2]))
+                context.events.append(("start", self.pid))
+
+            def terminate(self):
+                context.events.append(("stop", self.pid))
+
+            def join(self, timeout=None):
+                pass
+
+            def is_alive(self):
+                return False
+        return Process()
+
+@pytest.mark.parametrize("engine, expected", [("mongo", 4), ("memory", 1), ("sqlite", 1)])
+def test_single_process_engines_get_one_worker(monkeypatch, engine, expected):
+    monkeypatch.setenv("STORAGE_BACKEND", engine)
+    assert launcher.worker_count(4) == expected
+
+@pytest.mark.parametrize("overlap, expected", [
+    (True, [("start", 0), ("start", 1), ("stop", 0)]),
+    (False, [("start", 0), ("stop", 0), ("start", 1)]),
+])
+def test_rolling_reload_overlaps_only_when_allowed(tmp_path, monkeypatch, overlap, expected):
+    monkeypatch.setattr(launcher, "RELOAD_WARMUP_SECONDS", 0)
+    supervisor = launcher.Supervisor(uvicorn.Config("server:app", uds=str(tmp_path / "app.sock")), workers=1, overlap=overlap)
+    supervisor.context = RecordingContext()
+    supervisor.processes = [supervisor.spawn(0)]
+    supervisor.rolling_reload()
+    assert supervisor.context.events == expected
+    for sock in supervisor.sockets:
+        sock.close()
+
+def test_only_slot_zero_runs_background_loops(tmp_path):
+    config = uvicorn.Config("server:app", uds=str(tmp_path / "app.sock"))
+    supervisor = launcher.Supervisor(config, workers=3)
+    supervisor.context = RecordingContext()
+    for slot in range(3):
+        supervisor.spawn(slot)
+    # A replacement for the elected worker inherits the role
+    supervisor.spawn(0)
+    assert supervisor.context.started == [(launcher.run_worker, flag) for flag in (True, False, False, True)]
+    for sock in supervisor.sockets:
+        sock.close()
+
+def test_non_elected_workers_start_no_singleton_loops(memory_server, monkeypatch):
+    monkeypatch.setattr(memory_server, "RUN_BACKGROUND_LOOPS", False)
+    monkeypatch.setattr(memory_server, "ARCHIVE_AFTER_DAYS", 90)
+    monkeypatch.setattr(memory_server, "warm_up_imports", lambda: None)
+    async def scenario():
+        monkeypatch.setattr(memory_server.app.state, "ready", asyncio.Event(), raising=False)
+        monkeypatch.setattr(memory_server.app.state, "background_tasks", [], raising=False)
+        await memory_server.initialize_backend()
+        tasks = memory_server.app.state.background_tasks
+        for task in tasks:
+            task.cancel()
+        return [task.get_coro().__name__ for task in tasks]
+    started = asyncio.run(scenario())
+    assert "run_archiver" not in started and "run_snapshot_scheduler" not in started and "run_job_worker" not in started
@@ -0,0 +1,45 @@
+"""Buffered moves: the ETag a move returns must satisfy the next If-Match, before and after the flush"""
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+@pytest.fixture
+def client(memory_server, monkeypatch):
+    monkeypatch.setattr(memory_server.order_writes, "interval", 60)
+    monkeypatch.setattr(memory_server.order_writes, "pending", {})
+    client = TestClient(memory_server.app)
+    category = client.post("/api/categories", json={"name": "Work"}).json()
+    client.post("/api/tasks", json={"title": "A", "weight": 1, "category_id": category["id"]})
+    return client, category
+
+@pytest.mark.parametrize("flush", [False, True])
+def test_move_then_conditional_task_update(client, memory_server, flush):
+    client, category = client
+    task = client.get("/api/tasks").json()[0]
+    moved = client.put(f"/api/tasks/{task['id']}", json={"order": 5})
+    assert moved.status_code == 200 and moved.json()["order"] == 5
+    if flush:
+        asyncio.run(memory_server.order_writes.flush())
+    updated = client.put(f"/api/tasks/{task['id']}", json={"title": "B"}, headers={"If-Match": moved.headers["etag"]})
+    assert updated.status_code == 200
+    assert updated.json()["title"] == "B" and updated.json()["order"] == 5
+    assert updated.headers["etag"] != moved.headers["etag"]
+
+@pytest.mark.parametrize("flush", [False, True])
+def test_move_then_conditional_category_update(client, memory_server, flush):
+    client, category = client
+    moved = client.put(f"/api/categories/{category['id']}", json={"order": 3})
+    assert moved.status_code == 200
+    if flush:
+        asyncio.run(memory_server.order_writes.flush())
+    updated = client.put(f"/api/categories/{category['id']}", json={"name": "Home"}, headers={"If-Match": moved.headers["etag"]})
+    assert updated.status_code == 200
+    assert updated.json()["name"] == "Home" and updated.json()["order"] == 3
+
+def test_stale_etag_still_conflicts(client):
+    client, category = client
+    task = client.get("/api/tasks").json()[0]
+    moved = client.put(f"/api/tasks/{task['id']}", json={"order": 5})
+    assert client.put(f"/api/tasks/{task['id']}", json={"title": "B"}, headers={"If-Match": moved.headers["etag"]}).status_code == 200
+    assert client.put(f"/api/tasks/{task['id']}", json={"title": "C"}, headers={"If-Match": moved.headers["etag"]}).status_code == 409
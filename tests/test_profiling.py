@@ -0,0 +1,23 @@
+"""The request sampler attributes both running code and awaits to the profiled task"""
+import asyncio
+import time
+
+from profiling import TaskSampler
+
+async def spin(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        sorted(range(100))
+
+async def handler():
+    await asyncio.sleep(0.05)
+    await spin(0.05)
+
+def test_sampler_reports_running_and_waiting_stacks():
+    async def main():
+        with TaskSampler(asyncio.current_task(), interval=0.001) as sampler:
+            await handler()
+        return sampler.folded().splitlines()
+    stacks = [line.rsplit(" ", 1)[0] for line in asyncio.run(main())]
+    assert any("handler" in stack and stack.endswith("[waiting]") for stack in stacks)
+    assert any("handler" in stack and "spin" in stack for stack in stacks)
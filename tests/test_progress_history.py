@@ -0,0 +1,76 @@
+"""Progress snapshots and /api/progress/history; MongoDB-only, so these run with TEST_MONGO_URL"""
+from datetime import datetime
+
+from fastapi.testclient import TestClient
+
+TENANT = {"X-Tenant-ID": "history-a"}
+OTHER_TENANT = {"X-Tenant-ID": "history-b"}
+
+def snapshot(tenant_id, key, taken_at, completed_weight, total_weight=10, scope="category"):
+    return {
+        "tenant_id": tenant_id, "scope": scope, "key": key, "name": key.title(), "taken_at": taken_at,
+        "completed_weight": completed_weight, "total_weight": total_weight,
+        "task_count": total_weight, "completed_task_count": completed_weight
+    }
+
+def history(client, headers=TENANT, **params):
+    response = client.get("/api/progress/history", params=params, headers=headers)
+    assert response.status_code == 200
+    return response.json()
+
+def test_snapshot_captures_categories_and_groups_per_tenant(mongo_server, mongo_database):
+    with TestClient(mongo_server.app) as client:
+        work = client.post("/api/categories", json={"name": "Work", "group": "office"}, headers=TENANT).json()
+        email = client.post("/api/categories", json={"name": "Email", "group": "office"}, headers=TENANT).json()
+        report = client.post("/api/tasks", json={"title": "Report", "weight": 3, "category_id": work["id"]}, headers=TENANT).json()
+        client.post("/api/tasks", json={"title": "Slides", "weight": 1, "category_id": work["id"]}, headers=TENANT)
+        client.post("/api/tasks", json={"title": "Inbox zero", "weight": 2, "category_id": email["id"]}, headers=TENANT)
+        client.put(f"/api/tasks/{report['id']}", json={"completed": True}, headers=TENANT)
+        other = client.post("/api/categories", json={"name": "Home", "group": "office"}, headers=OTHER_TENANT).json()
+        client.post("/api/tasks", json={"title": "Dishes", "weight": 5, "category_id": other["id"]}, headers=OTHER_TENANT)
+
+        assert client.portal.call(mongo_server.take_progress_snapshot) == 5
+        categories = history(client)
+        groups = history(client, scope="group")
+        other_groups = history(client, OTHER_TENANT, scope="group")
+
+    assert mongo_database.progress_snapshots.count_documents({"tenant_id": "history-a"}) == 3
+    by_key = {point["key"]: point for point in categories}
+    assert set(by_key) == {work["id"], email["id"]}
+    assert (by_key[work["id"]]["completed_weight"], by_key[work["id"]]["total_weight"]) == (3, 4)
+    assert by_key[work["id"]]["progress_percentage"] == 75.0
+    assert (by_key[email["id"]]["completed_weight"], by_key[email["id"]]["task_count"]) == (0, 1)
+
+    # Both tenants use the "office" group; each sees only its own rollup
+    assert [(point["key"], point["completed_weight"], point["total_weight"]) for point in groups] == [("office", 3, 6)]
+    assert [(point["key"], point["completed_weight"], point["total_weight"]) for point in other_groups] == [("office", 0, 5)]
+
+def test_history_filters_by_range_scope_and_key(mongo_server, mongo_database):
+    mongo_database.progress_snapshots.insert_many([
+        snapshot("history-a", "work", datetime(2026, 3, 1, 9), 1),
+        snapshot("history-a", "work", datetime(2026, 3, 1, 15), 2),
+        snapshot("history-a", "work", datetime(2026, 3, 2, 9), 4),
+        snapshot("history-a", "work", datetime(2026, 3, 5, 9), 8),
+        snapshot("history-a", "home", datetime(2026, 3, 2, 9), 5),
+        snapshot("history-a", "office", datetime(2026, 3, 2, 9), 6, scope="group"),
+        snapshot("history-b", "work", datetime(2026, 3, 2, 9), 9),
+    ])
+    window = {"start": "2026-03-01T00:00:00", "end": "2026-03-03T00:00:00"}
+
+    with TestClient(mongo_server.app) as client:
+        daily = history(client, **window)
+        hourly = history(client, key="work", bucket="hour", **window)
+        groups = history(client, scope="group", **window)
+        other = history(client, OTHER_TENANT, **window)
+        backwards = client.get("/api/progress/history", params={"start": window["end"], "end": window["start"]}, headers=TENANT)
+
+    # Each day keeps its latest snapshot; March 5th is outside the window
+    assert [(point["key"], point["bucket"][:10], point["completed_weight"]) for point in daily] == [
+        ("home", "2026-03-02", 5),
+        ("work", "2026-03-01", 2),
+        ("work", "2026-03-02", 4),
+    ]
+    assert [point["completed_weight"] for point in hourly] == [1, 2, 4]
+    assert [(point["scope"], point["key"]) for point in groups] == [("group", "office")]
+    assert [(point["key"], point["completed_weight"]) for point in other] == [("work", 9)]
+    assert backwards.status_code == 400
@@ -0,0 +1,80 @@
+"""Token-bucket admission: bucket arithmetic, route classes, who shares a bucket, and what a throttled client is told"""
+import asyncio
+
+import jwt
+import pytest
+from fastapi.testclient import TestClient
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+import server
+
+SECRET = "test-secret"
+
+def build_client(monkeypatch, limits):
+    for limit_class, limit in limits.items():
+        monkeypatch.setitem(server.RATE_LIMITS, limit_class, limit)
+    async def ok(request):
+        return PlainTextResponse("ok")
+    routes = [Route("/api/items", ok, methods=["GET", "POST"]), Route("/api/export", ok), Route("/health", ok)]
+    middleware = server.RateLimitMiddleware(Starlette(routes=routes), backend=server.InMemoryRateLimitBackend())
+    return TestClient(middleware), middleware
+
+def test_bucket_grants_the_burst_then_reports_the_wait():
+    backend = server.InMemoryRateLimitBackend()
+    async def take_all():
+        return [await backend.take("k", 2.0, 3) for _ in range(4)]
+    granted = asyncio.run(take_all())
+    assert granted[:3] == [0.0, 0.0, 0.0]
+    assert 0 < granted[3] <= 0.5
+
+def test_least_recently_used_buckets_are_evicted():
+    backend = server.InMemoryRateLimitBackend(max_keys=2)
+    async def take(*keys):
+        for key in keys:
+            await backend.take(key, 1.0, 1)
+    asyncio.run(take("a", "b", "a", "c"))
+    assert list(backend.buckets) == ["a", "c"]
+
+def test_route_classes():
+    assert server.route_class("GET", "/api/export") == "heavy"
+    assert server.route_class("DELETE", "/api/tasks/x") == "write"
+    assert server.route_class("GET", "/api/tasks") == "read"
+    assert server.route_class("POST", "/api/progress/batch") == "read"
+
+def test_throttled_responses_carry_retry_after(monkeypatch):
+    client, _ = build_client(monkeypatch, {"write": (0.001, 2)})
+    assert [client.post("/api/items").status_code for _ in range(3)] == [200, 200, 429]
+    response = client.post("/api/items")
+    assert response.status_code == 429 and int(response.headers["retry-after"]) >= 1
+    # Classes have separate buckets, and non-API paths are never limited
+    assert client.get("/api/items").status_code == 200
+    assert client.get("/health").status_code == 200
+
+def test_heavy_operations_are_capped_while_in_flight(monkeypatch):
+    client, middleware = build_client(monkeypatch, {"heavy": (100, 100)})
+    middleware.inflight_heavy = server.MAX_INFLIGHT_HEAVY
+    response = client.get("/api/export")
+    assert response.status_code == 429 and response.json()["detail"] == "Too many heavy operations in progress"
+    middleware.inflight_heavy = 0
+    assert client.get("/api/export").status_code == 200
+    assert middleware.inflight_heavy == 0
+
+@pytest.fixture
+def limited(memory_server, monkeypatch):
+    monkeypatch.setitem(memory_server.RATE_LIMITS, "read", (0.001, 2))
+    app = memory_server.RateLimitMiddleware(memory_server.app, backend=memory_server.InMemoryRateLimitBackend())
+    return TestClient(app)
+
+def test_rotating_the_tenant_header_does_not_refill_the_bucket(limited):
+    statuses = [limited.get("/api/categories", headers={"X-Tenant-ID": f"t{n}"}).status_code for n in range(3)]
+    assert statuses == [200, 200, 429]
+
+def test_verified_tenants_get_their_own_buckets(limited, memory_server, monkeypatch):
+    monkeypatch.setattr(memory_server, "JWT_SECRET", SECRET)
+    def get(tenant_id):
+        token = jwt.encode({"tenant_id": tenant_id}, SECRET, algorithm="HS256")
+        return limited.get("/api/categories", headers={"Authorization": f"Bearer {token}"}).status_code
+    assert [get("alice"), get("alice"), get("alice")] == [200, 200, 429]
+    assert get("bob") == 200
@@ -0,0 +1,48 @@
+"""Per-route read preference; the replica-set test runs with TEST_MONGO_REPLICA_SET_URL (e.g. a local three-node rs0)"""
+import asyncio
+import os
+import uuid
+
+import pytest
+
+import server
+
+TEST_MONGO_REPLICA_SET_URL = os.environ.get("TEST_MONGO_REPLICA_SET_URL")
+
+def test_routed_paths_exist_and_have_profiles():
+    paths = {route.path for route in server.app.routes}
+    for path, profile in server.ROUTE_READ_PROFILES.items():
+        assert path in paths
+        assert profile in server.READ_PROFILES
+
+def test_profiles_build_read_options():
+    for profile in server.READ_PROFILES.values():
+        options = server.read_options(profile)
+        assert options["read_preference"].mongos_mode == profile["mode"]
+        assert options["read_concern"].level == profile["read_concern"]
+
+@pytest.mark.skipif(not TEST_MONGO_REPLICA_SET_URL, reason="TEST_MONGO_REPLICA_SET_URL not set")
+def test_dashboard_reads_go_to_a_secondary():
+    from pymongo.write_concern import WriteConcern
+
+    async def main():
+        database = server.LazyDatabase(TEST_MONGO_REPLICA_SET_URL, f"routing_{uuid.uuid4().hex[:8]}", profiles=server.READ_PROFILES)
+        client = database.resolve().client
+        try:
+            # Acknowledged by every member, so the secondary read below sees it
+            members = len((await client.admin.command("replSetGetStatus"))["members"])
+            await database.resolve().get_collection("categories", write_concern=WriteConcern(w=members)).insert_one({"id": "a"})
+
+            server.read_profile.set("dashboard")
+            cursor = database.categories.find({})
+            assert [document["id"] for document in await cursor.to_list(length=None)] == ["a"]
+            assert cursor.address in client.secondaries
+
+            server.read_profile.set(None)
+            cursor = database.categories.find({})
+            await cursor.to_list(length=None)
+            assert cursor.address == client.primary
+        finally:
+            await client.drop_database(database.name)
+            client.close()
+    asyncio.run(main())
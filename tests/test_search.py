@@ -0,0 +1,92 @@
+"""Ranked search and prefix autocomplete; MongoDB-only, so these run with TEST_MONGO_URL"""
+from fastapi.testclient import TestClient
+
+TENANT = {"X-Tenant-ID": "search-a"}
+OTHER_TENANT = {"X-Tenant-ID": "search-b"}
+
+def seed(client):
+    """Five hits for "budget" with distinct text scores, split across tasks and categories"""
+    budget = client.post("/api/categories", json={"name": "Budget"}, headers=TENANT).json()
+    meetings = client.post("/api/categories", json={"name": "Budget review meeting"}, headers=TENANT).json()
+    for title in ("Budget review", "Budget review meeting notes", "Budget review meeting notes draft"):
+        client.post("/api/tasks", json={"title": title, "weight": 1, "category_id": budget["id"]}, headers=TENANT)
+    client.post("/api/tasks", json={"title": "Groceries", "weight": 1, "category_id": meetings["id"]}, headers=TENANT)
+
+    other = client.post("/api/categories", json={"name": "Budget"}, headers=OTHER_TENANT).json()
+    client.post("/api/tasks", json={"title": "Budget", "weight": 1, "category_id": other["id"]}, headers=OTHER_TENANT)
+
+def test_search_ranks_tasks_and_categories_together(mongo_server):
+    with TestClient(mongo_server.app) as client:
+        seed(client)
+        body = client.get("/api/search", params={"q": "budget"}, headers=TENANT).json()
+
+    assert body["total"] == 5
+    scores = [hit["score"] for hit in body["results"]]
+    assert scores == sorted(scores, reverse=True)
+    # Fewer other words in the text ranks higher
+    assert [(hit["type"], hit["text"]) for hit in body["results"]] == [
+        ("category", "Budget"),
+        ("task", "Budget review"),
+        ("category", "Budget review meeting"),
+        ("task", "Budget review meeting notes"),
+        ("task", "Budget review meeting notes draft"),
+    ]
+
+def test_search_pages_through_the_merged_ranking(mongo_server):
+    with TestClient(mongo_server.app) as client:
+        seed(client)
+        everything = client.get("/api/search", params={"q": "budget"}, headers=TENANT).json()["results"]
+        pages = [
+            client.get("/api/search", params={"q": "budget", "skip": skip, "limit": 2}, headers=TENANT).json()
+            for skip in (0, 2, 4)
+        ]
+
+    assert [len(page["results"]) for page in pages] == [2, 2, 1]
+    assert all(page["total"] == 5 for page in pages)
+    assert [hit["id"] for page in pages for hit in page["results"]] == [hit["id"] for hit in everything]
+
+def test_search_filters_by_type_and_stays_within_the_tenant(mongo_server):
+    with TestClient(mongo_server.app) as client:
+        seed(client)
+        tasks = client.get("/api/search", params={"q": "budget", "type": "task"}, headers=TENANT).json()
+        other = client.get("/api/search", params={"q": "budget"}, headers=OTHER_TENANT).json()
+
+    assert tasks["total"] == 3
+    assert {hit["type"] for hit in tasks["results"]} == {"task"}
+    assert other["total"] == 2
+    assert [hit["text"] for hit in other["results"]] == ["Budget", "Budget"]
+
+def test_autocomplete_matches_case_insensitive_prefixes(mongo_server):
+    with TestClient(mongo_server.app) as client:
+        seed(client)
+        suggestions = client.get("/api/search/autocomplete", params={"q": "BUDGET R"}, headers=TENANT).json()
+        inner = client.get("/api/search/autocomplete", params={"q": "review"}, headers=TENANT).json()
+        limited = client.get("/api/search/autocomplete", params={"q": "bud", "limit": 3}, headers=TENANT).json()
+        other = client.get("/api/search/autocomplete", params={"q": "bud"}, headers=OTHER_TENANT).json()
+
+    # Categories come first, each list in key order
+    assert [(hit["type"], hit["text"]) for hit in suggestions] == [
+        ("category", "Budget review meeting"),
+        ("task", "Budget review"),
+        ("task", "Budget review meeting notes"),
+        ("task", "Budget review meeting notes draft"),
+    ]
+    assert inner == []
+    assert [hit["text"] for hit in limited] == ["Budget", "Budget review meeting", "Budget review"]
+    assert len(other) == 2
+
+def test_startup_backfills_search_keys_beyond_ascii(mongo_server, mongo_database):
+    # Written before title_key/name_key existed
+    mongo_database.categories.insert_one({"tenant_id": "search-a", "id": "legacy-category", "name": "Über", "group": "default", "order": 0})
+    mongo_database.tasks.insert_one({
+        "tenant_id": "search-a", "id": "legacy-task", "title": "Ärger klären", "weight": 1,
+        "category_id": "legacy-category", "completed": False
+    })
+
+    with TestClient(mongo_server.app) as client:
+        tasks = client.get("/api/search/autocomplete", params={"q": "ÄRG"}, headers=TENANT).json()
+        categories = client.get("/api/search/autocomplete", params={"q": "üb"}, headers=TENANT).json()
+
+    assert mongo_database.tasks.find_one({"id": "legacy-task"})["title_key"] == "ärger klären"
+    assert [hit["id"] for hit in tasks] == ["legacy-task"]
+    assert [hit["id"] for hit in categories] == ["legacy-category"]
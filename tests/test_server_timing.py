@@ -0,0 +1,18 @@
+"""Server-Timing phases: measured around the endpoint, plus what handlers and storage report"""
+from fastapi.testclient import TestClient
+
+import server
+
+def test_header_lists_reported_phases():
+    timings = server.RequestTimings()
+    timings.endpoint_started = timings.started + 0.002
+    timings.endpoint_finished = timings.started + 0.010
+    timings.add("compute", 0.003)
+    timings.queries += [0.001, 0.0015]
+    header = timings.header(timings.started + 0.012)
+    assert header == 'db;dur=2.5;desc="2 queries", validate;dur=2.0, compute;dur=3.0, serialize;dur=2.0, total;dur=12.0'
+
+def test_responses_carry_server_timing():
+    response = TestClient(server.app).get("/")
+    phases = [entry.split(";")[0] for entry in response.headers["server-timing"].split(", ")]
+    assert phases == ["validate", "serialize", "total"]
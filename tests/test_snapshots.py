@@ -0,0 +1,58 @@
+"""Streamed msgpack snapshots: records survive encoding in any chunking, and imports keep timestamps naive UTC"""
+import asyncio
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+
+RECORDS = [
+    ["header", {"version": 1, "exported_at": datetime(2024, 5, 1, 12, 30)}],
+    ["category", {"id": "c1", "name": "Work", "group": "default", "order": 0, "created_at": datetime(2024, 1, 1)}],
+    ["task", {"id": "t1", "title": "Ärger", "weight": 2.5, "category_id": "c1", "completed": False, "order": 0}],
+]
+
+@pytest.mark.parametrize("encoding", server.snapshot_encodings())
+@pytest.mark.parametrize("chunk_size", [1, 7, 1 << 20])
+def test_records_round_trip(encoding, chunk_size):
+    encoder = server.SnapshotEncoder(encoding)
+    stream = b"".join(encoder.encode(kind, document) for kind, document in RECORDS) + encoder.finish()
+
+    decoder = server.SnapshotDecoder(encoding)
+    decoded = [record for start in range(0, len(stream), chunk_size) for record in decoder.feed(stream[start:start + chunk_size])]
+    assert [kind for kind, _ in decoded] == ["header", "category", "task"]
+    assert decoded[2][1] == RECORDS[2][1]
+    # Datetimes travel as msgpack timestamps and come back as the same UTC instant
+    assert decoded[0][1]["exported_at"].replace(tzinfo=None) == RECORDS[0][1]["exported_at"]
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+    ("gzip, deflate", "gzip"),
+    ("br", "identity"),
+    ("", "identity"),
+])
+def test_negotiation_falls_back_to_identity(accept_encoding, expected):
+    assert server.negotiate_encoding(accept_encoding) == expected
+
+def test_zstd_is_preferred_when_available():
+    expected = "zstd" if "zstd" in server.snapshot_encodings() else "gzip"
+    assert server.negotiate_encoding("gzip, zstd") == expected
+
+def test_msgpack_round_trip_feeds_the_heatmap(memory_server):
+    client = TestClient(memory_server.app)
+    category = client.post("/api/categories", json={"name": "Work"}).json()
+    task = client.post("/api/tasks", json={"title": "A", "weight": 3, "category_id": category["id"]}).json()
+    client.put(f"/api/tasks/{task['id']}", json={"completed": True})
+
+    msgpack = memory_server.MSGPACK_MEDIA_TYPE
+    snapshot = client.get("/api/export", headers={"Accept": msgpack, "Accept-Encoding": "identity"}).content
+    response = client.post("/api/import", content=snapshot, headers={"Content-Type": msgpack})
+    assert response.status_code == 200, response.text
+
+    stored = asyncio.run(memory_server.repository.get_task("default", task["id"]))
+    assert all(value.tzinfo is None for value in stored.values() if isinstance(value, datetime))
+
+    today = datetime.utcnow().date().isoformat()
+    heatmap = client.get("/api/activity/heatmap", params={"start": today, "end": today})
+    assert heatmap.status_code == 200
+    assert heatmap.json()["days"] == [{"day": today, "completed_weight": 3, "completed_count": 1}]
@@ -0,0 +1,13 @@
+"""Cold-start guard: importing the app loads none of the heavy dependencies; absolute timings are
+reported by backend_benchmark.py rather than asserted here"""
+import subprocess
+import sys
+
+from backend_benchmark import BACKEND_DIR
+
+DEFERRED_MODULES = ["motor", "motor.motor_asyncio", "pymongo.mongo_client", "bson.binary", "jwt", "msgpack", "zstandard", "numpy", "pandas"]
+
+def test_import_defers_heavy_dependencies():
+    code = f"import sys, server; print(sorted(m for m in {DEFERRED_MODULES!r} if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "[]"
@@ -0,0 +1,400 @@
+"""Behaviour every storage engine must share; run against memory, SQLite and (with TEST_MONGO_URL) MongoDB"""
+import asyncio
+import os
+import uuid
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from storage import MongoRepository, VersionConflict, create_repository
+
+TEST_MONGO_URL = os.environ.get("TEST_MONGO_URL")
+
+@pytest.fixture(params=["memory", "sqlite", "mongo"])
+def engine(request, tmp_path):
+    if request.param == "mongo":
+        if not TEST_MONGO_URL:
+            pytest.skip("TEST_MONGO_URL not set")
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        def build():
+            return MongoRepository(AsyncIOMotorClient(TEST_MONGO_URL)[f"contract_{uuid.uuid4().hex[:8]}"])
+    else:
+        def build():
+            return create_repository(request.param, sqlite_path=str(tmp_path / "contract.db"))
+    return build
+
+def run(build, scenario):
+    """Run an async scenario against a freshly initialized repository"""
+    async def main():
+        repository = build()
+        await repository.initialize()
+        try:
+            await scenario(repository)
+        finally:
+            if isinstance(repository, MongoRepository):
+                await repository.db.client.drop_database(repository.db.name)
+            await repository.close()
+    asyncio.run(main())
+
+def category(tenant_id, name, order, group="default", **fields):
+    return {"tenant_id": tenant_id, "id": str(uuid.uuid4()), "name": name, "group": group,
+            "order": order, "created_at": datetime(2024, 1, 1), **fields}
+
+def task(tenant_id, category_id, order, weight=1, completed=False, **fields):
+    return {"tenant_id": tenant_id, "id": str(uuid.uuid4()), "title": f"Task {order}", "weight": weight,
+            "category_id": category_id, "priority": "medium", "completed": completed, "pinned": False,
+            "order": order, "created_at": datetime(2024, 1, 1), **fields}
+
+def test_category_crud_and_ordering(engine):
+    async def scenario(repository):
+        assert await repository.next_order("category", "t1") == 0
+        second = category("t1", "B", 1)
+        first = category("t1", "A", 0)
+        await repository.insert_category(second)
+        await repository.insert_category(first)
+        await repository.insert_category(category("t2", "A", 0))
+
+        assert [c["name"] for c in await repository.list_categories("t1")] == ["A", "B"]
+        assert await repository.next_order("category", "t1") == 2
+        assert (await repository.get_category("t1", first["id"]))["created_at"] == datetime(2024, 1, 1)
+        assert await repository.get_category("t2", first["id"]) is None
+        found = await repository.get_categories("t1", [second["id"], "missing", first["id"]])
+        assert {category_id: c["name"] for category_id, c in found.items()} == {first["id"]: "A", second["id"]: "B"}
+        assert await repository.get_categories("t1", []) == {}
+
+        assert (await repository.find_category_by_name("t1", "A", "default"))["id"] == first["id"]
+        assert await repository.find_category_by_name("t1", "A", "default", exclude_id=first["id"]) is None
+        assert await repository.find_category_by_name("t1", "A", "work") is None
+
+        updated = await repository.update_category("t1", first["id"], {"name": "C", "order": 5})
+        assert updated["name"] == "C" and updated["group"] == "default"
+        assert await repository.find_category_by_name("t1", "A", "default") is None
+        assert [c["name"] for c in await repository.list_categories("t1")] == ["B", "C"]
+        assert await repository.update_category("t1", "missing", {"name": "X"}) is None
+
+        assert await repository.delete_category("t1", first["id"])
+        assert not await repository.delete_category("t1", first["id"])
+        assert len(await repository.list_categories("t2")) == 1
+    run(engine, scenario)
+
+def test_tasks_and_progress_rollups(engine):
+    async def scenario(repository):
+        work, home = category("t1", "Work", 0), category("t1", "Home", 1)
+        await repository.insert_many("category", [work, home])
+        tasks = [
+            task("t1", work["id"], 0, weight=3, completed=True),
+            task("t1", work["id"], 1, weight=5),
+            task("t1", home["id"], 0, weight=2),
+        ]
+        for document in tasks:
+            await repository.insert_task(document)
+
+        assert await repository.next_order("task", "t1", work["id"]) == 2
+        assert [t["id"] for t in await repository.list_tasks("t1", work["id"])] == [tasks[0]["id"], tasks[1]["id"]]
+        assert len(await repository.list_tasks("t1")) == 3
+
+        rollups = await repository.progress_rollups("t1")
+        assert rollups[work["id"]] == {"completed_weight": 3, "total_weight": 8, "task_count": 2, "completed_task_count": 1}
+        assert set(await repository.progress_rollups("t1", [home["id"]])) == {home["id"]}
+
+        await repository.update_task("t1", tasks[1]["id"], {"completed": True, "weight": 1})
+        assert (await repository.progress_rollups("t1"))[work["id"]]["completed_weight"] == 4
+
+        await repository.delete_task("t1", tasks[0]["id"])
+        assert (await repository.progress_rollups("t1"))[work["id"]]["task_count"] == 1
+
+        assert await repository.delete_category_tasks("t1", home["id"]) == [tasks[2]["id"]]
+        assert home["id"] not in await repository.progress_rollups("t1")
+        assert await repository.progress_rollups("t2") == {}
+    run(engine, scenario)
+
+def test_list_field_selection(engine):
+    async def scenario(repository):
+        work = category("t1", "Work", 0)
+        await repository.insert_category(work)
+        await repository.insert_task(task("t1", work["id"], 0, weight=4))
+
+        assert await repository.list_categories("t1", fields=["id", "name"]) == [{"id": work["id"], "name": "Work"}]
+        tasks = await repository.list_tasks("t1", work["id"], fields=["title", "completed", "missing"])
+        assert tasks == [{"title": "Task 0", "completed": False}]
+    run(engine, scenario)
+
+def test_bulk_operations(engine):
+    async def scenario(repository):
+        categories = [category("t1", f"C{i}", i) for i in range(5)]
+        await repository.insert_many("category", categories)
+        await repository.insert_many("category", categories[:2] + [category("t1", "C5", 5)], ignore_duplicates=True)
+
+        exported = [doc async for doc in repository.iter_documents("category", "t1", exclude=("tenant_id",))]
+        assert [doc["name"] for doc in exported] == [f"C{i}" for i in range(6)]
+        assert all("tenant_id" not in doc for doc in exported)
+
+        assert await repository.delete_batch("category", "t1", 4) == 4
+        assert await repository.delete_batch("category", "t1", 4) == 2
+        assert await repository.delete_batch("category", "t1", 4) == 0
+
+        await repository.insert_category(category("t1", "X", 0))
+        await repository.clear_tenant("t1")
+        assert await repository.list_categories("t1") == []
+    run(engine, scenario)
+
+def test_set_orders(engine):
+    async def scenario(repository):
+        parent = category("t1", "P", 0)
+        await repository.insert_category(parent)
+        tasks = [task("t1", parent["id"], i, version=1) for i in range(3)]
+        await repository.insert_many("task", tasks)
+
+        moved = {tasks[2]["id"]: 0, tasks[0]["id"]: 1, tasks[1]["id"]: 2, "missing": 3}
+        assert await repository.set_orders("task", "t1", moved, datetime(2030, 1, 1), 10) == 3
+        listed = await repository.list_tasks("t1", parent["id"])
+        assert [document["id"] for document in listed] == [tasks[2]["id"], tasks[0]["id"], tasks[1]["id"]]
+        assert [document["revision"] for document in listed] == [10, 11, 12]
+        assert {document["version"] for document in listed} == {2}
+        assert await repository.set_orders("category", "t2", {parent["id"]: 5}, datetime(2030, 1, 1), 1) == 0
+        # Write-behind flushes keep the version so ETags from buffered moves stay valid
+        assert await repository.set_orders("task", "t1", {tasks[0]["id"]: 7}, datetime(2030, 1, 1), 13, bump_version=False) == 1
+        assert (await repository.get_task("t1", tasks[0]["id"]))["version"] == 2
+    run(engine, scenario)
+
+def test_sync_bookkeeping(engine):
+    async def scenario(repository):
+        assert await repository.revision_state("t1") == (0, 0)
+        async with repository.reserve_revisions("t1") as revision:
+            first = category("t1", "A", 0, revision=revision)
+            await repository.insert_category(first)
+        assert await repository.next_revision("t1", 3) == 4
+        await repository.release_revisions("t1", 4, 3)
+
+        await repository.record_tombstones("t1", "task", ["gone-1", "gone-2"])
+        categories, tasks, deleted = await repository.changes_since("t1", 0)
+        assert [c["id"] for c in categories] == [first["id"]] and tasks == []
+        assert [(d["id"], d["revision"]) for d in deleted] == [("gone-1", 5), ("gone-2", 6)]
+
+        _, _, deleted = await repository.changes_since("t1", 5)
+        assert [d["id"] for d in deleted] == ["gone-2"]
+        assert (await repository.find_tombstone("t1", "task", "gone-1"))["revision"] == 5
+        await repository.delete_tombstone("t1", "task", "gone-1")
+        assert await repository.find_tombstone("t1", "task", "gone-1") is None
+
+        revision = await repository.reset_sync_history("t1")
+        assert await repository.revision_state("t1") == (revision, revision)
+        assert (await repository.changes_since("t1", 0))[2] == []
+        assert await repository.revision_state("t2") == (0, 0)
+    run(engine, scenario)
+
+def test_last_writer_wins(engine):
+    async def scenario(repository):
+        now = datetime(2024, 6, 1, 12, 0, 0)
+        document = category("t1", "A", 0, updated_at=now)
+        await repository.insert_category(document)
+
+        assert not await repository.upsert_if_newer("category", {**document, "name": "Old"}, now - timedelta(seconds=1))
+        assert not await repository.upsert_if_newer("category", {**document, "name": "Same"}, now)
+        later = now + timedelta(milliseconds=1)
+        assert await repository.upsert_if_newer("category", {**document, "name": "New", "updated_at": later}, later)
+        assert (await repository.get_category("t1", document["id"]))["name"] == "New"
+
+        fresh = category("t1", "Fresh", 1, updated_at=now)
+        assert await repository.upsert_if_newer("category", fresh, now)
+        assert await repository.get_category("t1", fresh["id"]) is not None
+
+        assert not await repository.delete_if_newer("category", "t1", document["id"], now)
+        assert await repository.delete_if_newer("category", "t1", document["id"], later + timedelta(seconds=1))
+        assert not await repository.delete_if_newer("category", "t1", document["id"], later + timedelta(seconds=1))
+    run(engine, scenario)
+
+def test_due_date_queries(engine):
+    async def scenario(repository):
+        work, home = category("t1", "Work", 0), category("t1", "Home", 1)
+        await repository.insert_many("category", [work, home])
+        day = datetime(2024, 6, 1)
+        late = task("t1", work["id"], 0, due_at=day - timedelta(days=2))
+        soon = task("t1", home["id"], 0, due_at=day + timedelta(hours=3))
+        later = task("t1", work["id"], 1, due_at=day + timedelta(days=3))
+        for document in [later, soon, late, task("t1", work["id"], 2), task("t1", work["id"], 3, completed=True, due_at=day),
+                         task("t2", work["id"], 0, due_at=day)]:
+            await repository.insert_task(document)
+
+        def ids(tasks):
+            return [t["id"] for t in tasks]
+
+        assert ids(await repository.list_due_tasks("t1", before=day)) == [late["id"]]
+        assert ids(await repository.list_due_tasks("t1", after=day, before=day + timedelta(days=7))) == [soon["id"], later["id"]]
+        assert ids(await repository.list_due_tasks("t1", after=day, category_id=work["id"])) == [later["id"]]
+        assert ids(await repository.list_due_tasks("t1", limit=2)) == [late["id"], soon["id"]]
+
+        await repository.update_task("t1", late["id"], {"completed": True})
+        await repository.update_task("t1", soon["id"], {"due_at": None})
+        await repository.update_task("t1", later["id"], {"due_at": day - timedelta(days=1)})
+        assert ids(await repository.list_due_tasks("t1")) == [later["id"]]
+    run(engine, scenario)
+
+def test_archiving_keeps_progress(engine):
+    async def scenario(repository):
+        work, home = category("t1", "Work", 0), category("t1", "Home", 1)
+        await repository.insert_many("category", [work, home])
+        old, recent = datetime(2024, 1, 1), datetime(2024, 6, 1)
+        done = task("t1", work["id"], 0, weight=3, completed=True, updated_at=old)
+        other = task("t2", work["id"], 0, weight=2, completed=True, updated_at=old)
+        for document in [done, other, task("t1", work["id"], 1, weight=5, completed=True, updated_at=recent),
+                         task("t1", work["id"], 2, weight=1, updated_at=old), task("t1", home["id"], 0, weight=4, completed=True)]:
+            await repository.insert_task(document)
+        before = await repository.progress_rollups("t1")
+
+        assert await repository.archive_completed_tasks(datetime(2024, 3, 1), limit=1) == 1
+        assert await repository.archive_completed_tasks(datetime(2024, 3, 1), limit=10) == 1
+        assert await repository.archive_completed_tasks(datetime(2024, 3, 1), limit=10) == 0
+        assert await repository.progress_rollups("t1") == before
+        assert await repository.progress_rollups("t1", [work["id"]]) == {work["id"]: before[work["id"]]}
+        assert done["id"] not in [t["id"] for t in await repository.list_tasks("t1")]
+        archived = await repository.list_archived_tasks("t1", work["id"])
+        assert [t["id"] for t in archived] == [done["id"]] and archived[0]["archived_at"]
+        assert [t["id"] async for t in repository.iter_archived_tasks("t2")] == [other["id"]]
+
+        restored = await repository.restore_archived_task("t1", done["id"])
+        assert restored["id"] == done["id"] and "archived_at" not in restored
+        assert await repository.restore_archived_task("t1", done["id"]) is None
+        assert await repository.list_archived_tasks("t1") == []
+        assert await repository.progress_rollups("t1") == before
+
+        await repository.archive_completed_tasks(datetime(2024, 3, 1), limit=10)
+        expected = [t["id"] for t in await repository.list_tasks("t1", work["id"])] + [done["id"]]
+        assert sorted(await repository.delete_category_tasks("t1", work["id"])) == sorted(expected)
+        assert work["id"] not in await repository.progress_rollups("t1")
+
+        assert await repository.delete_batch("task", "t2", 10) == 1
+        assert await repository.progress_rollups("t2") == {}
+    run(engine, scenario)
+
+def test_versioned_updates(engine):
+    async def scenario(repository):
+        legacy = category("t1", "Legacy", 0)
+        await repository.insert_category(legacy)
+        assert (await repository.update_category("t1", legacy["id"], {"name": "L2"}, expected_version=0))["version"] == 1
+
+        document = task("t1", legacy["id"], 0, version=1)
+        await repository.insert_task(document)
+        assert (await repository.update_task("t1", document["id"], {"title": "A"}, expected_version=1))["version"] == 2
+        assert (await repository.update_task("t1", document["id"], {"title": "B"}))["version"] == 3
+        with pytest.raises(VersionConflict) as conflict:
+            await repository.update_task("t1", document["id"], {"title": "stale"}, expected_version=2)
+        assert conflict.value.current_version == 3
+        assert (await repository.get_task("t1", document["id"]))["title"] == "B"
+        assert (await repository.update_task("t1", document["id"], {}, expected_version=3))["title"] == "B"
+        assert await repository.update_task("t1", "missing", {"title": "X"}, expected_version=1) is None
+
+        later = datetime(2030, 1, 1)
+        assert await repository.upsert_if_newer("task", {**document, "title": "Synced", "version": 0}, later)
+        assert (await repository.get_task("t1", document["id"]))["version"] == 4
+        fresh = task("t1", legacy["id"], 1)
+        assert await repository.upsert_if_newer("task", fresh, later)
+        assert (await repository.get_task("t1", fresh["id"]))["version"] == 1
+    run(engine, scenario)
+
+def test_completion_timestamps_and_heatmap(engine):
+    async def scenario(repository):
+        work = category("t1", "Work", 0)
+        await repository.insert_category(work)
+        first, second, reopened = (task("t1", work["id"], order, weight=order + 2) for order in range(3))
+        for document in (first, second, reopened):
+            await repository.insert_task(document)
+
+        morning, evening = datetime(2024, 2, 1, 9), datetime(2024, 2, 1, 21)
+        await repository.update_task("t1", first["id"], {"completed": True, "completed_at": morning, "updated_at": morning})
+        # Completing an already completed task keeps its first timestamp
+        assert (await repository.update_task("t1", first["id"], {"completed": True, "completed_at": evening}))["completed_at"] == morning
+        await repository.update_task("t1", second["id"], {"completed": True, "completed_at": datetime(2024, 2, 3, 12), "updated_at": datetime(2024, 2, 3)})
+        await repository.update_task("t1", reopened["id"], {"completed": True, "completed_at": evening})
+        assert (await repository.update_task("t1", reopened["id"], {"completed": False, "completed_at": None}))["completed_at"] is None
+
+        # Archived completions still count
+        assert await repository.archive_completed_tasks(datetime(2024, 2, 2), limit=10) == 1
+        assert await repository.completion_heatmap("t1", datetime(2024, 1, 1), datetime(2024, 3, 1)) == [
+            {"day": datetime(2024, 2, 1), "completed_weight": 2, "completed_count": 1},
+            {"day": datetime(2024, 2, 3), "completed_weight": 3, "completed_count": 1},
+        ]
+        assert await repository.completion_heatmap("t1", datetime(2024, 2, 2), datetime(2024, 2, 3)) == []
+        assert await repository.completion_heatmap("t2", datetime(2024, 1, 1), datetime(2024, 3, 1)) == []
+    run(engine, scenario)
+
+def test_completion_rows(engine):
+    async def scenario(repository):
+        work = category("t1", "Work", 0)
+        await repository.insert_category(work)
+        undated = task("t1", work["id"], 4, weight=5)
+        del undated["created_at"]
+        for document in (
+            task("t1", work["id"], 0, weight=2, completed=True, completed_at=datetime(2024, 2, 1, 23, 59, 59, 999999), updated_at=datetime(2024, 3, 1)),
+            # Completed without completed_at: the done day falls back to updated_at
+            task("t1", work["id"], 1, weight=3, completed=True, updated_at=datetime(2024, 2, 5, 8)),
+            task("t1", work["id"], 2, weight=4, created_at=datetime(2023, 12, 31, 23, 59), updated_at=datetime(2024, 3, 1)),
+            undated,
+            task("t2", work["id"], 0),
+        ):
+            await repository.insert_task(document)
+        # Archived tasks are included
+        assert await repository.archive_completed_tasks(datetime(2024, 2, 3), limit=10) == 1
+
+        rows = sorted(await repository.completion_rows("t1"), key=lambda row: row[1])
+        assert rows == [
+            (work["id"], 2, True, date(2024, 1, 1).toordinal(), date(2024, 2, 1).toordinal()),
+            (work["id"], 3, True, date(2024, 1, 1).toordinal(), date(2024, 2, 5).toordinal()),
+            (work["id"], 4, False, date(2023, 12, 31).toordinal(), 0),
+            (work["id"], 5, False, 0, 0),
+        ]
+        assert await repository.completion_rows("t3") == []
+    run(engine, scenario)
+
+def test_upsert_if_newer_keeps_earlier_completion(engine):
+    async def scenario(repository):
+        work = category("t1", "Work", 0)
+        await repository.insert_category(work)
+        morning, evening, later = datetime(2024, 2, 1, 9), datetime(2024, 2, 1, 21), datetime(2024, 2, 2)
+        document = task("t1", work["id"], 0, completed=True, completed_at=morning, updated_at=morning)
+        assert await repository.upsert_if_newer("task", document, morning)
+        assert (await repository.get_task("t1", document["id"]))["completed_at"] == morning
+
+        # A synced edit of a task that was already completed keeps its first completion time
+        assert await repository.upsert_if_newer("task", {**document, "title": "Edited", "completed_at": evening, "updated_at": evening}, evening)
+        stored = await repository.get_task("t1", document["id"])
+        assert stored["title"] == "Edited" and stored["completed_at"] == morning and stored["version"] == 2
+
+        # Reopened and completed again, it takes the new time
+        assert await repository.upsert_if_newer("task", {**document, "completed": False, "completed_at": None, "updated_at": evening}, evening + timedelta(hours=1))
+        assert await repository.upsert_if_newer("task", {**document, "completed_at": later, "updated_at": later}, later)
+        assert (await repository.get_task("t1", document["id"]))["completed_at"] == later
+    run(engine, scenario)
+
+def test_archiver_goes_by_completion_time(engine):
+    async def scenario(repository):
+        work = category("t1", "Work", 0)
+        await repository.insert_category(work)
+        old, recent, cutoff = datetime(2024, 1, 1), datetime(2024, 6, 1), datetime(2024, 3, 1)
+        # Completed long ago but edited since; completed recently; completed before completions were timestamped
+        edited = task("t1", work["id"], 0, completed=True, completed_at=old, updated_at=recent)
+        fresh = task("t1", work["id"], 1, completed=True, completed_at=recent, updated_at=recent)
+        legacy = task("t1", work["id"], 2, completed=True, updated_at=old)
+        await repository.insert_many("task", [edited, fresh, legacy])
+
+        assert await repository.archive_completed_tasks(cutoff, limit=10) == 2
+        assert [document["id"] for document in await repository.list_tasks("t1")] == [fresh["id"]]
+        assert {document["id"] for document in await repository.list_archived_tasks("t1")} == {edited["id"], legacy["id"]}
+    run(engine, scenario)
+
+def test_revision_state_stops_below_reserved_revisions(engine):
+    async def scenario(repository):
+        async with repository.reserve_revisions("t1") as slow:
+            async with repository.reserve_revisions("t1") as fast:
+                await repository.insert_category(category("t1", "Fast", 1, revision=fast))
+            assert await repository.revision_state("t1") == (slow - 1, 0)
+            await repository.insert_category(category("t1", "Slow", 0, revision=slow))
+        assert await repository.revision_state("t1") == (fast, 0)
+        categories, _, _ = await repository.changes_since("t1", slow - 1)
+        assert [c["name"] for c in categories] == ["Slow", "Fast"]
+
+        # Tombstones and resets take their revisions as part of their own write
+        await repository.record_tombstones("t1", "task", ["a", "b"])
+        assert (await repository.revision_state("t1"))[0] == fast + 2
+    run(engine, scenario)
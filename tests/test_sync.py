@@ -0,0 +1,79 @@
+"""Delta sync watermarks never move past a write that is still in flight"""
+import asyncio
+from datetime import datetime, timedelta
+
+import httpx
+
+def test_pull_waits_for_a_slow_write(memory_server):
+    repository = memory_server.repository
+    insert_task = repository.insert_task
+    release = asyncio.Event()
+
+    async def slow_insert_task(document):
+        await release.wait()
+        await insert_task(document)
+
+    async def main():
+        transport = httpx.ASGITransport(app=memory_server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            category = (await client.post("/api/categories", json={"name": "Work"})).json()
+            since = (await client.get("/api/sync")).json()["revision"]
+
+            repository.insert_task = slow_insert_task
+            slow = asyncio.ensure_future(client.post("/api/tasks", json={"title": "Slow", "weight": 1, "category_id": category["id"]}))
+            await asyncio.sleep(0.05)
+            repository.insert_task = insert_task
+            await client.post("/api/tasks", json={"title": "Fast", "weight": 1, "category_id": category["id"]})
+
+            pull = (await client.get("/api/sync", params={"since": since})).json()
+            assert [task["title"] for task in pull["tasks"]] == ["Fast"]
+            assert pull["revision"] == since  # held below the slow write's revision
+
+            release.set()
+            assert (await slow).status_code == 200
+            pull = (await client.get("/api/sync", params={"since": pull["revision"]})).json()
+            assert [task["title"] for task in pull["tasks"]] == ["Slow", "Fast"]
+            assert pull["revision"] > since
+    asyncio.run(main())
+
+def test_push_keeps_created_at(memory_server):
+    from fastapi.testclient import TestClient
+
+    client = TestClient(memory_server.app)
+    category = client.post("/api/categories", json={"name": "Work"}).json()
+    task = client.post("/api/tasks", json={"title": "A", "weight": 1, "category_id": category["id"]}).json()
+    change = {"type": "task", "op": "upsert", "id": task["id"], "updated_at": "2099-01-01T00:00:00",
+              "data": {"title": "B", "weight": 2, "category_id": category["id"]}}
+    assert client.post("/api/sync", json={"changes": [change]}).json()["applied"] == [task["id"]]
+
+    stored = asyncio.run(memory_server.repository.get_task("default", task["id"]))
+    assert stored["title"] == "B" and stored["created_at"].isoformat() == task["created_at"]
+
+def test_full_pull_includes_archived_tasks(memory_server):
+    from fastapi.testclient import TestClient
+
+    client = TestClient(memory_server.app)
+    category = client.post("/api/categories", json={"name": "Work"}).json()
+    done = client.post("/api/tasks", json={"title": "Done", "weight": 1, "category_id": category["id"]}).json()
+    client.post("/api/tasks", json={"title": "Open", "weight": 1, "category_id": category["id"]})
+    client.put(f"/api/tasks/{done['id']}", json={"completed": True})
+    assert asyncio.run(memory_server.repository.archive_completed_tasks(datetime.utcnow() + timedelta(days=1), 100)) == 1
+
+    pull = client.get("/api/sync").json()
+    assert pull["reset"] is True
+    assert sorted(task["title"] for task in pull["tasks"]) == ["Done", "Open"]
+    assert all("archived_at" not in task for task in pull["tasks"])
+
+def test_push_keeps_an_earlier_completion(memory_server):
+    from fastapi.testclient import TestClient
+
+    client = TestClient(memory_server.app)
+    category = client.post("/api/categories", json={"name": "Work"}).json()
+    task = client.post("/api/tasks", json={"title": "A", "weight": 1, "category_id": category["id"]}).json()
+    completed_at = client.put(f"/api/tasks/{task['id']}", json={"completed": True}).json()["completed_at"]
+    change = {"type": "task", "op": "upsert", "id": task["id"], "updated_at": "2099-01-01T00:00:00",
+              "data": {"title": "B", "weight": 1, "category_id": category["id"], "completed": True, "completed_at": "2099-01-01T00:00:00"}}
+    assert client.post("/api/sync", json={"changes": [change]}).json()["applied"] == [task["id"]]
+
+    stored = asyncio.run(memory_server.repository.get_task("default", task["id"]))
+    assert stored["title"] == "B" and stored["completed_at"].isoformat() == completed_at
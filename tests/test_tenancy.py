@@ -0,0 +1,65 @@
+"""Tenant resolution: a verified bearer token, else the tenant header, else the default tenant; with JWT
+configured, only a verified token names the tenant"""
+import jwt
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+import server
+
+SECRET = "test-secret"
+
+def token(tenant_id, claim="tenant_id"):
+    return jwt.encode({claim: tenant_id}, SECRET, algorithm="HS256")
+
+def request(headers=None):
+    return Request({"type": "http", "headers": [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()]})
+
+def test_header_names_the_tenant():
+    assert server.get_tenant_id(request({"X-Tenant-ID": "alice"})) == "alice"
+    assert server.get_tenant_id(request()) == server.DEFAULT_TENANT
+
+def test_missing_tenant_can_be_required(monkeypatch):
+    monkeypatch.setattr(server, "REQUIRE_TENANT", True)
+    with pytest.raises(HTTPException) as raised:
+        server.get_tenant_id(request())
+    assert raised.value.status_code == 401
+
+@pytest.mark.parametrize("tenant_id", ["../other", "a" * 65, "two words"])
+def test_malformed_tenant_ids_are_rejected(tenant_id):
+    with pytest.raises(HTTPException) as raised:
+        server.get_tenant_id(request({"X-Tenant-ID": tenant_id}))
+    assert raised.value.status_code == 400
+
+def test_verified_token_names_the_tenant(monkeypatch):
+    monkeypatch.setattr(server, "JWT_SECRET", SECRET)
+    assert server.get_tenant_id(request({"Authorization": f"Bearer {token('alice')}", "X-Tenant-ID": "bob"})) == "alice"
+    assert server.get_tenant_id(request({"Authorization": f"Bearer {token('carol', claim='sub')}"})) == "carol"
+    with pytest.raises(HTTPException) as raised:
+        server.get_tenant_id(request({"Authorization": "Bearer not-a-token"}))
+    assert raised.value.status_code == 401
+
+def test_header_only_request_needs_a_token_once_jwt_is_configured(memory_server, monkeypatch):
+    monkeypatch.setattr(memory_server, "JWT_SECRET", SECRET)
+    client = TestClient(memory_server.app)
+    response = client.get("/api/categories", headers={"X-Tenant-ID": "victim"})
+    assert response.status_code == 401
+    assert response.headers["www-authenticate"] == "Bearer"
+    assert client.get("/api/categories", headers={"Authorization": "Bearer not-a-token"}).status_code == 401
+
+def test_token_decides_the_tenant_over_the_header(memory_server, monkeypatch):
+    monkeypatch.setattr(memory_server, "JWT_SECRET", SECRET)
+    client = TestClient(memory_server.app)
+    client.post("/api/categories", json={"name": "Mine"}, headers={"Authorization": f"Bearer {token('alice')}"})
+    response = client.get("/api/categories", headers={"Authorization": f"Bearer {token('bob')}", "X-Tenant-ID": "alice"})
+    assert response.status_code == 200 and response.json() == []
+
+def test_header_is_trusted_without_jwt_or_when_opted_in(memory_server, monkeypatch):
+    client = TestClient(memory_server.app)
+    client.post("/api/categories", json={"name": "Mine"}, headers={"X-Tenant-ID": "alice"})
+    assert len(client.get("/api/categories", headers={"X-Tenant-ID": "alice"}).json()) == 1
+
+    monkeypatch.setattr(memory_server, "JWT_SECRET", SECRET)
+    monkeypatch.setattr(memory_server, "TRUST_TENANT_HEADER", True)
+    assert len(client.get("/api/categories", headers={"X-Tenant-ID": "alice"}).json()) == 1